@@ -0,0 +1,112 @@
+import os
+import hmac
+import time
+import base64
+import asyncio
+import hashlib
+import logging
+import secrets
+import threading
+import multiprocessing
+import bcrypt
+from concurrent.futures import ProcessPoolExecutor
+from backend.storage import get_user_credentials, insert_user
+
+logger = logging.getLogger(__name__)
+
+# Password hashing pool size, how many hash/check calls may be queued or running at once, and session lifetime
+def _auth_settings() -> dict:
+    return {
+        "hash_workers": int(os.getenv("AUTH_HASH_WORKERS", "2")),
+        "max_concurrency": int(os.getenv("AUTH_MAX_CONCURRENCY", "16")),
+        "session_ttl": int(os.getenv("SESSION_TTL", "86400")),
+    }
+
+# bcrypt runs in worker processes so a login burst costs those cores, not the threadpool and GIL
+# shared with /predict. "spawn" keeps the children free of the parent's threads and SQLite handles.
+_pool = None
+_pool_lock = threading.Lock()
+_limiters = {}
+
+def init_hasher() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=_auth_settings()["hash_workers"],
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+def shutdown_hasher():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+# Semaphore bounding queued + running hash calls, one per event loop
+def _limiter() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    limiter = _limiters.get(loop)
+    if limiter is None:
+        limiter = _limiters[loop] = asyncio.Semaphore(_auth_settings()["max_concurrency"])
+    return limiter
+
+# Module-level so the process pool can pickle them
+def _hash(password: bytes) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt())
+
+def _check(password: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed)
+
+async def _in_pool(func, *args):
+    async with _limiter():
+        return await asyncio.get_running_loop().run_in_executor(init_hasher(), func, *args)
+
+# Async counterpart of storage.create_user: hashes in the pool, then inserts
+async def register_user(email: str, password: str) -> bool:
+    hashed = await _in_pool(_hash, password.encode("utf-8"))
+    return await asyncio.to_thread(insert_user, email, hashed)
+
+# Async counterpart of storage.verify_user, with the same return values
+async def authenticate_user(email: str, password: str):
+    user = await asyncio.to_thread(get_user_credentials, email)
+    if not user:
+        return "USER_NOT_FOUND"
+    if await _in_pool(_check, password.encode("utf-8"), user[1]):
+        return user[0]
+    return "WRONG_PASSWORD"
+
+# Signing key for session tokens. Without SESSION_SECRET a per-process key is generated, so tokens
+# do not survive a restart and are not accepted by other replicas.
+_fallback_secret = None
+
+def _session_secret() -> bytes:
+    global _fallback_secret
+    secret = os.getenv("SESSION_SECRET")
+    if secret:
+        return secret.encode("utf-8")
+    if _fallback_secret is None:
+        logger.warning("SESSION_SECRET is not set; session tokens are only valid for this process")
+        _fallback_secret = secrets.token_bytes(32)
+    return _fallback_secret
+
+def _sign(payload: str) -> str:
+    digest = hmac.new(_session_secret(), payload.encode("ascii"), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
+
+# Stateless session token "<user_id>.<expiry>.<HMAC-SHA256>"; checking it is one HMAC, no database access
+def issue_session_token(user_id: int) -> str:
+    payload = f"{user_id}.{int(time.time()) + _auth_settings()['session_ttl']}"
+    return f"{payload}.{_sign(payload)}"
+
+# Returns the user_id of a valid, unexpired token, otherwise None. Compared as bytes: compare_digest
+# rejects non-ASCII str, and a non-ASCII payload fails _sign's encoding with a ValueError.
+def verify_session_token(token: str):
+    try:
+        user_id, expires, signature = token.split(".")
+        expected = _sign(f"{user_id}.{expires}").encode("ascii")
+        if not hmac.compare_digest(signature.encode("utf-8"), expected) or int(expires) < time.time():
+            return None
+        return int(user_id)
+    except (AttributeError, ValueError):
+        return None
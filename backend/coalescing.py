@@ -0,0 +1,27 @@
+import asyncio
+
+# Request coalescing ("single-flight"): concurrent callers asking for the same key share
+# one in-flight execution instead of each hitting the upstreams. Lives on the event loop,
+# so no locking is needed.
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight = {}
+        self.stats = {"executions": 0, "coalesced": 0}
+
+    # Runs factory() for the first caller of a key; later callers await the same task.
+    # The task is shielded so one caller disconnecting does not cancel it for the others.
+    async def run(self, key: str, factory):
+        task = self._inflight.get(key)
+        if task is None:
+            self.stats["executions"] += 1
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.stats["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    # Counters plus the number of keys currently in flight
+    def snapshot(self) -> dict:
+        return {**self.stats, "inflight": len(self._inflight)}
@@ -0,0 +1,161 @@
+import os
+import re
+import math
+import logging
+import threading
+from backend.storage import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Evidence selection for the judge prompt: search results are split into sentences, ranked against the
+# claim with BM25, near-duplicates are dropped, and the best sentences are packed into a token budget
+# counted with the judged model's own tokenizer. numpy and tokenizers are imported on first use.
+
+# Words that carry no evidence (also dropped from search cache keys)
+STOPWORDS = {"a", "an", "the", "is", "are", "was", "were", "be", "of", "to", "in", "on", "at", "for",
+             "and", "or", "that", "this", "it", "its", "has", "have", "had", "did", "does", "do"}
+
+# Sentence boundary: end punctuation followed by whitespace and an upper-case letter, digit or opening quote
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[]?[A-Z0-9])")
+
+# Candidate sentences sharing at least this fraction of their terms with a chosen one are duplicates
+DUPLICATE_OVERLAP = 0.6
+
+# Casefolded words of a text without punctuation or stopwords
+def terms(text: str) -> list:
+    return [word for word in re.findall(r"\w+", normalize_text(text)) if word not in STOPWORDS]
+
+def split_sentences(text: str) -> list:
+    text = " ".join(text.split())
+    return [sentence for sentence in _SENTENCE_END.split(text) if sentence]
+
+# Rough count (about four characters per token) used when the model's tokenizer is unavailable
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / 4)
+
+_counters = {}
+_loading = {}   # tokenizer name -> Event set once its counter is in _counters
+_counters_lock = threading.Lock()
+
+def _load_counter(name: str):
+    if name == "estimate":
+        return estimate_tokens
+    try:
+        from tokenizers import Tokenizer
+        from huggingface_hub import hf_hub_download
+        tokenizer = Tokenizer.from_file(hf_hub_download(name, "tokenizer.json", token=os.getenv("HF_TOKEN")))
+    except Exception as e:
+        logger.warning("Tokenizer of %s unavailable, estimating prompt tokens instead: %s", name, e)
+        return estimate_tokens
+    return lambda text: len(tokenizer.encode(text, add_special_tokens=False).ids)
+
+def _load(name: str, done: threading.Event):
+    counter = _load_counter(name)
+    with _counters_lock:
+        _counters[name] = counter
+    done.set()
+
+# Starts loading a tokenizer in a background thread (once per name); returns the Event of that load
+def _start_loading(name: str) -> threading.Event:
+    with _counters_lock:
+        done = _loading.get(name)
+        if done is None:
+            done = _loading[name] = threading.Event()
+            threading.Thread(target=_load, args=(name, done), name=f"tokenizer-{name}", daemon=True).start()
+    return done
+
+# Returns a function counting the tokens of a text with the tokenizer.json of a Hugging Face model
+# (downloaded once into the hub cache). Never blocks: until the download has finished, and for good if
+# it fails, "estimate" or the tokenizers package is missing, tokens are counted with estimate_tokens.
+def token_counter(name: str):
+    counter = _counters.get(name)
+    if counter is None:
+        _start_loading(name)
+        counter = _counters.get(name, estimate_tokens)
+    return counter
+
+# Loads the tokenizer and numpy ahead of the first request, waiting for the download (called from the
+# API's warmup thread)
+def preload(tokenizer_name: str):
+    import numpy  # noqa: F401
+    _start_loading(tokenizer_name).wait()
+
+# Okapi BM25 score of each document (a list of terms) for the query terms, computed over a
+# documents x query-terms frequency matrix; IDF comes from the candidate documents themselves
+def bm25_scores(query_terms: list, documents: list, k1: float = 1.5, b: float = 0.75):
+    import numpy as np
+    vocabulary = {term: column for column, term in enumerate(dict.fromkeys(query_terms))}
+    tf = np.zeros((len(documents), len(vocabulary)))
+    for row, document in enumerate(documents):
+        for term in document:
+            column = vocabulary.get(term)
+            if column is not None:
+                tf[row, column] += 1
+    if not tf.size:
+        return np.zeros(len(documents))
+    lengths = np.array([len(document) for document in documents], dtype=float)
+    df = np.count_nonzero(tf, axis=0)
+    idf = np.log1p((len(documents) - df + 0.5) / (df + 0.5))
+    norm = k1 * (1 - b + b * lengths / max(lengths.mean(), 1.0))
+    return (idf * tf * (k1 + 1) / (tf + norm[:, None])).sum(axis=1)
+
+# Cuts a text down to its leading words that fit in the budget
+def _truncate(text: str, budget: int, count) -> str:
+    words = text.split()
+    keep = len(words) * budget // max(count(text), 1)
+    while keep > 0 and count(" ".join(words[:keep])) > budget:
+        keep -= max(keep // 10, 1)
+    return " ".join(words[:max(keep, 0)])
+
+# Leading sentences of the claim within the token budget; returns (text, tokens). A first sentence
+# longer than the whole budget is cut at a word boundary.
+def pack_claim(text: str, budget: int, count) -> tuple:
+    kept, used = [], 0
+    for sentence in split_sentences(text):
+        tokens = count(sentence) + (1 if kept else 0)
+        if used + tokens > budget:
+            if not kept:
+                kept.append(_truncate(sentence, budget, count))
+                used = count(kept[0])
+            break
+        kept.append(sentence)
+        used += tokens
+    return " ".join(kept), used
+
+# SEARCH CONTEXT block from the search result sentences that best match the claim, within the token
+# budget; returns (text, tokens). Sentences with no claim term and near-duplicates of a chosen sentence
+# are skipped. Chosen sentences keep their source and original order, under "- <source_label>: title"
+# and "<info_label>:" lines.
+def pack_evidence(claim: str, results: list, budget: int, count, source_label: str = "Source",
+                  info_label: str = "Key Info") -> tuple:
+    candidates = []   # (result index, sentence, term set)
+    for index, res in enumerate(results):
+        for sentence in split_sentences(res.get("content") or res.get("snippet") or ""):
+            candidates.append((index, sentence, terms(sentence)))
+    if not candidates:
+        return "", 0
+    scores = bm25_scores(terms(claim), [sentence_terms for _, _, sentence_terms in candidates])
+
+    chosen, chosen_terms, headers, used = [], [], set(), 0
+    for position in sorted(range(len(candidates)), key=lambda position: -scores[position]):
+        if scores[position] <= 0:
+            break
+        index, sentence, sentence_terms = candidates[position]
+        term_set = set(sentence_terms)
+        if any(len(term_set & other) >= DUPLICATE_OVERLAP * min(len(term_set), len(other)) for other in chosen_terms):
+            continue
+        tokens = count(sentence) + 1
+        if index not in headers:
+            tokens += count(f"- {source_label}: {results[index].get('title')}\n  {info_label}:\n")
+        if used + tokens > budget:
+            continue
+        used += tokens
+        headers.add(index)
+        chosen.append(position)
+        chosen_terms.append(term_set)
+
+    context = ""
+    for index in sorted(headers):
+        sentences = " ".join(candidates[position][1] for position in sorted(chosen) if candidates[position][0] == index)
+        context += f"- {source_label}: {results[index].get('title')}\n  {info_label}: {sentences}\n"
+    return context, used
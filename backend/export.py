@@ -0,0 +1,75 @@
+import io
+import csv
+import json
+from backend.storage import HISTORY_COLUMNS
+
+# Media type and file extension per export format
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+# One JSON object per line
+def _ndjson(chunks):
+    for rows in chunks:
+        yield "".join(json.dumps(dict(zip(HISTORY_COLUMNS, row))) + "\n" for row in rows).encode("utf-8")
+
+# Header line, then each chunk through a reused buffer
+def _csv(chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(HISTORY_COLUMNS)
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+# Write-only file object whose contents are handed out (and dropped) after every row group
+class _DrainBuffer(io.RawIOBase):
+    def __init__(self):
+        self._parts = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data, self._parts = b"".join(self._parts), []
+        return data
+
+# One Parquet row group per chunk; the writer streams sequentially, so only the current chunk and
+# the footer metadata are ever held in memory
+def _parquet(chunks, pa, pq):
+    schema = pa.schema([
+        ("id", pa.string()), ("user_id", pa.int64()), ("timestamp", pa.string()), ("input_type", pa.string()),
+        ("url", pa.string()), ("title", pa.string()), ("text", pa.string()), ("label", pa.string()),
+        ("confidence", pa.float64()), ("explanation", pa.string()), ("reviewer_feedback", pa.string()),
+    ])
+    sink = _DrainBuffer()
+    with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+        for rows in chunks:
+            columns = list(zip(*rows))
+            writer.write_table(pa.table({name: list(values) for name, values in zip(HISTORY_COLUMNS, columns)}, schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
+# Encodes chunks of history rows in the requested format; raises ValueError for unknown or unavailable formats
+def export_stream(chunks, export_format: str):
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {export_format}")
+    if export_format == "parquet":
+        # pyarrow ships in requirements.txt but is imported on first use, keeping it out of the API startup
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Parquet export requires pyarrow")
+        return _parquet(chunks, pa, pq)
+    return _ndjson(chunks) if export_format == "ndjson" else _csv(chunks)
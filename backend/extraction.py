@@ -0,0 +1,179 @@
+import codecs
+from html.parser import HTMLParser
+
+# Optional fast parser: lxml's C parser when installed, the pure-Python html.parser otherwise
+try:
+    from lxml import etree
+    FAST_PARSER = "lxml"
+except ImportError:
+    etree = None
+    FAST_PARSER = "html.parser"
+
+# Subtrees that never hold article text
+SKIP_TAGS = {"script", "style", "noscript", "svg", "template", "nav", "aside", "footer", "form", "iframe"}
+# Block elements that implicitly close an open <p> (html.parser does not do this for us)
+BLOCK_TAGS = {"p", "div", "section", "article", "main", "aside", "header", "footer", "nav", "ul", "ol",
+              "table", "blockquote", "pre", "figure", "form", "h1", "h2", "h3", "h4", "h5", "h6", "hr"}
+
+# Parser-agnostic event sink: receives start/data/end events, keeps paragraph text found inside the
+# main article container (<article>, <main>, role=main, itemprop=articleBody) apart from the rest,
+# and flags itself done once max_chars of container text has been gathered.
+class ArticleCollector:
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self.title = ""
+        self.done = False
+        self.container_paragraphs, self.container_chars = [], 0
+        self.other_paragraphs, self.other_chars = [], 0
+        self._in_title = False
+        self._paragraph = None
+        self._skip = None        # [tag, same-tag nesting depth] of the subtree being skipped
+        self._container = None   # [tag, same-tag nesting depth] of the article container
+
+    @staticmethod
+    def _is_container(tag: str, attrs: dict) -> bool:
+        return tag in ("article", "main") or attrs.get("role") == "main" or attrs.get("itemprop") == "articleBody"
+
+    def start(self, tag, attrs):
+        tag = tag.lower() if isinstance(tag, str) else ""
+        if self._skip is not None:
+            if tag == self._skip[0]:
+                self._skip[1] += 1
+            return
+        if tag in BLOCK_TAGS and self._paragraph is not None:
+            self._close_paragraph()
+        if tag in SKIP_TAGS:
+            self._skip = [tag, 1]
+            return
+        if self._container is None:
+            if self._is_container(tag, attrs):
+                self._container = [tag, 1]
+        elif tag == self._container[0]:
+            self._container[1] += 1
+
+        if tag == "title" and not self.title:
+            self._in_title = True
+        elif tag == "p":
+            self._paragraph = []
+
+    def data(self, text):
+        if self._skip is not None:
+            return
+        if self._in_title:
+            self.title += text
+        elif self._paragraph is not None:
+            self._paragraph.append(text)
+
+    def end(self, tag):
+        tag = tag.lower() if isinstance(tag, str) else ""
+        if self._skip is not None:
+            if tag == self._skip[0]:
+                self._skip[1] -= 1
+                if self._skip[1] == 0:
+                    self._skip = None
+            return
+        if tag == "title":
+            self._in_title = False
+        elif tag == "p" or tag in BLOCK_TAGS:
+            self._close_paragraph()
+        if self._container is not None and tag == self._container[0]:
+            self._container[1] -= 1
+            if self._container[1] == 0:
+                self._container = None
+                # The article is over; anything after it is comments, related stories, etc.
+                if self.container_paragraphs:
+                    self.done = True
+
+    def close(self):
+        self._close_paragraph()
+        return self
+
+    def _close_paragraph(self):
+        if self._paragraph is None:
+            return
+        text = " ".join(" ".join(self._paragraph).split())
+        self._paragraph = None
+        if not text:
+            return
+        if self._container is not None:
+            self.container_paragraphs.append(text)
+            self.container_chars += len(text) + 1
+            if self.container_chars >= self.max_chars:
+                self.done = True
+        elif self.other_chars < self.max_chars * 4:
+            # No container yet: keep a bounded fallback in case the page never declares one
+            self.other_paragraphs.append(text)
+            self.other_chars += len(text) + 1
+
+    # Paragraphs from the container when one was found, otherwise from the whole page, cut at max_chars
+    def text(self) -> str:
+        paragraphs = self.container_paragraphs or self.other_paragraphs
+        kept, gathered = [], 0
+        for paragraph in paragraphs:
+            kept.append(paragraph)
+            gathered += len(paragraph) + 1
+            if gathered >= self.max_chars:
+                break
+        return "\n".join(kept)
+
+# Adapts the stdlib HTMLParser callbacks to ArticleCollector
+class _StdlibDriver(HTMLParser):
+    def __init__(self, collector: ArticleCollector):
+        super().__init__(convert_charrefs=True)
+        self.collector = collector
+
+    def handle_starttag(self, tag, attrs):
+        self.collector.start(tag, {key: value or "" for key, value in attrs})
+
+    def handle_endtag(self, tag):
+        self.collector.end(tag)
+
+    def handle_data(self, data):
+        self.collector.data(data)
+
+# Incremental extractor: feed decoded or raw chunks as they arrive and stop once .done is set
+class StreamingExtractor:
+    def __init__(self, max_chars: int, encoding: str = "utf-8", parser: str = None):
+        self.collector = ArticleCollector(max_chars)
+        self.parser_name = parser or FAST_PARSER
+        try:
+            self._decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        except LookupError:
+            self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        if self.parser_name == "lxml":
+            self._parser = etree.HTMLParser(target=self.collector, recover=True)
+        else:
+            self._parser = _StdlibDriver(self.collector)
+
+    @property
+    def done(self) -> bool:
+        return self.collector.done
+
+    def feed(self, chunk):
+        if self.done:
+            return
+        text = self._decoder.decode(chunk) if isinstance(chunk, (bytes, bytearray)) else chunk
+        if text:
+            self._parser.feed(text)
+
+    # Flushes the parser and returns {"title", "text"}
+    def finish(self) -> dict:
+        if not self.done:
+            try:
+                self._parser.feed(self._decoder.decode(b"", final=True))
+                self._parser.close()
+            except Exception:
+                # lxml raises on close for documents it could not make sense of; keep what was collected
+                pass
+        self.collector.close()
+        title = " ".join(self.collector.title.split()) or "No title"
+        return {"title": title, "text": self.collector.text()}
+
+# One-shot helper over an in-memory document, fed in 64 KiB slices so early stopping still applies
+def extract_bounded(html: str, max_chars: int, parser: str = None) -> dict:
+    extractor = StreamingExtractor(max_chars, parser=parser)
+    for start in range(0, len(html), 65536):
+        extractor.feed(html[start:start + 65536])
+        if extractor.done:
+            break
+    return extractor.finish()
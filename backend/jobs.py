@@ -0,0 +1,124 @@
+import os
+import time
+import random
+import asyncio
+import logging
+from backend.storage import claim_job, complete_job, fail_job, get_job
+
+logger = logging.getLogger(__name__)
+
+# Reads the worker settings from the environment
+def _job_settings():
+    return {
+        "workers": int(os.getenv("JOB_WORKERS", "4")),
+        "max_attempts": int(os.getenv("JOB_MAX_ATTEMPTS", "3")),
+        "retry_base": float(os.getenv("JOB_RETRY_BASE", "2")),
+        "lease_seconds": float(os.getenv("JOB_LEASE_SECONDS", "300")),
+        "poll_interval": float(os.getenv("JOB_POLL_INTERVAL", "1")),
+        "callback_timeout": float(os.getenv("JOB_CALLBACK_TIMEOUT", "10")),
+    }
+
+# Delay before the next attempt: exponential in the attempts made so far, with full jitter
+def retry_delay(attempts: int, base: float) -> float:
+    return random.uniform(0, base * 2 ** (attempts - 1))
+
+# A fixed set of asyncio workers draining the durable jobs table. Each worker leases a job, runs
+# handler(job) and stores its result; failures are retried with backoff until max_attempts.
+# Workers sleep on an event that submit paths set, with poll_interval as the fallback for jobs
+# that became due (retries) or were enqueued by another process.
+class JobWorkerPool:
+    def __init__(self, handler):
+        self.handler = handler
+        self.stats = {"completed": 0, "failed": 0, "retried": 0, "callbacks_failed": 0}
+        self._tasks = []
+        self._wake = None
+        self._settings = None
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._settings = _job_settings()
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self._settings["workers"])]
+
+    async def stop(self):
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    # Attempt budget given to newly submitted jobs
+    def max_attempts(self) -> int:
+        return _job_settings()["max_attempts"]
+
+    # Called after an enqueue so an idle worker picks the job up without waiting for the next poll
+    def notify(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    # Claims and runs jobs until cancelled. A storage error (e.g. "database is locked") only costs the
+    # current iteration: the worker logs it, waits a poll interval and goes on; a claimed job whose
+    # outcome could not be stored is picked up again once its lease expires.
+    async def _worker(self):
+        while True:
+            try:
+                job = await asyncio.to_thread(claim_job, self._settings["lease_seconds"])
+                if job is None:
+                    self._wake.clear()
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), self._settings["poll_interval"])
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception("Job worker iteration failed: %s", e)
+                await asyncio.sleep(self._settings["poll_interval"])
+
+    async def _run(self, job: dict):
+        lease_seconds = self._settings["lease_seconds"]
+        started = time.monotonic()
+        try:
+            # An attempt may not outlive its lease: after that, another worker can claim the same job
+            result = await asyncio.wait_for(self.handler(job), lease_seconds)
+        except asyncio.CancelledError:
+            # Shutdown mid-job: leave the lease to expire so the job is picked up again after restart
+            raise
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError) and time.monotonic() - started >= lease_seconds:
+                error = f"Attempt exceeded the {lease_seconds:g}s job lease"
+            else:
+                error = str(e)
+            logger.warning("Job %s attempt %s failed: %s", job["id"], job["attempts"], error)
+            if job["attempts"] < job["max_attempts"]:
+                self.stats["retried"] += 1
+                retry_at = time.time() + retry_delay(job["attempts"], self._settings["retry_base"])
+                await asyncio.to_thread(fail_job, job["id"], error, retry_at)
+                return
+            self.stats["failed"] += 1
+            await asyncio.to_thread(fail_job, job["id"], error)
+        else:
+            self.stats["completed"] += 1
+            await asyncio.to_thread(complete_job, job["id"], result)
+        if job.get("callback_url"):
+            await self._callback(job["id"], job["callback_url"])
+
+    # POSTs the final job document to the client's callback URL; a failed delivery (unreachable host,
+    # error status, or a URL httpx rejects) is only counted, the result stays available from the status
+    # endpoint
+    async def _callback(self, job_id: str, callback_url: str):
+        import httpx
+        document = await asyncio.to_thread(get_job, job_id)
+        try:
+            async with httpx.AsyncClient(timeout=self._settings["callback_timeout"]) as client:
+                response = await client.post(callback_url, json=document)
+                response.raise_for_status()
+        except Exception as e:
+            self.stats["callbacks_failed"] += 1
+            logger.warning("Callback for job %s to %s failed: %s", job_id, callback_url, e)
+
+    # Counters plus the number of running workers
+    def snapshot(self) -> dict:
+        return {**self.stats, "workers": len(self._tasks)}
@@ -1,42 +1,265 @@
 import os
 import re
 import json
-from tavily import TavilyClient
-from huggingface_hub import InferenceClient
+import time
+import asyncio
+import logging
+import threading
+from backend.storage import normalize_text, get_search_entry, save_search_entry, find_fallback_verdict, search_evidence
+from backend.metrics import stage, UPSTREAM_FAILURES, PARSE_FALLBACKS, PROMPT_TOKENS
+from backend.resilience import get_upstream
+from backend.evidence import STOPWORDS, terms, token_counter, pack_claim, pack_evidence, preload
 
-# Initializes and returns a TavilyClient using the API key from environment variables
+logger = logging.getLogger(__name__)
+
+# Connection pool sizes and timeouts shared by the upstream clients
+def _client_settings() -> dict:
+    return {
+        "pool_size": int(os.getenv("UPSTREAM_POOL_SIZE", "20")),
+        "keepalive": int(os.getenv("UPSTREAM_KEEPALIVE", "10")),
+        "tavily_timeout": float(os.getenv("TAVILY_TIMEOUT", "15")),
+        "hf_timeout": float(os.getenv("HF_TIMEOUT", "60")),
+    }
+
+# The client libraries (tavily, huggingface_hub, requests, httpx) are imported inside the builders:
+# together they cost most of the API's import time, and init_clients() loads them after startup
+
+# Builds a TavilyClient on a keep-alive requests.Session sized to the configured pool
+def _build_tavily_client():
+    import requests
+    from requests.adapters import HTTPAdapter
+    from tavily import TavilyClient
+    settings = _client_settings()
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings["pool_size"])
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    _owned_sessions.append(session)
+    return TavilyClient(api_key=os.getenv("TAVILY_API_KEY"), api_base_url=os.getenv("TAVILY_API_BASE_URL"), session=session)
+
+# Builds an AsyncTavilyClient on a pooled httpx.AsyncClient
+def _build_async_tavily_client():
+    import httpx
+    from tavily import AsyncTavilyClient
+    settings = _client_settings()
+    client = httpx.AsyncClient(
+        base_url=os.getenv("TAVILY_API_BASE_URL") or "https://api.tavily.com",
+        timeout=settings["tavily_timeout"],
+        limits=httpx.Limits(max_connections=settings["pool_size"], max_keepalive_connections=settings["keepalive"]),
+    )
+    _owned_sessions.append(client)
+    return AsyncTavilyClient(api_key=os.getenv("TAVILY_API_KEY"), client=client)
+
+# The sync InferenceClient rides on huggingface_hub's process-wide keep-alive session;
+# the async one owns its connection pool, so it must be reused to keep connections warm
+def _build_hf_client():
+    from huggingface_hub import InferenceClient
+    return InferenceClient(token=os.getenv("HF_TOKEN"), base_url=os.getenv("HF_BASE_URL"), timeout=_client_settings()["hf_timeout"])
+
+def _build_async_hf_client():
+    from huggingface_hub import AsyncInferenceClient
+    return AsyncInferenceClient(token=os.getenv("HF_TOKEN"), base_url=os.getenv("HF_BASE_URL"), timeout=_client_settings()["hf_timeout"])
+
+_CLIENT_BUILDERS = {
+    "tavily": _build_tavily_client,
+    "async_tavily": _build_async_tavily_client,
+    "hf": _build_hf_client,
+    "async_hf": _build_async_hf_client,
+}
+_clients = {}
+_clients_lock = threading.Lock()
+# HTTP sessions created by the builders above; Tavily does not close sessions it was handed
+_owned_sessions = []
+
+# Returns the process-wide client for an upstream, creating it on first use
+def _shared_client(name: str):
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = _CLIENT_BUILDERS[name]()
+    return client
+
+# Creates every upstream client up front (called once at FastAPI startup)
+def init_clients():
+    for name in _CLIENT_BUILDERS:
+        _shared_client(name)
+
+# Closes the pooled sessions behind the shared clients (called at FastAPI shutdown)
+async def close_clients():
+    with _clients_lock:
+        async_hf = _clients.get("async_hf")
+        sessions = list(_owned_sessions)
+        _clients.clear()
+        _owned_sessions.clear()
+    for session in sessions:
+        if hasattr(session, "aclose"):
+            await session.aclose()
+        else:
+            session.close()
+    if async_hf is not None:
+        await async_hf.close()
+
+# Returns the shared TavilyClient (API key from environment variables)
 def _get_tavily_client():
-    tavily_key = os.getenv("TAVILY_API_KEY")
-    return TavilyClient(api_key=tavily_key)
+    return _shared_client("tavily")
 
-# Initializes and returns a HuggingFace InferenceClient using the provided HF token
+# Returns the shared HuggingFace InferenceClient (HF token from environment variables)
 def _get_hf_client():
-    return InferenceClient(token=os.getenv("HF_TOKEN"))
+    return _shared_client("hf")
 
-# Performs RAG-based misinformation analysis by searching real-time web data
-def judge_news(text: str, is_url: bool = False) -> dict:
-    model = os.getenv("HF_MODEL", "meta-llama/Llama-3.1-8B-Instruct")
-    hf_client = _get_hf_client()
-    tavily = _get_tavily_client()
+# Async counterparts used by the non-blocking request pipeline
+def _get_async_tavily_client():
+    return _shared_client("async_tavily")
+
+def _get_async_hf_client():
+    return _shared_client("async_hf")
+
+# Hits, misses and the upstream time (ms) saved by the search cache
+SEARCH_STATS = {"hits": 0, "misses": 0, "saved_ms": 0.0}
+
+# Freshness window (seconds) and maximum number of cached queries
+def _search_cache_settings():
+    return int(os.getenv("SEARCH_CACHE_TTL", "3600")), int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "5000"))
 
-    # Dynamic RAG
-    search_context = ""
+# Normalizes a search query into its cache key: casefolded words without punctuation or stopwords,
+# so trivially reworded claims share an entry
+def search_query_key(query: str) -> str:
+    words = re.findall(r"\w+", normalize_text(query))
+    return " ".join(word for word in words if word not in STOPWORDS)
+
+def _record_search_hit(entry: dict):
+    SEARCH_STATS["hits"] += 1
+    SEARCH_STATS["saved_ms"] += entry["latency_ms"] or 0.0
+
+# Local evidence index (past analyses and cached search results): LOCAL_EVIDENCE_MODE is "off", "augment"
+# (local matches join the web results) or "prefer" (the web search is skipped when at least
+# LOCAL_EVIDENCE_MIN_MATCHES fresh cached search results each contain LOCAL_EVIDENCE_MIN_COVERAGE of the
+# claim's words; past analyses never count, they are this system's own output)
+def _local_evidence_settings() -> dict:
+    return {
+        "mode": os.getenv("LOCAL_EVIDENCE_MODE", "augment"),
+        "max_age": float(os.getenv("LOCAL_EVIDENCE_MAX_AGE", str(7 * 24 * 3600))),
+        "limit": int(os.getenv("LOCAL_EVIDENCE_LIMIT", "20")),
+        "min_matches": int(os.getenv("LOCAL_EVIDENCE_MIN_MATCHES", "3")),
+        "min_coverage": float(os.getenv("LOCAL_EVIDENCE_MIN_COVERAGE", "0.6")),
+    }
+
+# Lookups, lookups with matches, web searches skipped, and failed web searches answered from local evidence
+LOCAL_EVIDENCE_STATS = {"lookups": 0, "matched": 0, "searches_skipped": 0, "search_failures_covered": 0}
+
+# Claim words sent to the full-text index (the first distinct ones, enough to identify a story)
+_MAX_LOCAL_QUERY_WORDS = 32
+
+# Fresh local evidence for the claim; returns (snippets, analyses, strong matches). Cached search results
+# come back shaped like web results. Earlier analyses are kept apart (verdict and explanation, not the
+# article text they judged): they go to their own prompt section and never count as strong matches.
+def _local_evidence(text: str) -> tuple:
+    settings = _local_evidence_settings()
+    if settings["mode"] == "off":
+        return [], [], 0
+    words = list(dict.fromkeys(terms(text)))[:_MAX_LOCAL_QUERY_WORDS]
     try:
-        # search the web to see if other sources confirm the text from your scraper
-        search_results = tavily.search(query=text[:200], search_depth="basic", max_results=3)
-        for res in search_results['results']:
-            # Use snippet for high-quality context without massive token usage
-            context_piece = res.get('snippet', res['content'][:300])
-            search_context += f"- Source: {res['title']}\n  Key Info: {context_piece}\n"
+        documents = search_evidence(words, settings["max_age"], settings["limit"])
     except Exception as e:
-        search_context = "Search failed, rely on logic."
+        logger.warning("Local evidence lookup failed: %s", e)
+        return [], [], 0
+    LOCAL_EVIDENCE_STATS["lookups"] += 1
+    LOCAL_EVIDENCE_STATS["matched"] += bool(documents)
+    snippets, analyses, strong = [], [], 0
+    for doc in documents:
+        if doc["kind"] == "analysis":
+            title = doc["label"] + (f" ({doc['title']})" if doc["title"] not in (None, "", "N/A") else "")
+            analyses.append({"title": title, "url": doc["url"], "content": doc["summary"]})
+            continue
+        snippets.append({"title": doc["title"], "url": doc["url"], "content": doc["body"], "local": True})
+        matched = set(words) & set(terms(" ".join(filter(None, (doc["title"], doc["body"])))))
+        strong += bool(words) and len(matched) >= settings["min_coverage"] * len(words)
+    return snippets, analyses, strong
+
+# True when LOCAL_EVIDENCE_MODE=prefer and the local matches make the web search unnecessary
+def _skip_web_search(strong: int) -> bool:
+    settings = _local_evidence_settings()
+    if settings["mode"] == "prefer" and strong >= settings["min_matches"]:
+        LOCAL_EVIDENCE_STATS["searches_skipped"] += 1
+        return True
+    return False
+
+# Web results first, then the local documents (the evidence packer drops sentences repeated between them)
+def _merge_evidence(search_results, local: list) -> dict:
+    search_results = search_results or {}
+    return {**search_results, "results": search_results.get("results", []) + local}
+
+# Returns the Hugging Face model id configured for the judge
+def _get_model():
+    return os.getenv("HF_MODEL", "meta-llama/Llama-3.1-8B-Instruct")
+
+# Token budgets of the prompt's claim and evidence parts, and how many search results are ranked for
+# evidence. PROMPT_TOKENIZER names the Hugging Face repo whose tokenizer counts the tokens (defaults to
+# HF_MODEL; point it at an ungated copy of a gated model, or set "estimate" to skip the download).
+def _prompt_settings() -> dict:
+    return {
+        "claim_tokens": int(os.getenv("CLAIM_TOKEN_BUDGET", "256")),
+        "evidence_tokens": int(os.getenv("EVIDENCE_TOKEN_BUDGET", "256")),
+        "earlier_tokens": int(os.getenv("EARLIER_ANALYSES_TOKEN_BUDGET", "96")),
+        "max_results": int(os.getenv("EVIDENCE_MAX_RESULTS", "8")),
+        "tokenizer": os.getenv("PROMPT_TOKENIZER") or _get_model(),
+    }
 
+def _count_tokens(text: str) -> int:
+    return token_counter(_prompt_settings()["tokenizer"])(text)
+
+# Loads the prompt tokenizer and the ranking code ahead of the first request
+def init_evidence_ranker():
+    preload(_prompt_settings()["tokenizer"])
+
+# Packs the claim into CLAIM_TOKEN_BUDGET, once per request: the packed claim is both what the evidence
+# is ranked against and what the prompt carries
+def _pack_claim(text: str) -> str:
+    claim, tokens = pack_claim(text, _prompt_settings()["claim_tokens"], _count_tokens)
+    PROMPT_TOKENS.observe("claim", value=tokens)
+    return claim
+
+# Turns Tavily search results into the SEARCH CONTEXT block of the prompt: the result sentences that
+# best match the (packed) claim, within EVIDENCE_TOKEN_BUDGET
+def _format_search_context(claim: str, search_results: dict) -> str:
+    search_context, tokens = pack_evidence(claim, search_results.get("results", []),
+                                           _prompt_settings()["evidence_tokens"], _count_tokens)
+    PROMPT_TOKENS.observe("evidence", value=tokens)
+    return search_context
+
+# EARLIER ANALYSES block: the explanations of this system's past verdicts that best match the claim,
+# within EARLIER_ANALYSES_TOKEN_BUDGET
+def _format_earlier_analyses(claim: str, analyses: list) -> str:
+    earlier_context, tokens = pack_evidence(claim, analyses, _prompt_settings()["earlier_tokens"], _count_tokens,
+                                            source_label="Verdict", info_label="Reason")
+    PROMPT_TOKENS.observe("earlier", value=tokens)
+    return earlier_context
+
+# Builds the prompt around the packed claim; returns it with its token count
+def _prepare_prompt(claim: str, search_context: str, earlier_context: str, is_url: bool) -> tuple:
+    prompt = _build_prompt(claim, search_context, is_url, earlier_context)
+    prompt_tokens = _count_tokens(prompt)
+    PROMPT_TOKENS.observe("total", value=prompt_tokens)
+    return prompt, prompt_tokens
+
+# Builds the fact-checking prompt sent to Llama. Earlier analyses, if any, get their own section marked
+# as this system's past output, so the model never mistakes them for independent facts.
+def _build_prompt(text: str, search_context: str, is_url: bool, earlier_context: str = "") -> str:
     # This prompt tells Llama to stop saying "I don't know" and start comparing facts
     if is_url:
         role_instruction = "You are a professional fact-checker analyzing a scraped article."
     else:
         role_instruction = "You are a professional fact-checker analyzing a raw text claim."
 
+    earlier_section = ""
+    if earlier_context:
+        earlier_section = f"""
+    EARLIER ANALYSES (verdicts this system gave similar claims before; NOT independent evidence, never base the label on them alone):
+    {earlier_context}
+"""
+
     # prompt without forced confidence rules
     prompt = f"""
     {role_instruction}
@@ -44,9 +267,9 @@ def judge_news(text: str, is_url: bool = False) -> dict:
     
     SEARCH CONTEXT (Real-time facts from the web):
     {search_context}
-
+{earlier_section}
     INPUT TEXT TO VERIFY:
-    {text[:1000]}
+    {text}
 
     INSTRUCTIONS:
     1. Extract the core claim from the INPUT TEXT.
@@ -66,22 +289,218 @@ def judge_news(text: str, is_url: bool = False) -> dict:
       "explanation": "Briefly justify your label and confidence score based on the evidence."
     }}
     """
+    return prompt
+
+# Extracts the JSON verdict from the raw model output
+def _parse_verdict(raw_content: str) -> dict:
+    # Keep existing re.search and json.loads logic here
+    with stage("parse"):
+        try:
+            json_match = re.search(r'\{.*\}', raw_content, re.DOTALL)
+            return json.loads(json_match.group())
+        except (AttributeError, ValueError):
+            PARSE_FALLBACKS.inc()
+            logger.warning("Model output is not valid JSON, falling back to uncertain: %.200r", raw_content)
+            return {"label": "uncertain", "confidence": 0, "explanation": "Logic analysis failed."}
+
+# Counts and logs a failed upstream call
+def _upstream_failed(upstream: str, error: Exception):
+    UPSTREAM_FAILURES.inc(upstream)
+    logger.warning("%s call failed: %s", upstream, error)
+
+# Verdict reported when the model could not be reached or failed. Flagged "inference_failed" so it is
+# never stored or cached: a transient outage must not become the permanent answer for a claim.
+def inference_failure(error) -> dict:
+    return {"label": "uncertain", "confidence": 0, "explanation": f"Model inference failed: {str(error)}",
+            "inference_failed": True}
+
+# Degraded-mode counters: verdicts served from the cache while the model was unavailable, and misses
+DEGRADED_STATS = {"served": 0, "unavailable": 0}
+
+# While the model is unreachable (circuit open, rate limited, or failing), serve the exact cached verdict
+# even if stale, or a near-match above DEGRADED_NEAR_DUP_THRESHOLD, flagged "degraded" so it is not stored.
+# Only when nothing is close enough does the caller get the plain "Model inference failed" verdict.
+def _fallback_verdict(text: str, error) -> dict:
+    threshold = float(os.getenv("DEGRADED_NEAR_DUP_THRESHOLD", "0.5"))
+    fallback = find_fallback_verdict(text, threshold)
+    if fallback:
+        DEGRADED_STATS["served"] += 1
+        return {**fallback, "source": "degraded", "degraded": True}
+    DEGRADED_STATS["unavailable"] += 1
+    return inference_failure(error)
+
+# Runs the Tavily search for a claim (or reuses cached results for the same normalized query)
+def _search_sync(text: str) -> dict:
+    tavily = _get_tavily_client()
+    ttl, max_entries = _search_cache_settings()
+    query = text[:200]
+    key = search_query_key(query)
+    entry = get_search_entry(key, ttl)
+    if entry:
+        _record_search_hit(entry)
+        return entry["results"]
+    SEARCH_STATS["misses"] += 1
+    # search the web to see if other sources confirm the text from your scraper
+    started = time.perf_counter()
+    with stage("search"):
+        search_results = get_upstream("tavily").call_sync(
+            lambda: tavily.search(query=query, search_depth="basic", max_results=_prompt_settings()["max_results"],
+                                  timeout=_client_settings()["tavily_timeout"]))
+    if search_results.get("results"):
+        save_search_entry(key, search_results, (time.perf_counter() - started) * 1000, max_entries)
+    return search_results
+
+# Performs RAG-based misinformation analysis by searching real-time web data
+def judge_news(text: str, is_url: bool = False) -> dict:
+    model = _get_model()
+    hf_client = _get_hf_client()
+    # Fast-fail: no point searching for a prompt the model cannot answer
+    if get_upstream("hf").breaker.is_open():
+        return _fallback_verdict(text, "hf circuit is open")
+
+    # Dynamic RAG: local evidence index first, then the search cache or the live search
+    claim = _pack_claim(text)
+    local, analyses, strong = _local_evidence(text)
+    try:
+        search_results = None if _skip_web_search(strong) else _search_sync(text)
+        search_context = _format_search_context(claim, _merge_evidence(search_results, local))
+    except Exception as e:
+        _upstream_failed("tavily", e)
+        if local:
+            LOCAL_EVIDENCE_STATS["search_failures_covered"] += 1
+            search_context = _format_search_context(claim, {"results": local})
+        else:
+            search_context = "Search failed, rely on logic."
+
+    prompt, prompt_tokens = _prepare_prompt(claim, search_context, _format_earlier_analyses(claim, analyses), is_url)
 
     # Get Llama's verdict
     try:
-        resp = hf_client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.1,
-            max_tokens=350
-        )
+        with stage("llm"):
+            resp = get_upstream("hf").call_sync(lambda: hf_client.chat.completions.create(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.1,
+                max_tokens=350
+            ))
         raw_content = resp.choices[0].message.content.strip()
     except Exception as e:
-        return {"label": "uncertain", "confidence": 0, "explanation": f"Model inference failed: {str(e)}"}
+        _upstream_failed("hf", e)
+        return _fallback_verdict(text, e)
 
-    # Keep existing re.search and json.loads logic here
+    return {**_parse_verdict(raw_content), "prompt_tokens": prompt_tokens}
+
+# Awaits the Tavily search (or reuses cached results for the same normalized query)
+async def _web_search_async(text: str) -> dict:
+    ttl, max_entries = _search_cache_settings()
+    query = text[:200]
+    key = search_query_key(query)
+    entry = await asyncio.to_thread(get_search_entry, key, ttl)
+    if entry:
+        _record_search_hit(entry)
+        return entry["results"]
+
+    SEARCH_STATS["misses"] += 1
+    tavily = _get_async_tavily_client()
+    started = time.perf_counter()
+    with stage("search"):
+        search_results = await get_upstream("tavily").call(
+            lambda: tavily.search(query=query, search_depth="basic", max_results=_prompt_settings()["max_results"],
+                                  timeout=_client_settings()["tavily_timeout"]))
+    if search_results.get("results"):
+        await asyncio.to_thread(save_search_entry, key, search_results, (time.perf_counter() - started) * 1000, max_entries)
+    return search_results
+
+# Gathers the evidence for a claim: the local evidence index, then the web search unless cached search
+# results make it unnecessary. Returns the results (None when nothing could be found because the search
+# failed), the prompt's SEARCH CONTEXT and its EARLIER ANALYSES, both ranked against the packed claim
+# (packed here when not given).
+async def _search_async(text: str, claim: str = None):
+    if claim is None:
+        claim = _pack_claim(text)
+    local, analyses, strong = await asyncio.to_thread(_local_evidence, text)
+    earlier_context = _format_earlier_analyses(claim, analyses)
     try:
-        json_match = re.search(r'\{.*\}', raw_content, re.DOTALL)
-        return json.loads(json_match.group())
-    except:
-        return {"label": "uncertain", "confidence": 0, "explanation": "Logic analysis failed."}
\ No newline at end of file
+        search_results = None if _skip_web_search(strong) else await _web_search_async(text)
+    except Exception as e:
+        _upstream_failed("tavily", e)
+        if not local:
+            return None, "Search failed, rely on logic.", earlier_context
+        LOCAL_EVIDENCE_STATS["search_failures_covered"] += 1
+        search_results = None
+    search_results = _merge_evidence(search_results, local)
+    return search_results, _format_search_context(claim, search_results), earlier_context
+
+# Same pipeline as judge_news, but awaits the search and inference calls instead of blocking a thread
+async def judge_news_async(text: str, is_url: bool = False) -> dict:
+    model = _get_model()
+    hf_client = _get_async_hf_client()
+    if get_upstream("hf").breaker.is_open():
+        return await asyncio.to_thread(_fallback_verdict, text, "hf circuit is open")
+
+    claim = _pack_claim(text)
+    _, search_context, earlier_context = await _search_async(text, claim)
+    prompt, prompt_tokens = _prepare_prompt(claim, search_context, earlier_context, is_url)
+
+    try:
+        with stage("llm"):
+            resp = await get_upstream("hf").call(lambda: hf_client.chat.completions.create(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.1,
+                max_tokens=350
+            ))
+        raw_content = resp.choices[0].message.content.strip()
+    except Exception as e:
+        _upstream_failed("hf", e)
+        return await asyncio.to_thread(_fallback_verdict, text, e)
+
+    return {**_parse_verdict(raw_content), "prompt_tokens": prompt_tokens}
+
+# Streaming variant of judge_news_async: an async generator of (event, data) pairs.
+# Yields ("search", {...}) once, ("token", {"text": ...}) per streamed LLM delta, and
+# always finishes with ("verdict", {...}) holding the parsed JSON verdict.
+async def judge_news_stream(text: str, is_url: bool = False):
+    model = _get_model()
+    hf_client = _get_async_hf_client()
+    hf = get_upstream("hf")
+    if hf.breaker.is_open():
+        yield "verdict", await asyncio.to_thread(_fallback_verdict, text, "hf circuit is open")
+        return
+
+    claim = _pack_claim(text)
+    search_results, search_context, earlier_context = await _search_async(text, claim)
+    sources = [{"title": res.get("title"), "url": res.get("url")} for res in (search_results or {}).get("results", [])]
+    yield "search", {"ok": search_results is not None, "sources": sources}
+
+    prompt, prompt_tokens = _prepare_prompt(claim, search_context, earlier_context, is_url)
+    pieces = []
+    stream = None
+    try:
+        # Includes the time the consumer takes for each token event
+        with stage("llm"):
+            # Retries apply to opening the stream; a failure mid-stream is only booked against the breaker
+            stream = await hf.call(lambda: hf_client.chat.completions.create(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.1,
+                max_tokens=350,
+                stream=True
+            ))
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    pieces.append(delta)
+                    yield "token", {"text": delta}
+    except Exception as e:
+        _upstream_failed("hf", e)
+        if stream is not None:
+            hf.record(e)
+        if pieces:
+            # Tokens were already shown; a substituted cached verdict would not match them
+            yield "verdict", inference_failure(e)
+        else:
+            yield "verdict", await asyncio.to_thread(_fallback_verdict, text, e)
+        return
+
+    yield "verdict", {**_parse_verdict("".join(pieces).strip()), "prompt_tokens": prompt_tokens}
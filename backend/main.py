@@ -1,15 +1,83 @@
+import time
+_import_started = time.perf_counter()
+
+import os
+import hmac
+import json
 import uuid
+import asyncio
+import hashlib
+import logging
 import datetime
-from pydantic import BaseModel
+from typing import Annotated
+from urllib.parse import urlsplit
+from contextlib import asynccontextmanager
+from pydantic import BaseModel, AfterValidator
 from dotenv import load_dotenv
-from backend.llm_judge import judge_news
-from fastapi import FastAPI, HTTPException
-from backend.scraping import scrape_article
-from backend.storage import append_record, clear_all_history, update_record_feedback, read_history, check_cache, get_stats_data, verify_user, create_user
+from backend.llm_judge import judge_news_async, judge_news_stream, init_clients, init_evidence_ranker, close_clients, SEARCH_STATS, DEGRADED_STATS, LOCAL_EVIDENCE_STATS
+from backend.resilience import upstream_snapshot
+from fastapi import FastAPI, HTTPException, Header, Query, Response
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from backend.scraping import scrape_article_async, canonicalize_url, SCRAPE_STATS
+from backend.coalescing import SingleFlight
+from backend.jobs import JobWorkerPool
+from backend.export import export_stream, EXPORT_FORMATS
+from backend.auth import register_user, authenticate_user, issue_session_token, verify_session_token, init_hasher, shutdown_hasher
+from backend.metrics import MetricsMiddleware, register_collector, render, stage
+from backend.storage import append_record, clear_all_history, update_record_feedback, read_history_page, iter_history, check_cache, get_stats_data, get_cache_stats, init_engine, shutdown_engine, append_records, check_cache_many, text_digest, find_near_duplicate, enqueue_job, get_job, get_job_counts
 
 load_dotenv()
 
-app = FastAPI()
+# uvicorn's own logger, so the boot timings show up next to "Application startup complete"
+logger = logging.getLogger("uvicorn.error")
+
+# Seconds spent importing this module, in the lifespan startup and in the background client warmup
+STARTUP_TIMINGS = {}
+
+# Builds the upstream clients and loads the prompt tokenizer in a worker thread once the server is accepting
+# requests. This is where tavily, huggingface_hub, requests, httpx and numpy get imported; if it fails,
+# they are loaded on first use.
+async def warm_clients():
+    started = time.perf_counter()
+    try:
+        await asyncio.to_thread(init_clients)
+        await asyncio.to_thread(init_evidence_ranker)
+    except Exception as e:
+        logger.warning("Upstream client warmup failed: %s", e)
+        return
+    STARTUP_TIMINGS["warmup"] = time.perf_counter() - started
+    logger.info("Upstream clients warmed up in %.0f ms", STARTUP_TIMINGS["warmup"] * 1000)
+
+# Opens the pooled storage engine (schema setup + migrations) and the password-hashing process pool
+# once at startup, starts the job workers and leaves the keep-alive upstream clients to warm_clients();
+# shuts everything down in reverse order
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    init_engine()
+    init_hasher()
+    await job_workers.start()
+    STARTUP_TIMINGS["startup"] = time.perf_counter() - started
+    logger.info("backend.main imported in %.0f ms, startup took %.0f ms",
+                STARTUP_TIMINGS["import"] * 1000, STARTUP_TIMINGS["startup"] * 1000)
+    warmup = asyncio.create_task(warm_clients())
+    yield
+    # The warmup thread cannot be interrupted; let it finish so close_clients() sees what it built
+    await warmup
+    await job_workers.stop()
+    shutdown_hasher()
+    await close_clients()
+    shutdown_engine()
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+
+# Largest page /history will serve
+HISTORY_MAX_PAGE = 200
+
+# Identical concurrent analyses share one search + LLM call; identical concurrent URLs share one scrape
+judge_flight = SingleFlight("judge")
+scrape_flight = SingleFlight("scrape")
 
 # Data model for user authentication (Login/Signup)
 class UserAuth(BaseModel):
@@ -43,20 +111,181 @@ class FinalRecordRequest(BaseModel):
     url: str = ""
     title: str = "N/A"
 
+# Data model for batch text analysis
+class BatchPredictRequest(BaseModel):
+    texts: list[str]
+    user_id: int
+
+# Data model for batch URL analysis
+class BatchScrapeRequest(BaseModel):
+    urls: list[str]
+    user_id: int
+
+# Callback URLs must parse (including the port) and use http or https
+def _check_callback_url(url: str | None) -> str | None:
+    if url is None:
+        return url
+    try:
+        parts = urlsplit(url)
+        parts.port
+    except ValueError:
+        raise ValueError("callback_url is not a valid URL")
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError("callback_url must be an http or https URL")
+    return url
+
+CallbackUrl = Annotated[str | None, AfterValidator(_check_callback_url)]
+
+# Background job submissions; callback_url, when set, receives the finished job document
+class JobPredictRequest(PredictRequest):
+    callback_url: CallbackUrl = None
+
+class JobScrapeRequest(ScrapeRequest):
+    callback_url: CallbackUrl = None
+
+# Single-flight key of an analysis: input type and normalized-text digest
+def _judge_key(text: str, is_url: bool) -> str:
+    return f"{'url' if is_url else 'text'}:{text_digest(text)}"
+
+# Runs judge_news_async through the single-flight layer, keyed by input type and normalized-text digest
+async def judge_coalesced(text: str, is_url: bool = False) -> dict:
+    return dict(await judge_flight.run(_judge_key(text, is_url), lambda: judge_news_async(text, is_url=is_url)))
+
+# Streaming counterpart of judge_coalesced, an async generator of judge_news_stream's (event, data) pairs.
+# The first caller of a key leads: judge_news_stream runs as the flight's shared task and its search and
+# token events are relayed to the leader through a queue. Callers joining a flight already in progress,
+# streamed or not, only get its final ("verdict", ...) pair. The task outlives a leader that disconnects,
+# so the callers waiting on it still get their verdict.
+async def judge_stream_coalesced(text: str, is_url: bool = False):
+    events = asyncio.Queue()
+
+    async def produce():
+        result = None
+        async for event, data in judge_news_stream(text, is_url=is_url):
+            if event == "verdict":
+                result = data
+            else:
+                events.put_nowait((event, data))
+        return result
+
+    verdict = asyncio.ensure_future(judge_flight.run(_judge_key(text, is_url), produce))
+    getter = None
+    try:
+        while not verdict.done():
+            getter = asyncio.ensure_future(events.get())
+            await asyncio.wait({getter, verdict}, return_when=asyncio.FIRST_COMPLETED)
+            if getter.done():
+                yield getter.result()
+            else:
+                getter.cancel()
+        while not events.empty():
+            yield events.get_nowait()
+        yield "verdict", dict(verdict.result())
+    finally:
+        if getter is not None:
+            getter.cancel()
+        verdict.cancel()
+
+# Runs scrape_article_async through the single-flight layer, keyed by canonical URL. The scraper reports
+# an unreachable page or one with no article text as empty text; that is raised here, so an empty string
+# is never judged, stored or cached as a verdict.
+async def scrape_coalesced(url: str) -> dict:
+    article = dict(await scrape_flight.run(canonicalize_url(url), lambda: scrape_article_async(url)))
+    if not article["text"].strip():
+        raise ValueError(f"No article text could be extracted from {url}")
+    return article
+
+# Assembles the news_history row for a fresh verdict
+def build_record(result: dict, text: str, input_type: str = "text", url: str = "", title: str = "N/A") -> dict:
+    return {
+        "id": str(uuid.uuid4())[:8],
+        "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "input_type": input_type,
+        "url": url,
+        "title": title,
+        "text": text,
+        "label": result.get("label"),
+        "confidence": result.get("confidence"),
+        "explanation": result.get("explanation"),
+        "reviewer_feedback": "The user did not post a feedback."
+    }
+
+# Exact verdict cache first, then the near-duplicate index for re-worded or re-published copies.
+# Near matches are served with source "similarity" and carry the matched record id and score.
+def lookup_verdict(text: str):
+    with stage("cache"):
+        cached = check_cache(text)
+        if cached:
+            return {**cached, "source": "database"}
+        near = find_near_duplicate(text)
+        if near:
+            return {**near, "source": "similarity"}
+        return None
+
+# Degraded verdicts (served from the cache while the model is unavailable) and inference failures are
+# returned but never stored, so they cannot shadow a real verdict later
+def is_storable(result: dict) -> bool:
+    return not result.get("degraded") and not result.get("inference_failed")
+
+# Saves a fresh verdict and returns it with its record id (None for a failure, which is not stored)
+async def store_verdict(result: dict, user_id: int, text: str, input_type: str = "text", url: str = "", title: str = "N/A") -> dict:
+    if not is_storable(result):
+        return {"id": "CACHED" if result.get("degraded") else None, **result}
+    record = build_record(result, text, input_type, url, title)
+    await asyncio.to_thread(append_record, record, user_id)
+    return {"id": record["id"], **result}
+
+# Text analysis shared by /predict and the job workers: cache lookup, then judge and store the verdict
+async def run_text_analysis(text: str, user_id: int) -> dict:
+    # Check cache (Logic remains same)
+    cached = await asyncio.to_thread(lookup_verdict, text)
+    if cached:
+        return {**cached, "id": "CACHED"}
+
+    result = await judge_coalesced(text)
+    # Updated to include user_id
+    return await store_verdict(result, user_id, text)
+
+# URL analysis shared by /analyze_url and the job workers
+async def run_url_analysis(url: str, user_id: int) -> dict:
+    article = await scrape_coalesced(url)
+
+    cached = await asyncio.to_thread(lookup_verdict, article["text"])
+    if cached:
+        return cached
+
+    result = await judge_coalesced(article["text"], is_url=True)
+    return await store_verdict(result, user_id, article["text"], "url", article["url"], article["title"])
+
+# Runs one leased job for the worker pool. The judge reports upstream failures as a flagged verdict
+# rather than raising; such an attempt is raised here so the pool retries it with backoff.
+async def run_job(job: dict) -> dict:
+    payload = job["payload"]
+    if job["kind"] == "url":
+        result = await run_url_analysis(payload["url"], payload["user_id"])
+    else:
+        result = await run_text_analysis(payload["text"], payload["user_id"])
+    if result.get("inference_failed"):
+        raise RuntimeError(result["explanation"])
+    return result
+
+job_workers = JobWorkerPool(run_job)
+
 # Handles new user registration by hashing passwords and storing credentials
+# bcrypt runs in backend.auth's process pool, so sign-up bursts do not hold up the analysis routes
 @app.post("/signup")
-def signup(data: UserAuth):
+async def signup(data: UserAuth):
     # success is True if user was created, False if email already exists
-    success = create_user(data.email, data.password)
+    success = await register_user(data.email, data.password)
     if not success:
         raise HTTPException(status_code=400, detail="Email already registered")
     return {"message": "User created successfully"}
 
-# Authenticates users and returns a unique user ID upon successful login
+# Authenticates users and returns a unique user ID and a signed session token upon successful login
 @app.post("/login")
-def login(data: UserAuth):
-    # Call the updated verify_user from storage.py
-    result = verify_user(data.email, data.password)
+async def login(data: UserAuth):
+    # Same checks as storage.verify_user, with the bcrypt comparison in the process pool
+    result = await authenticate_user(data.email, data.password)
     
     # 1. Handle case where Email is not found
     if result == "USER_NOT_FOUND":
@@ -72,95 +301,389 @@ def login(data: UserAuth):
             detail="Incorrect password. Please try again."
         )
     
-    # 3. If login is successful, return the user_id
-    return {"user_id": result}
+    # 3. If login is successful, return the user_id and a session token
+    return {"user_id": result, "token": issue_session_token(result)}
+
+# Validates a session token ("Authorization: Bearer <token>") without touching the database
+@app.get("/session")
+def session(authorization: str = Header(default="")):
+    user_id = verify_session_token(authorization.removeprefix("Bearer ").strip())
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired session")
+    return {"user_id": user_id}
+
+# Guards the routes that read or delete one user's records: the bearer session token must belong to user_id
+def require_session(user_id: int, authorization: str):
+    if verify_session_token(authorization.removeprefix("Bearer ").strip()) != user_id:
+        raise HTTPException(status_code=401, detail="Invalid or expired session")
 
-# Retrieves analysis statistics (Total, Fake, Real) for a specific user ID
+# Retrieves analysis statistics (Total, Fake, Real, Uncertain percentages and counts) for a specific user ID
 @app.get("/stats")
-def get_stats(user_id: int):
+def get_stats(user_id: int, authorization: str = Header(default="")):
+    require_session(user_id, authorization)
     # Pass user_id to your stats function
     return get_stats_data(user_id) 
 
-# Returns the operational status of the API server
+# True when an If-None-Match header lists the given ETag (weak comparison, as RFC 9110 asks for GET)
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
+# Stats and the most recent history rows in one round trip for the dashboard. The ETag is a hash of the
+# body, so a client revalidating with If-None-Match gets an empty 304 until the user's data changes.
+@app.get("/dashboard")
+def dashboard(user_id: int, limit: int = Query(50, ge=1, le=HISTORY_MAX_PAGE), if_none_match: str = Header(default=""),
+              authorization: str = Header(default="")):
+    require_session(user_id, authorization)
+    try:
+        rows, _ = read_history_page(user_id, limit)
+        body = json.dumps({"stats": get_stats_data(user_id), "history": rows}).encode("utf-8")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+# Reports verdict cache hits, misses, backfilled rows and the resulting hit ratio,
+# how many upstream executions the single-flight layer coalesced, scrape/search cache activity and the job queue
+@app.get("/cache_stats")
+def cache_stats():
+    return {**get_cache_stats(), "judge_flight": judge_flight.snapshot(), "scrape_flight": scrape_flight.snapshot(),
+            "scrape_cache": dict(SCRAPE_STATS), "search_cache": _search_cache_stats(),
+            "local_evidence": dict(LOCAL_EVIDENCE_STATS),
+            "jobs": {**job_workers.snapshot(), "queue": get_job_counts()}}
+
+# Search cache counters with the hit rate and total upstream time saved
+def _search_cache_stats():
+    stats = dict(SEARCH_STATS)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    stats["saved_ms"] = round(stats["saved_ms"], 1)
+    return stats
+
+CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+# Exposes the counters behind /cache_stats to /metrics
+def _collect_app_counters():
+    verdict, search = get_cache_stats(), _search_cache_stats()
+    jobs, upstreams = job_workers.snapshot(), upstream_snapshot()
+    return [
+        ("misinfo_cache_events_total", "counter", "Cache lookups by cache and outcome", ("cache", "event"), {
+            ("verdict", "hit"): verdict["hits"], ("verdict", "miss"): verdict["misses"],
+            ("verdict", "near_hit"): verdict["near_hits"],
+            ("search", "hit"): search["hits"], ("search", "miss"): search["misses"],
+            **{("scrape", event): count for event, count in SCRAPE_STATS.items()},
+        }),
+        ("misinfo_coalesced_total", "counter", "Callers served by another caller's in-flight execution", ("flight",), {
+            ("judge",): judge_flight.stats["coalesced"], ("scrape",): scrape_flight.stats["coalesced"],
+        }),
+        ("misinfo_upstream_inflight", "gauge", "Distinct upstream executions in flight", ("flight",), {
+            ("judge",): judge_flight.snapshot()["inflight"], ("scrape",): scrape_flight.snapshot()["inflight"],
+        }),
+        ("misinfo_jobs_total", "counter", "Background job outcomes", ("outcome",), {
+            (outcome,): jobs[outcome] for outcome in ("completed", "failed", "retried", "callbacks_failed")
+        }),
+        ("misinfo_circuit_state", "gauge", "Upstream circuit state (0 closed, 1 half-open, 2 open)", ("upstream",), {
+            (name,): CIRCUIT_STATES[upstream["state"]] for name, upstream in upstreams.items()
+        }),
+        ("misinfo_upstream_rate_limit", "gauge", "Current adaptive rate limit (calls/s)", ("upstream",), {
+            (name,): upstream["rate_limit"] for name, upstream in upstreams.items()
+        }),
+        ("misinfo_upstream_rejections_total", "counter", "Calls refused without reaching the upstream", ("upstream", "reason"), {
+            **{(name, "circuit_open"): upstream["rejected_open"] for name, upstream in upstreams.items()},
+            **{(name, "rate_limited"): upstream["rejected_rate"] for name, upstream in upstreams.items()},
+        }),
+        ("misinfo_upstream_retries_total", "counter", "Retried upstream calls", ("upstream",), {
+            (name,): upstream["retries"] for name, upstream in upstreams.items()
+        }),
+        ("misinfo_degraded_verdicts_total", "counter", "Model-unavailable requests by fallback outcome", ("outcome",), {
+            (outcome,): count for outcome, count in DEGRADED_STATS.items()
+        }),
+        ("misinfo_local_evidence_total", "counter", "Local evidence index lookups by outcome", ("outcome",), {
+            (outcome,): count for outcome, count in LOCAL_EVIDENCE_STATS.items()
+        }),
+        ("misinfo_startup_seconds", "gauge", "Time spent in each boot phase", ("phase",), {
+            (phase,): round(seconds, 4) for phase, seconds in STARTUP_TIMINGS.items()
+        }),
+    ]
+
+register_collector(_collect_app_counters)
+
+# Prometheus scrape endpoint: per-stage latency histograms, request metrics, cache and upstream counters
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
+
+# Returns the operational status of the API server: "degraded" while any upstream circuit is not closed
 @app.get("/health")
 def health():
-    return {"status": "ok"}
+    upstreams = upstream_snapshot()
+    status = "ok" if all(upstream["state"] == "closed" for upstream in upstreams.values()) else "degraded"
+    startup_ms = {phase: round(seconds * 1000, 1) for phase, seconds in STARTUP_TIMINGS.items()}
+    return {"status": status, "upstreams": upstreams, "startup_ms": startup_ms}
 
 # Simple root endpoint to verify the API is running and welcome users
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the Misinformation Detector!"}
 
-# Analyzes raw news text, checks for cached results, and stores the verdict
+# Analyzes raw news text, checks for cached results, and stores the verdict.
+# The route is async end to end: upstream HTTP calls are awaited and the (fast) SQLite calls
+# run in worker threads, so a slow search or inference no longer pins a threadpool thread.
 @app.post("/predict")
-def predict(req: PredictRequest):
+async def predict(req: PredictRequest):
     try:
-        # Check cache (Logic remains same)
-        cached = check_cache(req.text)
-        if cached:
-            return {**cached, "id": "CACHED", "source": "database"}
-        
-        result = judge_news(req.text)
-        record_id = str(uuid.uuid4())[:8]
-        
-        record = {
-            "id": record_id,
-            "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "input_type": "text",
-            "url": "",
-            "title": "N/A",
-            "text": req.text,
-            "label": result.get("label"),
-            "confidence": result.get("confidence"),
-            "explanation": result.get("explanation"),
-            "reviewer_feedback": "The user did not post a feedback."
-        }
-        # Updated to include user_id
-        append_record(record, req.user_id)
-        return {"id": record_id, **result}
+        return await run_text_analysis(req.text, req.user_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # Scrapes content from a provided URL and performs misinformation analysis
 @app.post("/analyze_url")
-def analyze_url(req: ScrapeRequest):
+async def analyze_url(req: ScrapeRequest):
     try:
-        article = scrape_article(req.url)
-        
-        cached = check_cache(article["text"])
+        return await run_url_analysis(req.url, req.user_id)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Queues a background job and wakes an idle worker; the client polls status_url or waits for its callback
+async def _submit_job(kind: str, payload: dict, callback_url: str = None) -> dict:
+    job_id = uuid.uuid4().hex
+    await asyncio.to_thread(enqueue_job, job_id, kind, payload, callback_url, job_workers.max_attempts())
+    job_workers.notify()
+    return {"job_id": job_id, "status": "queued", "status_url": f"/jobs/{job_id}"}
+
+# Asynchronous variant of /predict: returns a job id at once instead of holding the request open
+@app.post("/jobs/predict", status_code=202)
+async def submit_predict_job(req: JobPredictRequest):
+    return await _submit_job("text", {"text": req.text, "user_id": req.user_id}, req.callback_url)
+
+# Asynchronous variant of /analyze_url
+@app.post("/jobs/analyze_url", status_code=202)
+async def submit_url_job(req: JobScrapeRequest):
+    return await _submit_job("url", {"url": req.url, "user_id": req.user_id}, req.callback_url)
+
+# Reports a job's status, attempts, timing fields and, once done, its result (or last error)
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = await asyncio.to_thread(get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+# Formats one Server-Sent Events frame
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# Shared generator behind the streaming routes: cache check, then search and LLM token events,
+# then the persisted verdict. Errors are reported as an "error" event because the 200 status is already sent.
+async def _stream_analysis(text: str, user_id: int, input_type: str, url: str = "", title: str = "N/A"):
+    try:
+        cached = await asyncio.to_thread(lookup_verdict, text)
         if cached:
-            return {**cached, "source": "database"}
+            verdict = dict(cached)
+            if input_type == "text":
+                verdict["id"] = "CACHED"
+            yield _sse("cache_hit", verdict)
+            yield _sse("verdict", verdict)
+            return
+
+        result = None
+        async for event, data in judge_stream_coalesced(text, is_url=(input_type == "url")):
+            if event == "verdict":
+                result = data
+            else:
+                yield _sse(event, data)
+
+        yield _sse("verdict", await store_verdict(result, user_id, text, input_type, url, title))
+    except Exception as e:
+        yield _sse("error", {"detail": str(e)})
+
+# Streaming variant of /predict over Server-Sent Events
+@app.post("/predict_stream")
+async def predict_stream(req: PredictRequest):
+    return StreamingResponse(_stream_analysis(req.text, req.user_id, "text"), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# Streaming variant of /analyze_url: emits a "scraped" event before the analysis events
+@app.post("/analyze_url_stream")
+async def analyze_url_stream(req: ScrapeRequest):
+    async def events():
+        try:
+            article = await scrape_coalesced(req.url)
+        except Exception as e:
+            yield _sse("error", {"detail": str(e)})
+            return
+        yield _sse("scraped", {"url": article["url"], "title": article["title"], "chars": len(article["text"])})
+        async for frame in _stream_analysis(article["text"], req.user_id, "url", article["url"], article["title"]):
+            yield frame
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# Reads the fan-out limit and maximum item count for the batch endpoints
+def _batch_settings():
+    return int(os.getenv("BATCH_CONCURRENCY", "5")), int(os.getenv("BATCH_MAX_ITEMS", "100"))
+
+# Near-duplicate matches (see lookup_verdict) of the texts the exact cache missed, keyed by digest
+def _near_duplicates(texts: dict) -> dict:
+    found = {}
+    for digest, text in texts.items():
+        near = find_near_duplicate(text)
+        if near:
+            found[digest] = near
+    return found
 
-        result = judge_news(article["text"], is_url=True) 
-        
-        record_id = str(uuid.uuid4())[:8] 
-        record = {
-            "id": record_id,
-            "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "input_type": "url",
-            "url": article["url"],
-            "title": article["title"],
-            "text": article["text"],
-            "label": result.get('label'),
-            "confidence": result.get('confidence'),
-            "explanation": result.get('explanation'),
-            "reviewer_feedback": "The user did not post a feedback."
-        }
+# Runs the analysis for deduplicated texts: one cache query, bounded concurrent judging, one write transaction.
+# Exact cache misses go through the near-duplicate index, as in lookup_verdict.
+# articles is a list of {"text", "url", "title"} dicts; returns one result dict per article, in order.
+async def _analyze_batch(articles: list, user_id: int, input_type: str) -> list:
+    concurrency, _ = _batch_settings()
+    digests = [text_digest(article["text"]) for article in articles]
+    with stage("cache"):
+        cached = await asyncio.to_thread(check_cache_many, [article["text"] for article in articles])
+        misses = {digest: article["text"] for article, digest in zip(articles, digests) if digest not in cached}
+        similar = await asyncio.to_thread(_near_duplicates, misses) if misses else {}
+
+    # First occurrence of each uncached digest is the one sent to the model
+    pending = {}
+    for article, digest in zip(articles, digests):
+        if digest not in cached and digest not in similar and digest not in pending:
+            pending[digest] = article
+
+    semaphore = asyncio.Semaphore(concurrency)
+    async def judge(article):
+        async with semaphore:
+            return await judge_coalesced(article["text"], is_url=(input_type == "url"))
+
+    outcomes = await asyncio.gather(*[judge(article) for article in pending.values()], return_exceptions=True)
+
+    judged, records = {}, []
+    for (digest, article), outcome in zip(pending.items(), outcomes):
+        if isinstance(outcome, Exception):
+            judged[digest] = {"error": str(outcome)}
+            continue
+        if not is_storable(outcome):
+            judged[digest] = {"id": "CACHED" if outcome.get("degraded") else None, **outcome}
+            continue
+        record = build_record(outcome, article["text"], input_type, article.get("url", ""), article.get("title", "N/A"))
+        records.append(record)
+        judged[digest] = {"id": record["id"], **outcome}
+    if records:
         # Updated to include user_id
-        append_record(record, req.user_id)
-        return {"id": record_id, **result}
+        await asyncio.to_thread(append_records, records, user_id)
+
+    results = []
+    for digest in digests:
+        if digest in cached:
+            results.append({**cached[digest], "source": "database"})
+        elif digest in similar:
+            results.append({**similar[digest], "source": "similarity"})
+        else:
+            results.append(dict(judged[digest]))
+    return results
+
+# Rejects empty or oversized batches before any work is done
+def _check_batch_size(items: list):
+    _, max_items = _batch_settings()
+    if not items:
+        raise HTTPException(status_code=400, detail="Batch is empty")
+    if len(items) > max_items:
+        raise HTTPException(status_code=400, detail=f"Batch exceeds the {max_items}-item limit")
+
+# Analyzes a list of news texts; duplicates are judged once and results come back in input order
+@app.post("/predict_batch")
+async def predict_batch(req: BatchPredictRequest):
+    _check_batch_size(req.texts)
+    try:
+        articles = [{"text": text, "url": "", "title": "N/A"} for text in req.texts]
+        results = await _analyze_batch(articles, req.user_id, "text")
+        return {"results": [{"index": i, **result} for i, result in enumerate(results)]}
     except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Canonical form of each batch URL, or the error that made it unusable
+def _canonical_keys(urls: list) -> list:
+    keys = []
+    for url in urls:
+        try:
+            keys.append(canonicalize_url(url))
+        except Exception as e:
+            keys.append(e)
+    return keys
+
+# Scrapes and analyzes a list of URLs; scraping shares the same concurrency limit as judging.
+# A malformed or unreachable URL gets an "error" entry; the other items are still analyzed.
+@app.post("/analyze_url_batch")
+async def analyze_url_batch(req: BatchScrapeRequest):
+    _check_batch_size(req.urls)
+    try:
+        concurrency, _ = _batch_settings()
+        keys = _canonical_keys(req.urls)
+        unique_urls = list(dict.fromkeys(key for key in keys if isinstance(key, str)))
+        semaphore = asyncio.Semaphore(concurrency)
+        async def scrape(url):
+            async with semaphore:
+                return await scrape_coalesced(url)
+
+        scraped = dict(zip(unique_urls, await asyncio.gather(*[scrape(url) for url in unique_urls], return_exceptions=True)))
+        articles = {url: article for url, article in scraped.items() if not isinstance(article, Exception)}
+        analyzed = dict(zip(articles, await _analyze_batch(list(articles.values()), req.user_id, "url"))) if articles else {}
+
+        results = []
+        for i, (url, key) in enumerate(zip(req.urls, keys)):
+            if isinstance(key, Exception):
+                outcome = {"error": str(key)}
+            elif isinstance(scraped[key], Exception):
+                outcome = {"error": str(scraped[key])}
+            else:
+                outcome = analyzed[key]
+            results.append({"index": i, "url": url, **outcome})
+        return {"results": results}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 # Fetches a list of previous analysis records filtered by the user's ID    
+# Newest first, one keyset page at a time: the body stays a list of records and the cursor for the
+# next page, if any, is returned in the X-Next-Cursor header. fields is a comma-separated projection.
 @app.get("/history")
-def history(user_id: int, limit: int = 50):
+def history(response: Response, user_id: int, limit: int = Query(50, ge=1, le=HISTORY_MAX_PAGE),
+            cursor: str | None = None, fields: str | None = None, authorization: str = Header(default="")):
+    require_session(user_id, authorization)
     try:
         # Pass user_id to filter history
-        df = read_history(user_id, limit)
-        return df.to_dict(orient="records")
+        rows, next_cursor = read_history_page(user_id, limit, cursor, fields.split(",") if fields else None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
+
+# Streams a filtered history export as NDJSON, CSV or Parquet, chunk by chunk from an SQLite cursor.
+# A user's own export needs their session token. Without user_id the export covers every user and needs
+# "Authorization: Bearer <EXPORT_ADMIN_TOKEN>"; it is disabled when no admin token is configured.
+@app.get("/export")
+def export_history(format: str = "ndjson", user_id: int | None = None, label: str | None = None,
+                   since: str | None = None, until: str | None = None, input_type: str | None = None,
+                   authorization: str = Header(default="")):
+    if user_id is None:
+        admin_token = os.getenv("EXPORT_ADMIN_TOKEN")
+        if not admin_token or not hmac.compare_digest(authorization.removeprefix("Bearer ").strip(), admin_token):
+            raise HTTPException(status_code=403, detail="System-wide export requires the admin token")
+    else:
+        require_session(user_id, authorization)
+    chunks = iter_history(user_id=user_id, label=label, since=since, until=until, input_type=input_type,
+                          chunk_size=int(os.getenv("EXPORT_CHUNK_ROWS", "5000")))
+    try:
+        body = export_stream(chunks, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    media_type, extension = EXPORT_FORMATS[format]
+    return StreamingResponse(body, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="history-export.{extension}"'})
 
 # Updates the feedback field of an existing record in the database
 @app.post("/update_feedback")
@@ -173,10 +696,14 @@ def update_feedback(req: FeedbackRequest):
 
 # Deletes all analysis history records associated with a specific user 
 @app.post("/clear_history")
-def clear_history(user_id: int):
+def clear_history(user_id: int, authorization: str = Header(default="")):
+    require_session(user_id, authorization)
     try:
         # Only clear records for this specific user
         clear_all_history(user_id)
         return {"status": "success", "message": "Your history cleared"}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Database Error: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Database Error: {str(e)}")
+
+# Taken last, so it covers the models and routes defined above
+STARTUP_TIMINGS["import"] = time.perf_counter() - _import_started
@@ -0,0 +1,182 @@
+import os
+import time
+import bisect
+import threading
+import contextlib
+import contextvars
+
+# Minimal Prometheus text-format metrics. Each metric keeps plain dicts keyed by label values behind
+# an uncontended lock, so recording a sample costs well under a microsecond; rendering happens only
+# when /metrics is scraped.
+
+# Upper bounds (seconds) shared by every latency histogram: sub-millisecond cache hits up to slow inference
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Upper bounds for prompt sizes, in tokens
+TOKEN_BUCKETS = (64, 128, 256, 384, 512, 640, 768, 1024, 1536, 2048, 4096)
+
+# Formats a label set as {a="x",b="y"}
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, label_names: tuple = ()):
+        self.name, self.help, self.label_names = name, help_text, label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_labels(self.label_names, labels)} {value}" for labels, value in items]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, label_names: tuple = (), buckets: tuple = BUCKETS):
+        self.name, self.help, self.label_names = name, help_text, label_names
+        self.buckets = buckets
+        self._series = {}   # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, *labels, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *labels) -> int:
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, list(series[0]), series[1], series[2]) for labels, series in self._series.items()]
+        lines = []
+        for labels, buckets, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), buckets):
+                cumulative += bucket_count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {count}")
+        return lines
+
+STAGE_SECONDS = Histogram("misinfo_stage_duration_seconds",
+                          "Time spent in each analysis stage (cache, scrape, search, llm, parse, db_write)", ("stage",))
+STAGE_INFLIGHT = Gauge("misinfo_stage_inflight", "Stage executions currently running", ("stage",))
+REQUEST_SECONDS = Histogram("misinfo_request_duration_seconds", "HTTP request latency by route", ("route",))
+REQUESTS_TOTAL = Counter("misinfo_requests_total", "HTTP requests by route and status", ("route", "status"))
+REQUESTS_INFLIGHT = Gauge("misinfo_requests_inflight", "HTTP requests currently being served")
+UPSTREAM_FAILURES = Counter("misinfo_upstream_failures_total", "Failed calls to an upstream (tavily, hf, scrape)", ("upstream",))
+PARSE_FALLBACKS = Counter("misinfo_parse_fallbacks_total", "Model outputs that were not valid JSON and fell back to uncertain")
+PROMPT_TOKENS = Histogram("misinfo_prompt_tokens", "Tokens sent to the model per judge prompt, by part (claim, evidence, earlier, total)",
+                          ("part",), buckets=TOKEN_BUCKETS)
+
+_METRICS = [STAGE_SECONDS, STAGE_INFLIGHT, REQUEST_SECONDS, REQUESTS_TOTAL, REQUESTS_INFLIGHT, UPSTREAM_FAILURES, PARSE_FALLBACKS,
+            PROMPT_TOKENS]
+# Callables returning (name, kind, help, label_names, {label values: value}) for counters owned elsewhere
+_COLLECTORS = []
+
+# Per-request stage durations (seconds); set by MetricsMiddleware, None outside a request
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+# Times a block as one analysis stage: histogram, in-flight gauge and the current request's breakdown.
+# Works around awaits too (a plain `with`), and the contextvar follows asyncio.to_thread into threads.
+@contextlib.contextmanager
+def stage(name: str):
+    STAGE_INFLIGHT.inc(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_INFLIGHT.dec(name)
+        STAGE_SECONDS.observe(name, value=elapsed)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + elapsed
+
+# Registers a collector for counters kept in other modules (cache stats, single-flight, jobs)
+def register_collector(collector):
+    _COLLECTORS.append(collector)
+
+# Renders every metric and collector in the Prometheus text exposition format
+def render() -> str:
+    lines = []
+    for metric in _METRICS:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    for collector in _COLLECTORS:
+        for name, kind, help_text, label_names, values in collector():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{name}{_labels(label_names, labels)} {value}" for labels, value in values.items())
+    return "\n".join(lines) + "\n"
+
+# Formats the stage breakdown as a Server-Timing header value (durations in milliseconds)
+def server_timing(timings: dict, total: float) -> bytes:
+    parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts).encode("latin-1")
+
+# Pure ASGI middleware: request latency/count by route template, the in-flight gauge, and an optional
+# Server-Timing header with the per-stage breakdown. The header is added when METRICS_TIMING_HEADERS=1
+# or the client sends "X-Stage-Timing: 1"; streaming responses send headers before any stage runs.
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self.always_time = os.getenv("METRICS_TIMING_HEADERS", "0") == "1"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timings = {}
+        token = _request_timings.set(timings)
+        want_header = self.always_time or (b"x-stage-timing", b"1") in scope.get("headers", ())
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if want_header:
+                    header = server_timing(timings, time.perf_counter() - started)
+                    message = {**message, "headers": [*message.get("headers", []), (b"server-timing", header)]}
+            await send(message)
+
+        REQUESTS_INFLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            REQUESTS_INFLIGHT.dec()
+            _request_timings.reset(token)
+            # Route template (e.g. /jobs/{job_id}) keeps label cardinality bounded
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_SECONDS.observe(route, value=time.perf_counter() - started)
+            REQUESTS_TOTAL.inc(route, str(status))
@@ -0,0 +1,264 @@
+import os
+import sys
+import time
+import random
+import asyncio
+import threading
+
+# Raised without calling the upstream: its circuit is open, or its token bucket cannot serve the
+# call within the allowed wait. Both mean "fail fast" to the caller.
+class UpstreamUnavailable(Exception):
+    pass
+
+class CircuitOpenError(UpstreamUnavailable):
+    pass
+
+class RateLimitedError(UpstreamUnavailable):
+    pass
+
+# Per-upstream limits read from the environment, e.g. HF_RATE_LIMIT or TAVILY_BREAKER_FAILURES
+def _upstream_settings(name: str) -> dict:
+    prefix = name.upper()
+    return {
+        "rate": float(os.getenv(f"{prefix}_RATE_LIMIT", "0")),         # calls per second, 0 = unlimited (default)
+        "burst": int(os.getenv(f"{prefix}_BURST", "10")),
+        "max_wait": float(os.getenv(f"{prefix}_MAX_QUEUE_WAIT", "5")),   # longest a call may wait for a token
+        "failures": int(os.getenv(f"{prefix}_BREAKER_FAILURES", "5")),   # consecutive failures that open the circuit
+        "reset": float(os.getenv(f"{prefix}_BREAKER_RESET", "30")),      # seconds open before a half-open probe
+        "retries": int(os.getenv(f"{prefix}_RETRIES", "2")),
+        "retry_base": float(os.getenv(f"{prefix}_RETRY_BASE", "0.5")),
+    }
+
+# Token bucket whose rate adapts: halved on every 429, then restored by 5% of the configured rate per success
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.configured_rate = self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    # Takes a token and returns how long the caller must wait for it, or None (nothing taken) if that exceeds max_wait.
+    # Tokens may go negative: each queued caller reserves the slot after the previous one.
+    def reserve(self, max_wait: float):
+        if self.configured_rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+            if wait > max_wait:
+                return None
+            self._tokens -= 1
+            return wait
+
+    def penalize(self):
+        with self._lock:
+            self.rate = max(self.configured_rate / 16, self.rate / 2)
+
+    def recover(self):
+        if self.rate < self.configured_rate:
+            with self._lock:
+                self.rate = min(self.configured_rate, self.rate + self.configured_rate * 0.05)
+
+# Consecutive-failure circuit breaker: closed -> open after N failures -> half-open after the reset
+# timeout, where a single probe call decides between closed and open again
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    # Admits a call; returns (allowed, probe) where probe tells whether it took the half-open probe slot
+    def claim(self) -> tuple:
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state, self._probing = self.HALF_OPEN, False
+            if self.state == self.CLOSED:
+                return True, False
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True, True
+            return False, False
+
+    def allow(self) -> bool:
+        return self.claim()[0]
+
+    # Read-only check used to skip work up front (does not claim the half-open probe)
+    def is_open(self) -> bool:
+        return self.state == self.OPEN and time.monotonic() - self._opened_at < self.reset_timeout
+
+    def record_success(self):
+        with self._lock:
+            self.state, self.failures, self._probing = self.CLOSED, 0, False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state, self._opened_at, self._probing = self.OPEN, time.monotonic(), False
+
+    # Gives back a half-open probe slot that was claimed but not used
+    def release(self):
+        with self._lock:
+            self._probing = False
+
+# HTTP status carried by an upstream exception (huggingface_hub, httpx and requests errors keep .response)
+def _status_code(error: Exception):
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None) or getattr(error, "status_code", None)
+
+# Network error types of the HTTP libraries. Looked up in sys.modules rather than imported: an error
+# from a library can only exist once that library has been loaded by the client that raised it.
+def _network_errors() -> tuple:
+    errors = [TimeoutError, asyncio.TimeoutError, ConnectionError]
+    httpx, requests = sys.modules.get("httpx"), sys.modules.get("requests")
+    if httpx is not None:
+        errors.append(httpx.TransportError)
+    if requests is not None:
+        errors += [requests.ConnectionError, requests.Timeout]
+    return tuple(errors)
+
+# Timeouts, connection failures, 429 and 5xx are worth retrying and count against the breaker
+def is_transient(error: Exception) -> bool:
+    if isinstance(error, _network_errors()):
+        return True
+    status = _status_code(error)
+    return status is not None and (status == 429 or status >= 500)
+
+# Retry-After seconds from a 429/503 response, if the upstream sent one
+def _retry_after(error: Exception):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+# Rate limit + circuit breaker + jittered retries around one upstream service
+class Upstream:
+    def __init__(self, name: str):
+        self.name = name
+        settings = _upstream_settings(name)
+        self.bucket = TokenBucket(settings["rate"], settings["burst"])
+        self.breaker = CircuitBreaker(settings["failures"], settings["reset"])
+        self.max_wait = settings["max_wait"]
+        self.retries = settings["retries"]
+        self.retry_base = settings["retry_base"]
+        self.stats = {"calls": 0, "failures": 0, "retries": 0, "rejected_open": 0, "rejected_rate": 0}
+
+    # Claims the breaker and a token; returns the wait before the call may start and whether the call
+    # is the half-open probe
+    def _admit(self) -> tuple:
+        allowed, probe = self.breaker.claim()
+        if not allowed:
+            self.stats["rejected_open"] += 1
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        wait = self.bucket.reserve(self.max_wait)
+        if wait is None:
+            if probe:
+                self.breaker.release()
+            self.stats["rejected_rate"] += 1
+            raise RateLimitedError(f"{self.name} rate limit exceeded")
+        return wait, probe
+
+    # Books the outcome of a failed attempt; returns the backoff before a retry, or None to give up
+    def _failed(self, error: Exception, attempt: int):
+        if not is_transient(error):
+            # The upstream answered (bad request, auth...): not a health problem
+            self.breaker.record_success()
+            return None
+        self.stats["failures"] += 1
+        self.breaker.record_failure()
+        if _status_code(error) == 429:
+            self.bucket.penalize()
+        if attempt >= self.retries:
+            return None
+        self.stats["retries"] += 1
+        return min(_retry_after(error) or random.uniform(0, self.retry_base * 2 ** attempt), self.max_wait)
+
+    def _succeeded(self):
+        self.breaker.record_success()
+        self.bucket.recover()
+
+    # Awaits factory() under the limits, retrying transient failures with full-jitter backoff. An attempt
+    # cancelled before its outcome is known (e.g. the SSE client went away) gives back the probe slot,
+    # otherwise the breaker would stay half-open with nobody left to probe.
+    async def call(self, factory):
+        for attempt in range(self.retries + 1):
+            wait, probe = self._admit()
+            try:
+                if wait:
+                    await asyncio.sleep(wait)
+                self.stats["calls"] += 1
+                result = await factory()
+            except Exception as e:
+                backoff = self._failed(e, attempt)
+                if backoff is None:
+                    raise
+                await asyncio.sleep(backoff)
+                continue
+            except BaseException:
+                if probe:
+                    self.breaker.release()
+                raise
+            self._succeeded()
+            return result
+
+    # Blocking counterpart of call() for the sync pipeline
+    def call_sync(self, func):
+        for attempt in range(self.retries + 1):
+            wait, probe = self._admit()
+            try:
+                if wait:
+                    time.sleep(wait)
+                self.stats["calls"] += 1
+                result = func()
+            except Exception as e:
+                backoff = self._failed(e, attempt)
+                if backoff is None:
+                    raise
+                time.sleep(backoff)
+                continue
+            except BaseException:
+                if probe:
+                    self.breaker.release()
+                raise
+            self._succeeded()
+            return result
+
+    # Records the outcome of a call made outside call() (e.g. an interrupted token stream)
+    def record(self, error: Exception = None):
+        if error is None:
+            self._succeeded()
+        else:
+            self._failed(error, self.retries)
+
+    def snapshot(self) -> dict:
+        return {"state": self.breaker.state, "consecutive_failures": self.breaker.failures,
+                "rate_limit": round(self.bucket.rate, 3), **self.stats}
+
+# One Upstream per service, created on first use so the environment is read after .env is loaded
+_upstreams = {}
+_upstreams_lock = threading.Lock()
+
+def get_upstream(name: str) -> Upstream:
+    upstream = _upstreams.get(name)
+    if upstream is None:
+        with _upstreams_lock:
+            upstream = _upstreams.setdefault(name, Upstream(name))
+    return upstream
+
+def upstream_snapshot() -> dict:
+    return {name: get_upstream(name).snapshot() for name in ("tavily", "hf")}
+
+# Drops all limiter/breaker state (tests, or after changing the settings)
+def reset_upstreams():
+    with _upstreams_lock:
+        _upstreams.clear()
@@ -0,0 +1,148 @@
+"""
+Offline batch scoring for a JSONL or CSV corpus of claims.
+
+Reads items from the corpus, serves texts the verdict cache (exact or
+near-duplicate) already knows without calling any upstream, and runs the rest
+through judge_news_async with bounded concurrency and a request rate limit.
+Results are appended to a JSONL file as they complete; that file is also the checkpoint, so re-running the
+same command after an interruption skips every item already written.
+
+    python -m backend.score_corpus claims.jsonl scored.jsonl [--text-field text] [--id-field id]
+                                   [--concurrency 5] [--rate 2] [--user-id 1]
+"""
+import os
+import csv
+import sys
+import json
+import time
+import uuid
+import asyncio
+import argparse
+from backend.coalescing import SingleFlight
+from backend.llm_judge import judge_news_async, close_clients
+from backend.storage import init_engine, shutdown_engine, check_cache, find_near_duplicate, append_record, text_digest
+
+# Spaces upstream calls at least 1/rate seconds apart (rate <= 0 disables the limit)
+class RateLimiter:
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+# Yields (item_id, text) from a .jsonl or .csv corpus; the id falls back to the 1-based line/row number
+def read_corpus(path: str, text_field: str = "text", id_field: str = "id"):
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for number, row in enumerate(rows, start=1):
+            text = row.get(text_field)
+            if text:
+                yield str(row.get(id_field) or number), text
+
+# Reads the ids already present in the output file and cuts off a half-written last line
+def load_checkpoint(path: str) -> set:
+    if not os.path.exists(path):
+        return set()
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+            data = data[:data.rfind(b"\n") + 1]
+    return {json.loads(line)["item_id"] for line in data.splitlines() if line.strip()}
+
+# judge_news_async reports upstream failures as a flagged "uncertain" verdict; those are retried on the next run
+def _inference_failed(result: dict) -> bool:
+    return bool(result.get("inference_failed"))
+
+# Scores the corpus and returns counters. Duplicate texts inside the corpus share one judge call.
+async def score_corpus(corpus: str, output: str, text_field: str = "text", id_field: str = "id",
+                       concurrency: int = 5, rate: float = 0, user_id: int = None) -> dict:
+    done = load_checkpoint(output)
+    stats = {"resumed": 0, "cached": 0, "judged": 0, "failed": 0}
+    limiter, flight = RateLimiter(rate), SingleFlight("corpus")
+    slots = asyncio.Semaphore(concurrency)
+
+    # Runs once per distinct text; with user_id the fresh verdict is stored like an API analysis
+    async def judge(text: str) -> dict:
+        await limiter.wait()
+        result = await judge_news_async(text)
+        if user_id is not None and not _inference_failed(result):
+            # Same row shape as the API's build_record
+            record = {"id": str(uuid.uuid4())[:8], "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+                      "input_type": "text", "url": "", "title": "N/A", "text": text,
+                      "label": result.get("label"), "confidence": result.get("confidence"),
+                      "explanation": result.get("explanation"),
+                      "reviewer_feedback": "The user did not post a feedback."}
+            await asyncio.to_thread(append_record, record, user_id)
+        return result
+
+    with open(output, "a", encoding="utf-8") as out:
+        async def score(item_id: str, text: str):
+            try:
+                cached = await asyncio.to_thread(check_cache, text)
+                near = None if cached else await asyncio.to_thread(find_near_duplicate, text)
+                if cached or near:
+                    result, stats_key = {**(cached or near), "source": "database" if cached else "similarity"}, "cached"
+                else:
+                    result = dict(await flight.run(text_digest(text), lambda: judge(text)))
+                    if _inference_failed(result):
+                        stats["failed"] += 1
+                        return
+                    result, stats_key = {**result, "source": "model"}, "judged"
+            except Exception as e:
+                print(f"Item {item_id} failed: {e}", file=sys.stderr)
+                stats["failed"] += 1
+                return
+            finally:
+                slots.release()
+            out.write(json.dumps({"item_id": item_id, **result}) + "\n")
+            out.flush()
+            stats[stats_key] += 1
+
+        tasks = []
+        for item_id, text in read_corpus(corpus, text_field, id_field):
+            if item_id in done:
+                stats["resumed"] += 1
+                continue
+            # Bounded in-flight work: the corpus is read only as fast as items finish
+            await slots.acquire()
+            tasks.append(asyncio.create_task(score(item_id, text)))
+        await asyncio.gather(*tasks)
+    return stats
+
+async def _run(args) -> dict:
+    init_engine(args.db) if args.db else init_engine()
+    try:
+        return await score_corpus(args.corpus, args.output, args.text_field, args.id_field,
+                                  args.concurrency, args.rate, args.user_id)
+    finally:
+        await close_clients()
+        shutdown_engine()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus", help="input .jsonl or .csv file")
+    parser.add_argument("output", help="JSONL results file; also the resume checkpoint")
+    parser.add_argument("--text-field", default="text")
+    parser.add_argument("--id-field", default="id")
+    parser.add_argument("--concurrency", type=int, default=5)
+    parser.add_argument("--rate", type=float, default=2.0, help="max upstream analyses per second (0 = unlimited)")
+    parser.add_argument("--user-id", type=int, default=None, help="also store new verdicts in this user's history (and the cache)")
+    parser.add_argument("--db", default=None, help="SQLite file or postgresql:// URL (defaults to the API's database)")
+    stats = asyncio.run(_run(parser.parse_args(argv)))
+    print(" ".join(f"{key}={value}" for key, value in stats.items()))
+
+if __name__ == "__main__":
+    main()
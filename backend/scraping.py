@@ -1,32 +1,156 @@
-import requests
-from bs4 import BeautifulSoup
+import os
+import re
+import time
+import asyncio
+import logging
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from backend.extraction import StreamingExtractor
+from backend.storage import get_scrape_entry, save_scrape_entry, touch_scrape_entry
+from backend.metrics import stage, UPSTREAM_FAILURES
 
-# Fetches the HTML content of a given URL and extracts the article title and all paragraph text
+logger = logging.getLogger(__name__)
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0"
+}
+
+# Query parameters that only carry campaign/click tracking and never change the article
+TRACKING_PARAMS = {"fbclid", "gclid", "dclid", "gbraid", "wbraid", "msclkid", "yclid", "igshid",
+                   "mc_cid", "mc_eid", "_ga", "_gl", "ref_src", "cmpid", "ocid"}
+
+# Pulls the charset out of a Content-Type header
+_CHARSET_RE = re.compile(r"charset=[\"']?([\w.:-]+)", re.IGNORECASE)
+
+# Counters for the URL-level scrape cache
+SCRAPE_STATS = {"fresh_hits": 0, "revalidated": 0, "downloads": 0}
+
+# Normalizes a URL so that links to the same article share one cache key:
+# lowercases scheme/host, drops default ports, fragments and tracking parameters, and sorts the query
+def canonicalize_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and (scheme, parts.port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in TRACKING_PARAMS
+    )
+    return urlunsplit((scheme, host, parts.path or "/", urlencode(query), ""))
+
+# Download cap (bytes), extracted-text budget (chars) and extractor mode ("fast" or "full")
+def _extraction_settings():
+    return (int(os.getenv("SCRAPE_MAX_BYTES", str(1_500_000))), int(os.getenv("SCRAPE_MAX_CHARS", "4000")),
+            os.getenv("SCRAPE_EXTRACTOR", "fast"))
+
+# Freshness window (seconds) and maximum number of cached articles
+def _scrape_cache_settings():
+    return int(os.getenv("SCRAPE_CACHE_TTL", "600")), int(os.getenv("SCRAPE_CACHE_MAX_ENTRIES", "1000"))
+
+# Parses downloaded HTML and extracts the article title and all paragraph text
+def _extract_article(url: str, html: str) -> dict:
+    # bs4 is only needed in "full" extraction mode, so it is imported on first use
+    from bs4 import BeautifulSoup
+
+    # Parses the HTML content
+    soup = BeautifulSoup(html, "html.parser")
+
+    # Extracts the page title or sets a default if not found
+    title = soup.title.get_text(strip=True) if soup.title else "No title"
+
+    # Collects text from all <p> tags and joins them into a single string
+    paragraphs = [p.get_text(" ", strip=True) for p in soup.find_all("p")]
+    text = "\n".join([p for p in paragraphs if p])
+
+    logger.debug("Extracted text from %s: %.500s...", url, text)
+
+    return {"url": url, "title": title, "text": text}
+
+# Charset from the Content-Type header, defaulting to UTF-8
+def _charset(content_type: str) -> str:
+    match = _CHARSET_RE.search(content_type or "")
+    return match.group(1) if match else "utf-8"
+
+# Fetches the HTML content of a given URL and extracts the article title and paragraph text
 def scrape_article(url: str, timeout: int = 10) -> dict:
-    headers = {
-        "User-Agent": "Mozilla/5.0"
-    }
+    import requests
+    max_bytes, max_chars, mode = _extraction_settings()
     try:
-        # Sends an HTTP GET request to the URL with a safety timeout
-        r = requests.get(url, headers=headers, timeout=timeout)
-        r.raise_for_status() # Raises an error if the request failed 
+        # Streams the response with a safety timeout; stops at the byte cap or once enough text is gathered
+        with stage("scrape"), requests.get(url, headers=HEADERS, timeout=timeout, stream=True) as r:
+            r.raise_for_status() # Raises an error if the request failed 
+            if mode == "full":
+                return _extract_article(url, r.text)
+
+            extractor = StreamingExtractor(max_chars, _charset(r.headers.get("Content-Type")))
+            received = 0
+            for chunk in r.iter_content(chunk_size=65536):
+                extractor.feed(chunk[:max_bytes - received])
+                received += len(chunk)
+                if received >= max_bytes or extractor.done:
+                    break
 
-        print(f"Status Code: {r.status_code}")
+        logger.debug("Scraped %s: status %s", url, r.status_code)
 
-        # Parses the HTML content
-        soup = BeautifulSoup(r.text, "html.parser")
+        return {"url": url, **extractor.finish()}
+    except Exception as e:
+        # Returns basic info with empty text if any error occurs during scraping
+        UPSTREAM_FAILURES.inc("scrape")
+        logger.warning("Error while scraping %s: %s", url, e)
+        return {"url": url, "title": "N/A", "text": ""}
 
-        # Extracts the page title or sets a default if not found
-        title = soup.title.get_text(strip=True) if soup.title else "No title"
+# Non-blocking variant of scrape_article: the download is awaited, the parse runs in a worker thread.
+# Articles are cached by canonical URL: fresh entries skip the network entirely, stale entries are
+# revalidated with If-None-Match/If-Modified-Since so a 304 skips both the download and the parse.
+async def scrape_article_async(url: str, timeout: int = 10, use_cache: bool = True) -> dict:
+    import httpx
+    ttl, max_entries = _scrape_cache_settings()
+    max_bytes, max_chars, mode = _extraction_settings()
+    url_key = canonicalize_url(url)
+    entry = await asyncio.to_thread(get_scrape_entry, url_key) if use_cache else None
+    if entry and time.time() - entry["fetched_at"] < ttl:
+        SCRAPE_STATS["fresh_hits"] += 1
+        return {"url": url, "title": entry["title"], "text": entry["text"]}
 
-        # Collects text from all <p> tags and joins them into a single string
-        paragraphs = [p.get_text(" ", strip=True) for p in soup.find_all("p")]
-        text = "\n".join([p for p in paragraphs if p])
+    headers = dict(HEADERS)
+    if entry and entry["etag"]:
+        headers["If-None-Match"] = entry["etag"]
+    if entry and entry["last_modified"]:
+        headers["If-Modified-Since"] = entry["last_modified"]
 
-        print(f"Extracted Text: {text[:500]}...") 
+    try:
+        with stage("scrape"):
+            async with httpx.AsyncClient(headers=headers, timeout=timeout, follow_redirects=True) as client:
+                async with client.stream("GET", url) as r:
+                    if r.status_code == 304 and entry:
+                        SCRAPE_STATS["revalidated"] += 1
+                        await asyncio.to_thread(touch_scrape_entry, url_key)
+                        return {"url": url, "title": entry["title"], "text": entry["text"]}
+                    r.raise_for_status()
+                    if mode == "full":
+                        await r.aread()
+                        article = await asyncio.to_thread(_extract_article, url, r.text)
+                    else:
+                        # Parse while downloading; the rest of the page is never fetched once enough
+                        # article text is gathered or the byte cap is reached
+                        extractor = StreamingExtractor(max_chars, _charset(r.headers.get("Content-Type")))
+                        received = 0
+                        async for chunk in r.aiter_bytes(65536):
+                            await asyncio.to_thread(extractor.feed, chunk[:max_bytes - received])
+                            received += len(chunk)
+                            if received >= max_bytes or extractor.done:
+                                break
+                        article = {"url": url, **extractor.finish()}
 
-        return {"url": url, "title": title, "text": text}
+        logger.debug("Scraped %s: status %s", url, r.status_code)
+        SCRAPE_STATS["downloads"] += 1
+
+        # Failed extractions are not cached so the next request tries again
+        if use_cache and article["text"]:
+            await asyncio.to_thread(save_scrape_entry, url_key, article["title"], article["text"],
+                                    r.headers.get("ETag"), r.headers.get("Last-Modified"), max_entries)
+        return article
     except Exception as e:
-        # Returns basic info with empty text if any error occurs during scraping
-        print(f"Error while scraping {url}: {e}")
-        return {"url": url, "title": "N/A", "text": ""}
\ No newline at end of file
+        UPSTREAM_FAILURES.inc("scrape")
+        logger.warning("Error while scraping %s: %s", url, e)
+        return {"url": url, "title": "N/A", "text": ""}
@@ -0,0 +1,63 @@
+import re
+import struct
+import hashlib
+import random
+from array import array
+
+# MinHash signatures with banded LSH. A signature has NUM_PERM 32-bit minimums; it is cut into
+# BANDS bands of ROWS values, and two texts become LSH candidates when any band matches exactly.
+# With 16 x 4 the candidate probability 1 - (1 - J^4)^16 is ~0.9998 at Jaccard 0.8 (NEAR_DUP_THRESHOLD),
+# ~0.64 at 0.5 (DEGRADED_NEAR_DUP_THRESHOLD, so degraded mode misses about a third of such matches) and
+# ~0.34 at 0.4; candidates are then filtered on their estimated similarity. Changing the banding means
+# re-indexing every stored signature.
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_WORDS = 3
+MAX_WORDS = 2000
+
+_MAX_HASH = (1 << 32) - 1
+# Each "permutation" XORs the 64-bit shingle hashes with a random mask; min() then runs in C, which is
+# ~4x faster than a*x+b mod p on Python ints. Fixed seed: signatures are persisted, so the masks
+# must be identical across processes.
+_rng = random.Random(1729)
+_MASKS = [_rng.getrandbits(64) for _ in range(NUM_PERM)]
+
+# Word 3-gram shingles of an already normalized text, hashed to 64-bit integers
+def _shingle_hashes(normalized_text: str) -> set:
+    words = re.findall(r"\w+", normalized_text)[:MAX_WORDS]
+    if len(words) < SHINGLE_WORDS:
+        shingles = {" ".join(words)} if words else set()
+    else:
+        shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    return {int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little") for s in shingles}
+
+# Counts the words a text contributes to its signature
+def word_count(normalized_text: str) -> int:
+    return len(re.findall(r"\w+", normalized_text))
+
+# Computes the MinHash signature of a normalized text as an array of NUM_PERM unsigned 32-bit values
+def minhash_signature(normalized_text: str) -> array:
+    hashes = _shingle_hashes(normalized_text)
+    if not hashes:
+        return array("I", [_MAX_HASH] * NUM_PERM)
+    return array("I", [min(map(mask.__xor__, hashes)) >> 32 for mask in _MASKS])
+
+# Packs a signature for storage in a BLOB column and back
+def pack_signature(signature: array) -> bytes:
+    return struct.pack(f"<{NUM_PERM}I", *signature)
+
+def unpack_signature(blob: bytes) -> array:
+    return array("I", struct.unpack(f"<{NUM_PERM}I", blob))
+
+# Returns (band, bucket) pairs; bucket is a signed 64-bit hash of the band's rows so it fits an SQLite INTEGER
+def band_buckets(signature: array) -> list:
+    buckets = []
+    for band in range(BANDS):
+        rows = struct.pack(f"<{ROWS}I", *signature[band * ROWS:(band + 1) * ROWS])
+        buckets.append((band, int.from_bytes(hashlib.blake2b(rows, digest_size=8).digest(), "little", signed=True)))
+    return buckets
+
+# Estimated Jaccard similarity: the fraction of matching MinHash values
+def estimate_similarity(first: array, second: array) -> float:
+    return sum(1 for x, y in zip(first, second) if x == y) / NUM_PERM
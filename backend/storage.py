@@ -1,17 +1,169 @@
 import os
+import re
+import json
+import base64
+import time
 import bcrypt 
 import sqlite3
-import pandas as pd
+import queue
+import hashlib
+import datetime
+import threading
+import logging
+import contextlib
+import unicodedata
+from backend.metrics import stage
+from backend.similarity import minhash_signature, pack_signature, unpack_signature, band_buckets, estimate_similarity, word_count
 
 
 # Use a data folder that will be mapped to Docker Volume
 DB_PATH = os.path.join("data", "news_database.db")
 
-# Checks for the existence of the database file
-def ensure_db_exists():
-    "Create database and table if they don't exist"
-    os.makedirs("data", exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+# URL prefixes that select the client/server driver (backend.storage_postgres) instead of a SQLite file
+SERVER_URL_PREFIXES = ("postgres://", "postgresql://")
+
+# Schema version recorded by the engine (PRAGMA user_version on SQLite) once the migrations below have run
+SCHEMA_VERSION = 5
+
+# Column order used by the prepared INSERT in append_record
+HISTORY_COLUMNS = ("id", "user_id", "timestamp", "input_type", "url", "title", "text",
+                   "label", "confidence", "explanation", "reviewer_feedback")
+_INSERT_HISTORY = (
+    f"INSERT INTO news_history ({', '.join(HISTORY_COLUMNS)}) "
+    f"VALUES ({', '.join('?' for _ in HISTORY_COLUMNS)})"
+)
+
+# Hit/miss counters for the verdict cache, plus rows backfilled by the migration and near-duplicate hits
+CACHE_STATS = {"hits": 0, "misses": 0, "backfilled": 0, "near_hits": 0}
+_stats_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+# Reduces a news text to a canonical form so trivially different copies share a cache entry
+def normalize_text(news_text: str) -> str:
+    "Unicode-normalize, casefold and collapse whitespace"
+    text = unicodedata.normalize("NFKC", news_text or "")
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+# Returns the SHA-256 digest of the normalized text, used as the verdict cache key
+def text_digest(news_text: str) -> str:
+    "Hex digest of the normalized text"
+    return hashlib.sha256(normalize_text(news_text).encode("utf-8")).hexdigest()
+
+# Reads the verdict cache TTL (seconds) from the environment; 0 or less means entries never expire
+def _cache_ttl() -> int:
+    try:
+        return int(os.getenv("VERDICT_CACHE_TTL", "0"))
+    except ValueError:
+        return 0
+
+# Converts the TEXT timestamp stored in news_history to epoch seconds
+def _to_epoch(timestamp) -> float:
+    try:
+        return datetime.datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S").timestamp()
+    except (TypeError, ValueError):
+        return time.time()
+
+# Turns the rows of an executed cursor into plain dicts keyed by column name
+def _fetch_dicts(cursor):
+    columns = [col[0] for col in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+# Reads the near-duplicate settings: minimum estimated Jaccard for a match (0 or less disables the
+# lookup) and the minimum word count for a text to be indexed or looked up (short claims flip meaning
+# with a single word, so they only ever use the exact cache)
+def _near_dup_settings():
+    try:
+        threshold = float(os.getenv("NEAR_DUP_THRESHOLD", "0.8"))
+    except ValueError:
+        threshold = 0.8
+    return threshold, int(os.getenv("NEAR_DUP_MIN_WORDS", "20"))
+
+def _bump(counter: str, amount: int = 1):
+    with _stats_lock:
+        CACHE_STATS[counter] += amount
+
+# Aggregate columns (total, fake, real, uncertain) used to build user_stats rows; LOWER() keeps the
+# match case-insensitive like the old str.lower() checks on every driver
+_AGGREGATE_STATS = """
+    COUNT(*),
+    COALESCE(SUM(CASE WHEN LOWER(label) LIKE '%fake%' THEN 1 ELSE 0 END), 0),
+    COALESCE(SUM(CASE WHEN LOWER(label) LIKE '%real%' THEN 1 ELSE 0 END), 0),
+    COALESCE(SUM(CASE WHEN LOWER(label) LIKE '%uncertain%' THEN 1 ELSE 0 END), 0)
+"""
+
+# Maps a verdict label to the (fake, real, uncertain) increments applied to user_stats
+def _label_flags(label):
+    label = (label or "").lower()
+    return int("fake" in label), int("real" in label), int("uncertain" in label)
+
+# Adds the label counts of freshly inserted records to each user's materialized counters
+def _increment_user_stats(conn, user_id: int, labels):
+    flags = [_label_flags(label) for label in labels]
+    conn.execute(
+        """
+        INSERT INTO user_stats (user_id, total, fake, real, uncertain) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET
+            total = user_stats.total + excluded.total,
+            fake = user_stats.fake + excluded.fake,
+            real = user_stats.real + excluded.real,
+            uncertain = user_stats.uncertain + excluded.uncertain
+        """,
+        (user_id, len(flags), sum(f[0] for f in flags), sum(f[1] for f in flags), sum(f[2] for f in flags)),
+    )
+
+# Applies schema migrations that have not yet run on this database
+def _migrate(conn, engine):
+    "Backfill derived tables (verdict_cache, user_stats) for rows written before they existed"
+    version = engine.schema_version(conn)
+    if version >= SCHEMA_VERSION:
+        return
+
+    if version < 1:
+        # Oldest record wins, matching the old "first matching row" behavior of check_cache
+        rows = conn.execute(
+            "SELECT id, timestamp, text, label, confidence, explanation FROM news_history ORDER BY timestamp ASC"
+        )
+        entries = [
+            (text_digest(text), record_id, label, confidence, explanation, _to_epoch(timestamp))
+            for record_id, timestamp, text, label, confidence, explanation in rows
+            if text is not None
+        ]
+        cursor = conn.executemany(
+            "INSERT INTO verdict_cache (digest, record_id, label, confidence, explanation, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (digest) DO NOTHING",
+            entries,
+        )
+        _bump("backfilled", max(cursor.rowcount, 0))
+
+    if version < 2:
+        conn.execute("DELETE FROM user_stats")
+        conn.execute(f"INSERT INTO user_stats (user_id, total, fake, real, uncertain) "
+                     f"SELECT user_id, {_AGGREGATE_STATS} FROM news_history GROUP BY user_id")
+
+    if version < 3:
+        rows = conn.execute("SELECT id, timestamp, text FROM news_history WHERE text IS NOT NULL")
+        for record_id, timestamp, text in rows.fetchall():
+            _index_signatures(conn, [(record_id, text)], _to_epoch(timestamp))
+
+    if version < 4:
+        # Keyset pagination compares (timestamp, id); NULL would drop rows from every page after the first
+        conn.execute("UPDATE news_history SET timestamp = '' WHERE timestamp IS NULL")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_news_history_user_ts ON news_history (user_id, timestamp, id)")
+
+    if version < 5:
+        rows = conn.execute("SELECT id, timestamp, title, url, text, label, explanation FROM news_history")
+        _index_analyses(conn, [(record_id, title, url, text, label, explanation, _to_epoch(timestamp))
+                               for record_id, timestamp, title, url, text, label, explanation in rows.fetchall()])
+        for query_key, results, fetched_at in conn.execute("SELECT query_key, results, fetched_at FROM search_cache").fetchall():
+            _index_search_results(conn, query_key, json.loads(results), fetched_at)
+
+    engine.set_schema_version(conn, SCHEMA_VERSION)
+
+# Creates the tables and runs pending migrations on an open connection. The DDL is written for SQLite;
+# the client/server driver translates the column types.
+def _setup_schema(conn, engine):
+    "Create tables if they don't exist"
     cursor = conn.cursor()
     
     # 1. New Users Table
@@ -41,50 +193,310 @@ def ensure_db_exists():
             FOREIGN KEY (user_id) REFERENCES users (id)
         )
     ''')
+
+    # 3. Verdict cache keyed by the normalized-text digest (PRIMARY KEY gives the lookup index)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS verdict_cache (
+            digest TEXT PRIMARY KEY,
+            record_id TEXT,
+            label TEXT,
+            confidence REAL,
+            explanation TEXT,
+            created_at REAL
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_verdict_cache_record ON verdict_cache (record_id)")
+
+    # 4. Per-user label counters kept in step with news_history by append_record/clear_all_history
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_stats (
+            user_id INTEGER PRIMARY KEY,
+            total INTEGER NOT NULL DEFAULT 0,
+            fake INTEGER NOT NULL DEFAULT 0,
+            real INTEGER NOT NULL DEFAULT 0,
+            uncertain INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+    # 5. Scraped-article cache keyed by canonical URL, with HTTP validators for conditional GETs
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS scrape_cache (
+            url_key TEXT PRIMARY KEY,
+            title TEXT,
+            text TEXT,
+            etag TEXT,
+            last_modified TEXT,
+            fetched_at REAL,
+            last_used REAL
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_scrape_cache_last_used ON scrape_cache (last_used)")
+
+    # 6. Tavily search results keyed by normalized query; latency_ms records what a hit saves
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS search_cache (
+            query_key TEXT PRIMARY KEY,
+            results TEXT,
+            latency_ms REAL,
+            fetched_at REAL,
+            last_used REAL
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_search_cache_last_used ON search_cache (last_used)")
+
+    # 7. MinHash signature per analyzed record, plus its LSH band buckets (PRIMARY KEY is the bucket lookup)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS similarity_signatures (
+            record_id TEXT PRIMARY KEY,
+            signature BLOB,
+            created_at REAL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS similarity_buckets (
+            band INTEGER,
+            bucket INTEGER,
+            record_id TEXT,
+            PRIMARY KEY (band, bucket, record_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_similarity_buckets_record ON similarity_buckets (record_id)")
+
+    # 8. Durable queue of background analyses. A worker leases a job by setting lease_until; a job whose
+    # lease ran out (its worker or process died) is claimable again, so jobs survive restarts.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            callback_url TEXT,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            next_run_at REAL,
+            lease_until REAL,
+            created_at REAL,
+            started_at REAL,
+            finished_at REAL,
+            run_ms REAL,
+            result TEXT,
+            error TEXT
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_next_run ON jobs (status, next_run_at)")
+
+    # 9. Local evidence: analyzed articles (kind 'analysis', ref = record id) and cached search results
+    # (kind 'search', ref = query key), full-text indexed by the engine's setup_text_search()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS evidence_documents (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            ref TEXT NOT NULL,
+            title TEXT,
+            url TEXT,
+            body TEXT,
+            label TEXT,
+            summary TEXT,
+            created_at REAL
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_evidence_documents_ref ON evidence_documents (ref)")
+    engine.setup_text_search(conn)
+
+    _migrate(conn, engine)
     conn.commit()
-    conn.close()
+
+# Storage driver for one SQLite file: a pool of long-lived WAL-mode connections; schema setup runs once
+# per engine. Every driver offers the same surface to the functions below: connection() lends a DB-API
+# connection taking "?" placeholders (commit on success, rollback on error), plus the few dialect hooks
+# (schema version, stream cursor, row locking, full-text search, IntegrityError) and close().
+class StorageEngine:
+    IntegrityError = sqlite3.IntegrityError
+    # Writers are serialized by the database lock, so claim_job needs no row locking
+    skip_locked = ""
+
+    def __init__(self, db_path: str = None, pool_size: int = None):
+        self.db_path = db_path or DB_PATH
+        self.text_search = False
+        self.pool_size = pool_size or int(os.getenv("DB_POOL_SIZE", "8"))
+        self._pool = queue.LifoQueue(maxsize=self.pool_size)
+        self._closed = False
+
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        conn = self._connect()
+        try:
+            _setup_schema(conn, self)
+        except Exception:
+            conn.close()
+            raise
+        self._release(conn)
+
+    # Opens a connection shareable across threads (one user at a time) and applies the tuned pragmas
+    def _connect(self):
+        busy_timeout_ms = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+        conn = sqlite3.connect(self.db_path, timeout=busy_timeout_ms / 1000, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA busy_timeout={busy_timeout_ms}")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA mmap_size={int(os.getenv('DB_MMAP_SIZE', str(256 * 1024 * 1024)))}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-16000")
+        return conn
+
+    # Returns a connection to the idle pool, closing it if the pool is already full
+    def _release(self, conn):
+        if self._closed:
+            conn.close()
+            return
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    @contextlib.contextmanager
+    def connection(self):
+        "Borrow a pooled connection; commits on success and rolls back on error"
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._release(conn)
+
+    def schema_version(self, conn) -> int:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def set_schema_version(self, conn, version: int):
+        conn.execute(f"PRAGMA user_version = {int(version)}")
+
+    # Cursor for reading a large result chunk by chunk with fetchmany (SQLite steps lazily already)
+    def stream_cursor(self, conn):
+        return conn.cursor()
+
+    # External-content FTS5 index over evidence_documents (porter-stemmed words), kept in step by triggers.
+    # Without FTS5 in the SQLite build, documents are still stored but search_text finds nothing.
+    def setup_text_search(self, conn):
+        try:
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS evidence_fts USING fts5(title, body, summary, "
+                         "content='evidence_documents', content_rowid='id', tokenize='porter unicode61')")
+        except sqlite3.OperationalError as e:
+            logger.warning("SQLite FTS5 unavailable, local evidence search disabled: %s", e)
+            return
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS evidence_documents_insert AFTER INSERT ON evidence_documents BEGIN
+                INSERT INTO evidence_fts (rowid, title, body, summary) VALUES (new.id, new.title, new.body, new.summary);
+            END""")
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS evidence_documents_delete AFTER DELETE ON evidence_documents BEGIN
+                INSERT INTO evidence_fts (evidence_fts, rowid, title, body, summary)
+                VALUES ('delete', old.id, old.title, old.body, old.summary);
+            END""")
+        self.text_search = True
+
+    # Documents matching any of the words and created at or after `since`, best bm25 rank first
+    def search_text(self, conn, words: list, since: float, limit: int) -> list:
+        if not self.text_search:
+            return []
+        return _fetch_dicts(conn.execute(
+            "SELECT d.kind, d.title, d.url, d.body, d.label, d.summary, d.created_at FROM evidence_fts "
+            "JOIN evidence_documents d ON d.id = evidence_fts.rowid "
+            "WHERE evidence_fts MATCH ? AND d.created_at >= ? ORDER BY evidence_fts.rank LIMIT ?",
+            (" OR ".join(f'"{word}"' for word in words), since, limit),
+        ))
+
+    # Closes every idle connection; borrowed connections are closed when they are returned
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+_engine = None
+_engine_lock = threading.Lock()
+
+# Opens the configured driver: a postgresql:// URL (the argument, else DATABASE_URL) selects the pooled
+# client/server driver, which several processes or pods can share; anything else is a SQLite file path
+def _create_engine(db_path: str = None, pool_size: int = None):
+    target = db_path or os.getenv("DATABASE_URL") or DB_PATH
+    if target.startswith(SERVER_URL_PREFIXES):
+        from backend.storage_postgres import PostgresEngine
+        return PostgresEngine(target, pool_size)
+    return StorageEngine(target, pool_size)
+
+# Creates the process-wide engine (called once at FastAPI startup) and replaces any previous one
+def init_engine(db_path: str = None, pool_size: int = None):
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.close()
+        _engine = _create_engine(db_path, pool_size)
+        return _engine
+
+# Returns the process-wide engine, creating it lazily for scripts and tests that skip app startup
+def get_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = _create_engine()
+    return _engine
+
+# Closes the process-wide engine (called at FastAPI shutdown)
+def shutdown_engine():
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.close()
+            _engine = None
+
+# Checks for the existence of the database file
+def ensure_db_exists():
+    "Create database and table if they don't exist"
+    get_engine()
+
 
 # Normalizes the email, hashes the password and saves the new user record to the 'users' table
 def create_user(email, password):
     "Hashes password and saves new user with normalization"
-    ensure_db_exists()
-    
+    hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+    return insert_user(email, hashed)
+
+# Saves a new user whose password is already hashed (the API hashes in backend.auth's process pool)
+def insert_user(email, hashed):
+    "Insert a user unless the normalized email exists"
     # Normalize email to prevent duplicate/not-found issues
     email = email.lower().strip() 
-    
-    hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+    # bcrypt hashes are ASCII; stored as text so the column means the same thing on every driver
+    if isinstance(hashed, bytes):
+        hashed = hashed.decode("ascii")
+    engine = get_engine()
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Check using TRIM/LOWER to be 100% safe
-        cursor.execute('SELECT id FROM users WHERE TRIM(LOWER(email)) = ?', (email,))
-        if cursor.fetchone():
-            return False # Email already exists
-            
-        cursor.execute('INSERT INTO users (email, password) VALUES (?, ?)', (email, hashed))
-        conn.commit()
-        return True
-    except sqlite3.IntegrityError:
+        with engine.connection() as conn:
+            cursor = conn.cursor()
+
+            # Check using TRIM/LOWER to be 100% safe
+            cursor.execute('SELECT id FROM users WHERE TRIM(LOWER(email)) = ?', (email,))
+            if cursor.fetchone():
+                return False # Email already exists
+
+            cursor.execute('INSERT INTO users (email, password) VALUES (?, ?)', (email, hashed))
+            return True
+    except engine.IntegrityError:
         return False
-    finally:
-        conn.close()
 
 # Authenticates a user by checking if the email exists and verifying the provided password against the stored hash
 def verify_user(email, password):
     "Checks credentials and returns user_id or specific error type"
-    ensure_db_exists()
-    
-    # Normalize email for consistent lookup
-    email = email.lower().strip()
-    
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
     # 1. First, check if the email exists at all (using normalization)
-    cursor.execute('SELECT id, password FROM users WHERE email = ?', (email,))
-    user = cursor.fetchone()
-    conn.close()
+    user = get_user_credentials(email)
     
     # 2. If no user found, return specific error string for the Backend
     if not user:
@@ -97,82 +509,457 @@ def verify_user(email, password):
         # 4. If password doesn't match, return specific error string
         return "WRONG_PASSWORD"
 
+# Returns (user_id, password hash as bytes) for an email, or None
+def get_user_credentials(email):
+    "Normalized email lookup"
+    # Normalize email for consistent lookup
+    email = email.lower().strip()
+    with get_engine().connection() as conn:
+        user = conn.execute('SELECT id, password FROM users WHERE email = ?', (email,)).fetchone()
+    if user is None:
+        return None
+    # Older SQLite rows hold the hash as a BLOB, newer ones as text
+    hashed = user[1]
+    return user[0], hashed if isinstance(hashed, bytes) else hashed.encode("ascii")
+
 # Saves a news analysis result and linking it to a specific user ID for historical tracking
 def append_record(record: dict, user_id: int): 
     "Save record to SQLite linked to a user"
-    ensure_db_exists()
-    conn = sqlite3.connect(DB_PATH)
-    record['user_id'] = user_id # Link the record
-    df = pd.DataFrame([record])
-    df.to_sql("news_history", conn, if_exists="append", index=False)
-    conn.close()
+    append_records([record], user_id)
+
+# Saves several analysis results for one user in a single transaction
+def append_records(records: list, user_id: int):
+    "Bulk variant of append_record used by the batch endpoints"
+    now = time.time()
+    stamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for record in records:
+        record['user_id'] = user_id # Link the record
+        # History pages are keyed on (timestamp, id); a NULL timestamp would fall outside every page's range
+        if not record.get("timestamp"):
+            record["timestamp"] = stamp
+    with stage("db_write"), get_engine().connection() as conn:
+        conn.executemany(_INSERT_HISTORY, [tuple(record.get(col) for col in HISTORY_COLUMNS) for record in records])
+        # A fresh verdict replaces any expired cache entry for the same text
+        conn.executemany(
+            "INSERT INTO verdict_cache (digest, record_id, label, confidence, explanation, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (digest) DO UPDATE SET record_id = excluded.record_id, "
+            "label = excluded.label, confidence = excluded.confidence, explanation = excluded.explanation, "
+            "created_at = excluded.created_at",
+            [(text_digest(record.get("text", "")), record.get("id"), record.get("label"),
+              record.get("confidence"), record.get("explanation"), now) for record in records],
+        )
+        _increment_user_stats(conn, user_id, [record.get("label") for record in records])
+        _index_signatures(conn, [(record.get("id"), record.get("text")) for record in records], now)
+        _index_analyses(conn, [(record.get("id"), record.get("title"), record.get("url"), record.get("text"),
+                                record.get("label"), record.get("explanation"), now) for record in records])
 
 # Retrieves the analysis history for a specific user
 def read_history(user_id: int, limit: int = 50): 
-    "Read history filtered by user_id"
-    ensure_db_exists()
-    conn = sqlite3.connect(DB_PATH)
-    query = f"SELECT * FROM news_history WHERE user_id = ? ORDER BY timestamp DESC LIMIT {limit}"
-    df = pd.read_sql(query, conn, params=(user_id,))
-    conn.close()
-    return df
+    "Read history filtered by user_id as a list of dicts"
+    return read_history_page(user_id, limit)[0]
+
+# Opaque keyset cursor pointing just past the (timestamp, id) of the last row of a page
+def encode_history_cursor(timestamp: str, record_id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([timestamp, record_id]).encode("utf-8")).decode("ascii")
+
+def decode_history_cursor(cursor: str) -> tuple:
+    try:
+        timestamp, record_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError, UnicodeError):
+        raise ValueError("Invalid history cursor")
+    if not isinstance(timestamp, str) or not isinstance(record_id, str):
+        raise ValueError("Invalid history cursor")
+    return timestamp, record_id
+
+# Retrieves one page of a user's history, newest first, and the cursor of the next page (None on the last).
+# Walks idx_news_history_user_ts from the cursor position, so every page costs the same as the first.
+# fields limits the columns returned (id and timestamp are always included for the cursor).
+def read_history_page(user_id: int, limit: int = 50, cursor: str = None, fields: list = None):
+    "Keyset-paginated history read with optional column projection"
+    columns = list(dict.fromkeys(["id", "timestamp", *(fields or HISTORY_COLUMNS)]))
+    unknown = [column for column in columns if column not in HISTORY_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown history fields: {', '.join(unknown)}")
+    query = f"SELECT {', '.join(columns)} FROM news_history WHERE user_id = ?"
+    params = [user_id]
+    if cursor:
+        query += " AND (timestamp, id) < (?, ?)"
+        params.extend(decode_history_cursor(cursor))
+    query += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+    params.append(int(limit) + 1)
+    with get_engine().connection() as conn:
+        rows = _fetch_dicts(conn.execute(query, params))
+    if len(rows) <= int(limit):
+        return rows, None
+    rows = rows[:int(limit)]
+    return rows, encode_history_cursor(rows[-1]["timestamp"], rows[-1]["id"])
+
+# Streams news_history rows matching the filters as lists of tuples (HISTORY_COLUMNS order), chunk_size
+# rows at a time straight from the cursor, so memory stays flat whatever the row count. since/until
+# compare against the "YYYY-MM-DD HH:MM:SS" timestamp text (until is exclusive). The pooled connection
+# is held until the generator is exhausted or closed.
+def iter_history(user_id: int = None, label: str = None, since: str = None, until: str = None,
+                 input_type: str = None, chunk_size: int = 5000):
+    "Filtered, chunked history scan for exports"
+    filters = {"user_id = ?": user_id, "LOWER(label) = LOWER(?)": label, "timestamp >= ?": since,
+               "timestamp < ?": until, "input_type = ?": input_type}
+    conditions = [condition for condition, value in filters.items() if value is not None]
+    query = f"SELECT {', '.join(HISTORY_COLUMNS)} FROM news_history"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY timestamp, id"
+    engine = get_engine()
+    with engine.connection() as conn:
+        cursor = engine.stream_cursor(conn)
+        cursor.execute(query, [value for value in filters.values() if value is not None])
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
 
 # Updates the reviewer_feedback column for a specific record ID to store user comments or corrections
 def update_record_feedback(record_id: str, feedback_text: str):
     "Logic remains exactly the same"
-    ensure_db_exists()
     if not feedback_text or not feedback_text.strip():
         feedback_text = "The user did not post a feedback."
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("UPDATE news_history SET reviewer_feedback = ? WHERE id = ?", (feedback_text, record_id))
-    success = cursor.rowcount > 0
-    conn.commit()
-    conn.close()
-    return success
+    with get_engine().connection() as conn:
+        cursor = conn.execute("UPDATE news_history SET reviewer_feedback = ? WHERE id = ?", (feedback_text, record_id))
+        return cursor.rowcount > 0
 
 #Checks if an identical news text has already been analyzed to return a cached result instead of re-running the AI model
 def check_cache(news_text: str):
-    "Logic remains exactly same (Global Cache)"
-    ensure_db_exists()
-    conn = sqlite3.connect(DB_PATH)
-    cleaned_text = news_text.strip()
-    query = "SELECT id, label, confidence, explanation FROM news_history WHERE TRIM(text) = ? LIMIT 1"
-    df = pd.read_sql(query, conn, params=(cleaned_text,))
-    conn.close()
-    return df.iloc[0].to_dict() if not df.empty else None
+    "Indexed lookup by normalized-text digest (Global Cache)"
+    query = "SELECT record_id AS id, label, confidence, explanation, created_at FROM verdict_cache WHERE digest = ?"
+    with get_engine().connection() as conn:
+        row = conn.execute(query, (text_digest(news_text),)).fetchone()
+    return _cached_verdict(row)
+
+# Looks up many texts at once; returns {digest: verdict} for the texts with a fresh cache entry
+def check_cache_many(news_texts: list) -> dict:
+    "Batched digest lookup (chunked to stay under SQLite's bound-parameter limit)"
+    digests = list(dict.fromkeys(text_digest(text) for text in news_texts))
+    found = {}
+    with get_engine().connection() as conn:
+        for start in range(0, len(digests), 500):
+            chunk = digests[start:start + 500]
+            query = (
+                "SELECT digest, record_id AS id, label, confidence, explanation, created_at FROM verdict_cache "
+                f"WHERE digest IN ({', '.join('?' for _ in chunk)})"
+            )
+            for row in conn.execute(query, chunk):
+                found[row[0]] = row[1:]
+    results = {}
+    for digest in digests:
+        verdict = _cached_verdict(found.get(digest))
+        if verdict is not None:
+            results[digest] = verdict
+    return results
+
+# Applies the TTL to a (record_id, label, confidence, explanation, created_at) row and updates the counters
+def _cached_verdict(row):
+    ttl = _cache_ttl()
+    if row is None or (ttl > 0 and time.time() - row[4] > ttl):
+        _bump("misses")
+        return None
+    _bump("hits")
+    return {"id": row[0], "label": row[1], "confidence": row[2], "explanation": row[3]}
+
+# Stores the MinHash signature and LSH buckets of each (record_id, text) long enough to be indexed
+def _index_signatures(conn, records, created_at: float):
+    _, min_words = _near_dup_settings()
+    signatures, buckets = [], []
+    for record_id, text in records:
+        normalized = normalize_text(text)
+        if record_id is None or word_count(normalized) < min_words:
+            continue
+        signature = minhash_signature(normalized)
+        signatures.append((record_id, pack_signature(signature), created_at))
+        buckets.extend((band, bucket, record_id) for band, bucket in band_buckets(signature))
+    conn.executemany("INSERT INTO similarity_signatures (record_id, signature, created_at) VALUES (?, ?, ?) "
+                     "ON CONFLICT (record_id) DO UPDATE SET signature = excluded.signature, created_at = excluded.created_at",
+                     signatures)
+    conn.executemany("INSERT INTO similarity_buckets (band, bucket, record_id) VALUES (?, ?, ?) ON CONFLICT DO NOTHING", buckets)
+
+# Finds the most similar previously analyzed text through the LSH buckets. Returns the verdict of that
+# record tagged with similar_to (its id) and similarity (estimated Jaccard), or None below the threshold.
+def find_near_duplicate(news_text: str, max_candidates: int = 200, threshold: float = None, ignore_ttl: bool = False):
+    "Near-duplicate lookup used after an exact cache miss"
+    default_threshold, min_words = _near_dup_settings()
+    threshold = default_threshold if threshold is None else threshold
+    normalized = normalize_text(news_text)
+    if threshold <= 0 or word_count(normalized) < min_words:
+        return None
+    signature = minhash_signature(normalized)
+    buckets = band_buckets(signature)
+    with get_engine().connection() as conn:
+        candidates = [row[0] for row in conn.execute(
+            "SELECT DISTINCT record_id FROM similarity_buckets WHERE "
+            + " OR ".join("(band = ? AND bucket = ?)" for _ in buckets) + " LIMIT ?",
+            [value for pair in buckets for value in pair] + [max_candidates],
+        )]
+        if not candidates:
+            return None
+        rows = conn.execute(
+            "SELECT s.record_id, s.signature, s.created_at, h.label, h.confidence, h.explanation "
+            "FROM similarity_signatures s JOIN news_history h ON h.id = s.record_id "
+            f"WHERE s.record_id IN ({', '.join('?' for _ in candidates)})",
+            candidates,
+        ).fetchall()
+
+    ttl = 0 if ignore_ttl else _cache_ttl()
+    best, best_score = None, 0.0
+    for record_id, blob, created_at, label, confidence, explanation in rows:
+        if ttl > 0 and time.time() - created_at > ttl:
+            continue
+        score = estimate_similarity(signature, unpack_signature(blob))
+        if score > best_score:
+            best, best_score = (record_id, label, confidence, explanation), score
+    if best is None or best_score < threshold:
+        return None
+    if not ignore_ttl:
+        _bump("near_hits")
+    return {"id": best[0], "label": best[1], "confidence": best[2], "explanation": best[3],
+            "similar_to": best[0], "similarity": round(best_score, 4)}
+
+# Best verdict available while the model is unreachable: the exact cached verdict even if past its TTL,
+# else the closest near-duplicate at the (lower) degraded threshold. None when nothing is close enough.
+def find_fallback_verdict(news_text: str, threshold: float):
+    "Stale-tolerant lookup for degraded mode"
+    with get_engine().connection() as conn:
+        row = conn.execute("SELECT record_id, label, confidence, explanation FROM verdict_cache WHERE digest = ?",
+                           (text_digest(news_text),)).fetchone()
+    if row is not None:
+        return {"label": row[1], "confidence": row[2], "explanation": row[3], "similar_to": row[0], "similarity": 1.0}
+    near = find_near_duplicate(news_text, threshold=threshold, ignore_ttl=True)
+    if near is None:
+        return None
+    near.pop("id")
+    return near
+
+# Returns the verdict cache counters together with the current hit ratio
+def get_cache_stats():
+    "Snapshot of cache hits, misses and backfilled rows"
+    with _stats_lock:
+        stats = dict(CACHE_STATS)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    return stats
 
 # Calculates summary statistics specifically for the requesting user's history.
 def get_stats_data(user_id: int): 
-    "Calculate stats only for the specific user"
-    ensure_db_exists()
-    conn = sqlite3.connect(DB_PATH)
-    try:
-        # Filter stats by user_id
-        df = pd.read_sql("SELECT label FROM news_history WHERE user_id = ?", conn, params=(user_id,))
-        total = len(df)
-        if total == 0:
-            return {"total": 0, "fake_percent": 0, "real_percent": 0, "uncertain_percent": 0}
-        
-        fake_count = len(df[df['label'].str.lower().str.contains('fake', na=False)])
-        real_count = len(df[df['label'].str.lower().str.contains('real', na=False)])
-        uncertain_count = len(df[df['label'].str.lower().str.contains('uncertain', na=False)])
-        
-        return {
-            "total": total, 
-            "fake_percent": round((fake_count / total) * 100, 1), 
-            "real_percent": round((real_count / total) * 100, 1), 
-            "uncertain_percent": round((uncertain_count / total) * 100, 1)
-        }
-    finally:
-        conn.close()
+    "Calculate stats only for the specific user from the materialized counters"
+    with get_engine().connection() as conn:
+        row = conn.execute("SELECT total, fake, real, uncertain FROM user_stats WHERE user_id = ?", (user_id,)).fetchone()
+        if row is None:
+            # Fallback for users without a counter row yet: aggregate once, then materialize
+            # (a row another process materialized in the meantime wins)
+            row = conn.execute(f"SELECT {_AGGREGATE_STATS} FROM news_history WHERE user_id = ?", (user_id,)).fetchone()
+            conn.execute("INSERT INTO user_stats (user_id, total, fake, real, uncertain) VALUES (?, ?, ?, ?, ?) "
+                         "ON CONFLICT (user_id) DO NOTHING", (user_id, *row))
+    total, fake_count, real_count, uncertain_count = row
+    if total == 0:
+        return {"total": 0, "fake_percent": 0, "real_percent": 0, "uncertain_percent": 0,
+                "fake_count": 0, "real_count": 0, "uncertain_count": 0}
+
+    return {
+        "total": total, 
+        "fake_percent": round((fake_count / total) * 100, 1), 
+        "real_percent": round((real_count / total) * 100, 1), 
+        "uncertain_percent": round((uncertain_count / total) * 100, 1),
+        "fake_count": fake_count,
+        "real_count": real_count,
+        "uncertain_count": uncertain_count
+    }
 
 # Permanently deletes all records from the 'news_history' table that belong to the specified user ID
 def clear_all_history(user_id: int): 
     "Delete records only for this specific user"
-    ensure_db_exists()
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM news_history WHERE user_id = ?", (user_id,))
-    conn.commit()
-    conn.close()
\ No newline at end of file
+    with get_engine().connection() as conn:
+        # Drop cached verdicts that point at the records being deleted
+        conn.execute("DELETE FROM verdict_cache WHERE record_id IN (SELECT id FROM news_history WHERE user_id = ?)", (user_id,))
+        for table in ("similarity_buckets", "similarity_signatures"):
+            conn.execute(f"DELETE FROM {table} WHERE record_id IN (SELECT id FROM news_history WHERE user_id = ?)", (user_id,))
+        conn.execute("DELETE FROM evidence_documents WHERE kind = 'analysis' AND ref IN "
+                     "(SELECT id FROM news_history WHERE user_id = ?)", (user_id,))
+        conn.execute("DELETE FROM news_history WHERE user_id = ?", (user_id,))
+        conn.execute("UPDATE user_stats SET total = 0, fake = 0, real = 0, uncertain = 0 WHERE user_id = ?", (user_id,))
+
+
+# Deletes the least recently used rows of a cache table beyond max_entries; returns their keys
+def _evict_lru(conn, table: str, key_column: str, max_entries: int) -> list:
+    excess = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] - max_entries
+    if excess <= 0:
+        return []
+    keys = [row[0] for row in conn.execute(
+        f"SELECT {key_column} FROM {table} ORDER BY last_used ASC LIMIT ?", (excess,)).fetchall()]
+    conn.executemany(f"DELETE FROM {table} WHERE {key_column} = ?", [(key,) for key in keys])
+    return keys
+
+# Returns the cached scrape for a canonical URL (marking it as recently used), or None
+def get_scrape_entry(url_key: str):
+    "Read one scrape_cache row as a dict"
+    with get_engine().connection() as conn:
+        rows = _fetch_dicts(conn.execute("SELECT * FROM scrape_cache WHERE url_key = ?", (url_key,)))
+        if rows:
+            conn.execute("UPDATE scrape_cache SET last_used = ? WHERE url_key = ?", (time.time(), url_key))
+    return rows[0] if rows else None
+
+# Stores a freshly downloaded article and evicts the least recently used rows beyond max_entries
+def save_scrape_entry(url_key: str, title: str, text: str, etag, last_modified, max_entries: int):
+    "Upsert one scrape_cache row with LRU eviction"
+    now = time.time()
+    with get_engine().connection() as conn:
+        conn.execute(
+            "INSERT INTO scrape_cache (url_key, title, text, etag, last_modified, fetched_at, last_used) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (url_key) DO UPDATE SET title = excluded.title, "
+            "text = excluded.text, etag = excluded.etag, last_modified = excluded.last_modified, "
+            "fetched_at = excluded.fetched_at, last_used = excluded.last_used",
+            (url_key, title, text, etag, last_modified, now, now),
+        )
+        _evict_lru(conn, "scrape_cache", "url_key", max_entries)
+
+# Marks a cached scrape as fresh again after the origin answered 304 Not Modified
+def touch_scrape_entry(url_key: str):
+    now = time.time()
+    with get_engine().connection() as conn:
+        conn.execute("UPDATE scrape_cache SET fetched_at = ?, last_used = ? WHERE url_key = ?", (now, now, url_key))
+
+# Returns the cached search results for a normalized query if younger than ttl seconds, else None
+def get_search_entry(query_key: str, ttl: int):
+    "Read one fresh search_cache row as {'results', 'latency_ms'}"
+    now = time.time()
+    with get_engine().connection() as conn:
+        row = conn.execute("SELECT results, latency_ms, fetched_at FROM search_cache WHERE query_key = ?", (query_key,)).fetchone()
+        if row is None or now - row[2] > ttl:
+            return None
+        conn.execute("UPDATE search_cache SET last_used = ? WHERE query_key = ?", (now, query_key))
+    return {"results": json.loads(row[0]), "latency_ms": row[1]}
+
+# Stores search results for a normalized query with LRU eviction beyond max_entries
+def save_search_entry(query_key: str, results: dict, latency_ms: float, max_entries: int):
+    "Upsert one search_cache row"
+    now = time.time()
+    with get_engine().connection() as conn:
+        conn.execute(
+            "INSERT INTO search_cache (query_key, results, latency_ms, fetched_at, last_used) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (query_key) DO UPDATE SET results = excluded.results, latency_ms = excluded.latency_ms, "
+            "fetched_at = excluded.fetched_at, last_used = excluded.last_used",
+            (query_key, json.dumps(results), latency_ms, now, now),
+        )
+        _index_search_results(conn, query_key, results, now)
+        evicted = _evict_lru(conn, "search_cache", "query_key", max_entries)
+        conn.executemany("DELETE FROM evidence_documents WHERE kind = 'search' AND ref = ?", [(key,) for key in evicted])
+
+# Adds analyzed records to the evidence index: (id, title, url, text, label, explanation, created_at).
+# The article text is what gets matched; the verdict's explanation is what serves as evidence later,
+# so uncertain verdicts (including failed inferences) are left out.
+def _index_analyses(conn, records):
+    conn.executemany(
+        "INSERT INTO evidence_documents (kind, ref, title, url, body, label, summary, created_at) "
+        "VALUES ('analysis', ?, ?, ?, ?, ?, ?, ?)",
+        [record for record in records if record[3] and record[5] and record[4] and "uncertain" not in record[4].lower()],
+    )
+
+# Replaces the indexed results of one search query
+def _index_search_results(conn, query_key: str, results: dict, created_at: float):
+    conn.execute("DELETE FROM evidence_documents WHERE kind = 'search' AND ref = ?", (query_key,))
+    conn.executemany(
+        "INSERT INTO evidence_documents (kind, ref, title, url, body, created_at) VALUES ('search', ?, ?, ?, ?, ?)",
+        [(query_key, res.get("title"), res.get("url"), res.get("content") or res.get("snippet"), created_at)
+         for res in results.get("results", []) if res.get("content") or res.get("snippet")],
+    )
+
+# Local evidence documents matching any of the words (casefolded, e.g. evidence.terms() of a claim),
+# newer than max_age seconds, best match first
+def search_evidence(words: list, max_age: float, limit: int = 20) -> list:
+    "Full-text lookup over past analyses and cached search results"
+    words = [word for word in dict.fromkeys(words) if word]
+    if not words:
+        return []
+    engine = get_engine()
+    with stage("evidence"), engine.connection() as conn:
+        return engine.search_text(conn, words, time.time() - max_age, limit)
+
+# Decodes the JSON columns of a jobs row and adds the derived timing fields
+def _job_view(job: dict) -> dict:
+    job["payload"] = json.loads(job["payload"])
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    started, finished = job["started_at"], job["finished_at"]
+    job["queue_ms"] = round((started - job["created_at"]) * 1000, 1) if started else None
+    job["total_ms"] = round((finished - job["created_at"]) * 1000, 1) if finished else None
+    return job
+
+# Adds a job to the durable queue; it is runnable immediately
+def enqueue_job(job_id: str, kind: str, payload: dict, callback_url: str = None, max_attempts: int = 3):
+    "Insert a queued job"
+    now = time.time()
+    with get_engine().connection() as conn:
+        conn.execute(
+            "INSERT INTO jobs (id, kind, payload, callback_url, max_attempts, next_run_at, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job_id, kind, json.dumps(payload), callback_url, max_attempts, now, now),
+        )
+
+# Atomically leases the oldest runnable job: queued and due, or running with an expired lease.
+# On a server database the candidate row is locked (skipping rows other workers hold) so two
+# processes never lease the same job.
+def claim_job(lease_seconds: float):
+    "Lease one job for a worker, or return None when nothing is runnable"
+    now = time.time()
+    engine = get_engine()
+    with engine.connection() as conn:
+        cursor = conn.execute(
+            f"""
+            UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ?, lease_until = ?
+            WHERE id = (
+                SELECT id FROM jobs
+                WHERE (status = 'queued' AND next_run_at <= ?) OR (status = 'running' AND lease_until < ?)
+                ORDER BY next_run_at LIMIT 1{engine.skip_locked}
+            )
+            RETURNING *
+            """,
+            (now, now + lease_seconds, now, now),
+        )
+        rows = _fetch_dicts(cursor)
+    return _job_view(rows[0]) if rows else None
+
+# Stores the result of a finished job
+def complete_job(job_id: str, result: dict):
+    "Mark a job done"
+    now = time.time()
+    with get_engine().connection() as conn:
+        conn.execute(
+            "UPDATE jobs SET status = 'done', result = ?, error = NULL, finished_at = ?, run_ms = (? - started_at) * 1000, "
+            "lease_until = NULL WHERE id = ?",
+            (json.dumps(result), now, now, job_id),
+        )
+
+# Records a failed attempt: requeues the job at retry_at, or fails it for good when retry_at is None
+def fail_job(job_id: str, error: str, retry_at: float = None):
+    "Schedule a retry or mark a job failed"
+    now = time.time()
+    with get_engine().connection() as conn:
+        if retry_at is None:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, run_ms = (? - started_at) * 1000, "
+                "lease_until = NULL WHERE id = ?",
+                (error, now, now, job_id),
+            )
+        else:
+            conn.execute(
+                "UPDATE jobs SET status = 'queued', error = ?, next_run_at = ?, lease_until = NULL WHERE id = ?",
+                (error, retry_at, job_id),
+            )
+
+# Returns one job with decoded payload/result and timing fields, or None
+def get_job(job_id: str):
+    "Job status lookup for polling"
+    with get_engine().connection() as conn:
+        rows = _fetch_dicts(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)))
+    return _job_view(rows[0]) if rows else None
+
+# Counts jobs per status
+def get_job_counts() -> dict:
+    "Queue depth snapshot"
+    with get_engine().connection() as conn:
+        return dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
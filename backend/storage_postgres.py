@@ -0,0 +1,138 @@
+import os
+import re
+import contextlib
+import psycopg
+from psycopg_pool import ConnectionPool
+
+# PostgreSQL driver for backend.storage, selected by a postgresql:// DATABASE_URL. History, caches,
+# users and the job queue then live on a database server that any number of API processes or pods share.
+# The storage functions are written against SQLite; this module adapts their SQL:
+#   * "?" placeholders become "%s" (and literal "%" is escaped whenever parameters are bound)
+#   * CREATE TABLE column types are mapped to their PostgreSQL equivalents below
+
+# SQLite DDL -> PostgreSQL DDL. SQLite integers are 64-bit (LSH bucket hashes need all 64) and REAL is a
+# double; the users foreign key was never enforced by SQLite (foreign_keys is off), so it is dropped too.
+_DDL_REWRITES = (
+    (re.compile(r"\bINTEGER PRIMARY KEY AUTOINCREMENT\b"), "BIGSERIAL PRIMARY KEY"),
+    (re.compile(r"\bINTEGER\b"), "BIGINT"),
+    (re.compile(r"\bREAL\b"), "DOUBLE PRECISION"),
+    (re.compile(r"\bBLOB\b"), "BYTEA"),
+    (re.compile(r",\s*FOREIGN KEY \(user_id\) REFERENCES users \(id\)"), ""),
+    (re.compile(r"\)\s*WITHOUT ROWID"), ")"),
+)
+
+# Text searched in evidence_documents; the GIN index is built on this exact expression, so queries must repeat it
+_EVIDENCE_TSVECTOR = "to_tsvector('english', coalesce(title, '') || ' ' || coalesce(body, '') || ' ' || coalesce(summary, ''))"
+
+# Arbitrary constant naming the advisory lock that serializes schema setup across starting replicas
+_SCHEMA_LOCK_ID = 7206342
+
+def _translate(query: str, has_params: bool) -> str:
+    if query.lstrip().upper().startswith("CREATE TABLE"):
+        for pattern, replacement in _DDL_REWRITES:
+            query = pattern.sub(replacement, query)
+    if has_params:
+        query = query.replace("%", "%%").replace("?", "%s")
+    return query
+
+# psycopg cursor that accepts the storage module's "?" SQL
+class _Cursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, query, params=None):
+        self._cursor.execute(_translate(query, params is not None), params)
+        return self
+
+    def executemany(self, query, params_seq):
+        self._cursor.executemany(_translate(query, True), params_seq)
+        return self
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+# psycopg connection with the sqlite3-style execute()/executemany() shortcuts the storage module uses
+class _Connection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, name: str = None):
+        return _Cursor(self._conn.cursor(name) if name else self._conn.cursor())
+
+    def execute(self, query, params=None):
+        return self.cursor().execute(query, params)
+
+    def executemany(self, query, params_seq):
+        return self.cursor().executemany(query, params_seq)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+# Storage driver for a PostgreSQL server: a psycopg_pool connection pool, with the same surface as
+# backend.storage.StorageEngine. Schema setup takes an advisory lock, so replicas starting together
+# create the tables and run the migrations exactly once.
+class PostgresEngine:
+    IntegrityError = psycopg.IntegrityError
+    # Concurrent claim_job calls from several processes skip the job row another worker is leasing
+    skip_locked = " FOR UPDATE SKIP LOCKED"
+
+    def __init__(self, url: str, pool_size: int = None):
+        from backend.storage import _setup_schema
+
+        self.url = url
+        self.pool_size = pool_size or int(os.getenv("DB_POOL_SIZE", "8"))
+        self._pool = ConnectionPool(
+            url,
+            min_size=int(os.getenv("DB_POOL_MIN_SIZE", "1")),
+            max_size=self.pool_size,
+            timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+            open=True,
+        )
+        try:
+            with self.connection() as conn:
+                conn.execute("SELECT pg_advisory_xact_lock(?)", (_SCHEMA_LOCK_ID,))
+                _setup_schema(conn, self)
+        except Exception:
+            self._pool.close()
+            raise
+
+    @contextlib.contextmanager
+    def connection(self):
+        "Borrow a pooled connection; commits on success and rolls back on error"
+        with self._pool.connection() as conn:
+            yield _Connection(conn)
+
+    def schema_version(self, conn) -> int:
+        conn.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)")
+        row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+        return row[0] or 0
+
+    def set_schema_version(self, conn, version: int):
+        conn.execute("DELETE FROM schema_version")
+        conn.execute("INSERT INTO schema_version (version) VALUES (?)", (version,))
+
+    # Server-side (named) cursor, so fetchmany pulls one chunk at a time instead of the whole result
+    def stream_cursor(self, conn):
+        return conn.cursor("history_stream")
+
+    # English-stemmed full-text index over evidence_documents
+    def setup_text_search(self, conn):
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_evidence_documents_fts ON evidence_documents USING GIN ({_EVIDENCE_TSVECTOR})")
+
+    # Documents matching any of the words and created at or after `since`, best ts_rank first
+    def search_text(self, conn, words: list, since: float, limit: int) -> list:
+        from backend.storage import _fetch_dicts
+
+        query = " or ".join(words)
+        return _fetch_dicts(conn.execute(
+            f"SELECT kind, title, url, body, label, summary, created_at FROM evidence_documents "
+            f"WHERE {_EVIDENCE_TSVECTOR} @@ websearch_to_tsquery('english', ?) AND created_at >= ? "
+            f"ORDER BY ts_rank({_EVIDENCE_TSVECTOR}, websearch_to_tsquery('english', ?)) DESC LIMIT ?",
+            (query, since, query, limit),
+        ))
+
+    def close(self):
+        self._pool.close()
@@ -0,0 +1,120 @@
+"""
+Login-burst benchmark: /predict latency while many users log in at once.
+
+Runs a steady stream of /predict requests (mocked upstreams, fresh texts so
+every request goes through search + LLM + DB write) against two in-process apps,
+first alone and then alongside a burst of concurrent /login calls:
+
+  * inline - the previous sync /login route, bcrypt.checkpw in the FastAPI threadpool
+  * pool   - backend.main.app, bcrypt in backend.auth's process pool
+
+    python benchmarks/bench_auth.py [--predicts 200] [--logins 100] [--concurrency 20]
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import argparse
+import tempfile
+import statistics
+from types import SimpleNamespace
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi import FastAPI, HTTPException
+
+from backend import storage, llm_judge, auth
+from backend.main import app as pool_app, predict, UserAuth
+
+VERDICT = json.dumps({"label": "real", "confidence": 80, "explanation": "Stubbed upstream."})
+EMAIL, PASSWORD = "bench@example.com", "correct horse battery staple"
+
+def _stubs(latency):
+    async def search(query, **kwargs):
+        await asyncio.sleep(latency)
+        return {"results": [{"title": "Stub", "content": f"Context for {query}"}]}
+
+    async def create(**kwargs):
+        await asyncio.sleep(latency)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=VERDICT))])
+
+    return SimpleNamespace(search=search), SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+# The pre-pool /login route, kept here only as the baseline for comparison
+def _inline_app():
+    app = FastAPI()
+
+    @app.post("/login")
+    def login(data: UserAuth):
+        result = storage.verify_user(data.email, data.password)
+        if not isinstance(result, int):
+            raise HTTPException(status_code=401, detail=result)
+        return {"user_id": result}
+
+    app.post("/predict")(predict)
+    return app
+
+async def _predicts(client, n, concurrency):
+    limiter = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with limiter:
+            start = time.perf_counter()
+            r = await client.post("/predict", json={"text": f"auth bench claim {uuid.uuid4()}", "user_id": 1})
+            latencies.append(time.perf_counter() - start)
+            assert r.status_code == 200
+
+    await asyncio.gather(*[one() for _ in range(n)])
+    return latencies
+
+async def _scenario(app, args, with_burst):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=None) as client:
+        logins = [client.post("/login", json={"email": EMAIL, "password": PASSWORD}) for _ in range(args.logins)] if with_burst else []
+        start = time.perf_counter()
+        latencies, *responses = await asyncio.gather(_predicts(client, args.predicts, args.concurrency), *logins)
+        elapsed = time.perf_counter() - start
+    assert all(r.status_code == 200 for r in responses)
+    return latencies, elapsed
+
+def _p(values, q):
+    return statistics.quantiles(values, n=100)[q - 1] * 1000
+
+def run(args):
+    storage.init_engine(os.path.join(tempfile.mkdtemp(), "auth.db"))
+    storage.create_user(EMAIL, PASSWORD)
+    auth.init_hasher()
+    tavily, hf = _stubs(args.upstream_latency)
+    rows = []
+    with patch.object(llm_judge, "_get_async_tavily_client", lambda: tavily), \
+         patch.object(llm_judge, "_get_async_hf_client", lambda: hf), \
+         patch.dict(os.environ, {"HF_MODEL": os.getenv("HF_MODEL", "bench-model")}):
+        for mode, app in (("inline", _inline_app()), ("pool", pool_app)):
+            for with_burst in (False, True):
+                latencies, elapsed = asyncio.run(_scenario(app, args, with_burst))
+                rows.append((mode, f"{args.logins} logins" if with_burst else "idle", latencies, elapsed))
+    auth.shutdown_hasher()
+    storage.shutdown_engine()
+
+    print(f"{args.predicts} /predict requests at concurrency {args.concurrency}, "
+          f"{args.upstream_latency * 1000:.0f} ms simulated search and LLM latency each")
+    print(f"{'mode':<8}{'background':<14}{'p50 (ms)':>10}{'p95 (ms)':>10}{'max (ms)':>10}{'wall (s)':>10}")
+    for mode, background, latencies, elapsed in rows:
+        print(f"{mode:<8}{background:<14}{_p(latencies, 50):>10.1f}{_p(latencies, 95):>10.1f}"
+              f"{max(latencies) * 1000:>10.1f}{elapsed:>10.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--predicts", type=int, default=200)
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--upstream-latency", type=float, default=0.05)
+    run(parser.parse_args())
+
+if __name__ == "__main__":
+    main()
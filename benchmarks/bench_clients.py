@@ -0,0 +1,121 @@
+"""
+Measures the per-request latency saved by reusing the upstream clients.
+
+A local stub HTTP server plays both Tavily (/search) and the Hugging Face
+chat-completions endpoint. Every new TCP connection pays a simulated
+handshake delay (standing in for TCP + TLS setup to a remote host), so the
+benchmark isolates what keep-alive saves:
+
+  * fresh  - new TavilyClient/InferenceClient per analysis (previous behavior)
+  * shared - process-wide clients from backend.llm_judge with pooled sessions
+
+    python benchmarks/bench_clients.py [--requests 50] [--handshake-ms 40]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+import threading
+from unittest.mock import patch
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import llm_judge
+
+SEARCH_BODY = json.dumps({"results": [{"title": "Stub source", "content": "Stub content."}]}).encode()
+COMPLETION_BODY = json.dumps({
+    "id": "stub", "object": "chat.completion", "created": 0, "model": "stub",
+    "choices": [{"index": 0, "finish_reason": "stop",
+                 "message": {"role": "assistant", "content": '{"label": "real", "confidence": 80, "explanation": "stub"}'}}],
+}).encode()
+
+# Keep-alive stub that charges a handshake delay once per connection
+def _make_handler(handshake_s, counter):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            super().setup()
+            counter["connections"] += 1
+            time.sleep(handshake_s)
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            body = SEARCH_BODY if self.path.endswith("/search") else COMPLETION_BODY
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+def _fresh_getters():
+    return {
+        "_get_tavily_client": llm_judge._build_tavily_client,
+        "_get_hf_client": llm_judge._build_hf_client,
+        "_get_async_tavily_client": llm_judge._build_async_tavily_client,
+        "_get_async_hf_client": llm_judge._build_async_hf_client,
+    }
+
+def _time_sync(n):
+    samples = []
+    for i in range(n):
+        start = time.perf_counter()
+        llm_judge.judge_news(f"claim {i}")
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+async def _time_async(n):
+    samples = []
+    for i in range(n):
+        start = time.perf_counter()
+        await llm_judge.judge_news_async(f"claim {i}")
+        samples.append((time.perf_counter() - start) * 1000)
+    await llm_judge.close_clients()
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--handshake-ms", type=float, default=40)
+    args = parser.parse_args()
+
+    counter = {"connections": 0}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(args.handshake_ms / 1000, counter))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    os.environ.update({"TAVILY_API_BASE_URL": base_url, "HF_BASE_URL": base_url,
+                       "TAVILY_API_KEY": "stub", "HF_TOKEN": "stub"})
+
+    rows = []
+    for mode in ("fresh", "shared"):
+        for flavor in ("sync", "async"):
+            counter["connections"] = 0
+            getters = _fresh_getters() if mode == "fresh" else {}
+            patches = [patch.object(llm_judge, name, fn) for name, fn in getters.items()]
+            for p in patches:
+                p.start()
+            try:
+                samples = _time_sync(args.requests) if flavor == "sync" else asyncio.run(_time_async(args.requests))
+            finally:
+                for p in patches:
+                    p.stop()
+            rows.append((f"{mode}/{flavor}", statistics.median(samples), statistics.mean(samples), counter["connections"]))
+    server.shutdown()
+
+    print(f"{args.requests} analyses, {args.handshake_ms:.0f} ms simulated handshake per new connection")
+    print(f"{'clients':<15}{'median ms':>11}{'mean ms':>10}{'connections':>13}")
+    for name, median, mean, connections in rows:
+        print(f"{name:<15}{median:>11.2f}{mean:>10.2f}{connections:>13}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Compares the legacy full-document extractor with the bounded streaming extractor.
+
+Runs both over a corpus of saved HTML pages and reports wall time and peak
+Python memory (tracemalloc) per page. The bounded extractor is measured with
+every parser available here (html.parser always, lxml when installed). Without --fixtures, a synthetic corpus
+of heavy news-style pages (large inline scripts, navigation, comment threads
+and related-story sidebars around a long article) is written to a temp dir.
+
+    python benchmarks/bench_scraping.py [--fixtures DIR] [--repeat 5]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import scraping, extraction
+
+# Writes a few heavy, news-like pages so the benchmark runs without external fixtures
+def _write_synthetic_corpus(directory, pages=6):
+    rng = random.Random(42)
+    words = "government report officials said market election health study city climate police court".split()
+
+    def sentence(n):
+        return " ".join(rng.choice(words) for _ in range(n)).capitalize() + "."
+
+    for i in range(pages):
+        script = "<script>var bundle = '" + "x" * (150_000 + 50_000 * i) + "';</script>"
+        nav = "<nav>" + "".join(f"<a href='/s{j}'>Section {j}</a>" for j in range(200)) + "</nav>"
+        article = "<article><h1>Headline</h1>" + "".join(f"<p>{sentence(40)}</p>" for _ in range(120 + 40 * i)) + "</article>"
+        comments = "<section class='comments'>" + "".join(
+            f"<div class='c'><p>{sentence(25)}</p><span>reply</span></div>" for _ in range(400)) + "</section>"
+        sidebar = "<aside>" + "".join(f"<div><p>{sentence(12)}</p></div>" for _ in range(150)) + "</aside>"
+        html = (f"<html><head><title>Story {i}</title><style>{'.a{color:red}' * 2000}</style>{script}</head>"
+                f"<body>{nav}<main>{article}{comments}</main>{sidebar}{script}</body></html>")
+        with open(os.path.join(directory, f"page_{i}.html"), "w", encoding="utf-8") as f:
+            f.write(html)
+
+def _measure(fn, html, repeat):
+    tracemalloc.start()
+    fn(html)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(html)
+    return (time.perf_counter() - start) / repeat * 1000, peak / 1024 / 1024
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", help="directory of .html files")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    directory = args.fixtures or tempfile.mkdtemp()
+    if not args.fixtures:
+        _write_synthetic_corpus(directory)
+
+    max_bytes, max_chars, _ = scraping._extraction_settings()
+    parsers = ["html.parser"] + (["lxml"] if extraction.etree is not None else [])
+    extractors = {"legacy": lambda html: scraping._extract_article("bench", html)}
+    for parser_name in parsers:
+        # The bounded path only ever sees the first max_bytes of the body, as when streaming
+        extractors[parser_name] = lambda html, p=parser_name: extraction.extract_bounded(html[:max_bytes], max_chars, parser=p)
+
+    print(f"max_bytes={max_bytes} max_chars={max_chars}; time in ms, peak traced memory in MiB")
+    header = f"{'page':<14}{'KiB':>7}" + "".join(f"{name + ' ms':>16}{'MiB':>7}" for name in extractors)
+    print(header)
+    totals = {name: [0.0, 0.0] for name in extractors}
+    with patch("builtins.print"):
+        rows = []
+        for page in sorted(os.listdir(directory)):
+            if not page.endswith(".html"):
+                continue
+            with open(os.path.join(directory, page), encoding="utf-8", errors="replace") as f:
+                html = f.read()
+            rows.append((page, len(html) / 1024, {name: _measure(fn, html, args.repeat) for name, fn in extractors.items()}))
+    for page, size, results in rows:
+        print(f"{page:<14}{size:>7.0f}" + "".join(f"{ms:>16.1f}{mem:>7.1f}" for ms, mem in results.values()))
+        for name, (ms, mem) in results.items():
+            totals[name] = [totals[name][0] + ms, max(totals[name][1], mem)]
+    print(f"{'total / max':<21}" + "".join(f"{ms:>16.1f}{mem:>7.1f}" for ms, mem in totals.values()))
+
+if __name__ == "__main__":
+    main()
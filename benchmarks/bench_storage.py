@@ -0,0 +1,120 @@
+"""
+Compares the legacy pandas storage path with the lean prepared-statement path.
+
+Each implementation runs in its own subprocess so the reported peak RSS only
+includes the modules that implementation imports.
+
+    python benchmarks/bench_storage.py [--calls 500] [--rows 5000]
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import resource
+import tempfile
+import subprocess
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Minimal copy of the pandas-based storage functions this benchmark compares against
+def _legacy_impl(db_path):
+    import sqlite3
+    import pandas as pd
+
+    def append_record(record, user_id):
+        conn = sqlite3.connect(db_path)
+        record["user_id"] = user_id
+        pd.DataFrame([record]).to_sql("news_history", conn, if_exists="append", index=False)
+        conn.close()
+
+    def read_history(user_id, limit=50):
+        conn = sqlite3.connect(db_path)
+        df = pd.read_sql(f"SELECT * FROM news_history WHERE user_id = ? ORDER BY timestamp DESC LIMIT {limit}", conn, params=(user_id,))
+        conn.close()
+        return df.to_dict(orient="records")
+
+    def check_cache(news_text):
+        conn = sqlite3.connect(db_path)
+        df = pd.read_sql("SELECT id, label, confidence, explanation FROM news_history WHERE TRIM(text) = ? LIMIT 1", conn, params=(news_text.strip(),))
+        conn.close()
+        return df.iloc[0].to_dict() if not df.empty else None
+
+    def get_stats_data(user_id):
+        conn = sqlite3.connect(db_path)
+        df = pd.read_sql("SELECT label FROM news_history WHERE user_id = ?", conn, params=(user_id,))
+        conn.close()
+        total = len(df)
+        fake = len(df[df["label"].str.lower().str.contains("fake", na=False)])
+        return {"total": total, "fake_percent": round(fake / total * 100, 1) if total else 0}
+
+    return append_record, read_history, check_cache, get_stats_data
+
+def _lean_impl(db_path):
+    from backend import storage
+    storage.init_engine(db_path)
+    return storage.append_record, storage.read_history, storage.check_cache, storage.get_stats_data
+
+def _record(i):
+    return {
+        "id": str(uuid.uuid4())[:8], "timestamp": f"2026-02-03 10:{i // 60 % 60:02d}:{i % 60:02d}",
+        "input_type": "text", "url": "", "title": "N/A", "text": f"Benchmark claim number {i} " * 20,
+        "label": ("fake", "real", "uncertain")[i % 3], "confidence": 70, "explanation": "Synthetic row.",
+        "reviewer_feedback": "The user did not post a feedback.",
+    }
+
+# Runs one implementation against a freshly seeded database and prints its timings as JSON
+def run_worker(impl, calls, rows):
+    db_path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    from backend import storage
+    storage.StorageEngine(db_path).close()  # identical schema for both implementations
+
+    append_record, read_history, check_cache, get_stats_data = (_legacy_impl if impl == "legacy" else _lean_impl)(db_path)
+    for i in range(rows):
+        append_record(_record(i), i % 10)
+
+    timings = {}
+    ops = {
+        "append_record": lambda i: append_record(_record(rows + i), 1),
+        "check_cache": lambda i: check_cache(f"Benchmark claim number {i % rows} " * 20),
+        "read_history": lambda i: read_history(1, 50),
+        "get_stats_data": lambda i: get_stats_data(1),
+    }
+    for name, op in ops.items():
+        samples = []
+        for i in range(calls):
+            start = time.perf_counter()
+            op(i)
+            samples.append((time.perf_counter() - start) * 1000)
+        timings[name] = {"median_ms": statistics.median(samples), "p95_ms": sorted(samples)[int(len(samples) * 0.95) - 1]}
+
+    # ru_maxrss is reported in KiB on Linux
+    print(json.dumps({"impl": impl, "timings": timings, "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--worker", choices=["legacy", "lean"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.calls, args.rows)
+        return
+
+    results = {}
+    for impl in ("legacy", "lean"):
+        out = subprocess.run([sys.executable, __file__, "--worker", impl, "--calls", str(args.calls), "--rows", str(args.rows)],
+                             check=True, capture_output=True, text=True).stdout
+        results[impl] = json.loads(out.strip().splitlines()[-1])
+
+    print(f"{'operation':<16}{'legacy median':>15}{'lean median':>13}{'legacy p95':>12}{'lean p95':>10}  (ms)")
+    for name in results["legacy"]["timings"]:
+        old, new = results["legacy"]["timings"][name], results["lean"]["timings"][name]
+        print(f"{name:<16}{old['median_ms']:>15.3f}{new['median_ms']:>13.3f}{old['p95_ms']:>12.3f}{new['p95_ms']:>10.3f}")
+    print(f"{'peak RSS (MB)':<16}{results['legacy']['peak_rss_mb']:>15.1f}{results['lean']['peak_rss_mb']:>13.1f}")
+
+if __name__ == "__main__":
+    main()
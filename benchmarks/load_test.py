@@ -0,0 +1,150 @@
+"""
+Load-test harness for the analysis pipeline with mocked upstreams.
+
+Fires N concurrent /predict requests at two in-process apps sharing the same
+storage layer and simulated Tavily/Hugging Face latency:
+
+  * sync  - the previous blocking route (def + judge_news), served from the
+            FastAPI threadpool
+  * async - backend.main.app (async def + judge_news_async)
+
+    python benchmarks/load_test.py [--requests 400] [--search-latency 0.2] [--llm-latency 1.0]
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import argparse
+import tempfile
+from types import SimpleNamespace
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi import FastAPI
+
+from backend import storage, llm_judge
+from backend.main import app as async_app, PredictRequest
+
+VERDICT = json.dumps({"label": "real", "confidence": 80, "explanation": "Stubbed upstream."})
+
+# Tracks how many simulated LLM calls are in flight at once
+class Gauge:
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+
+    def enter(self):
+        self.current += 1
+        self.peak = max(self.peak, self.current)
+
+    def exit(self):
+        self.current -= 1
+
+def _completion():
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=VERDICT))])
+
+def _search_results(query):
+    return {"results": [{"title": "Stub", "content": f"Context for {query}"}]}
+
+# Blocking stand-ins for TavilyClient / InferenceClient
+def _blocking_stubs(args, gauge):
+    def search(query, **kwargs):
+        time.sleep(args.search_latency)
+        return _search_results(query)
+
+    def create(**kwargs):
+        gauge.enter()
+        try:
+            time.sleep(args.llm_latency)
+            return _completion()
+        finally:
+            gauge.exit()
+
+    tavily = SimpleNamespace(search=search)
+    hf = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    return tavily, hf
+
+# Non-blocking stand-ins for AsyncTavilyClient / AsyncInferenceClient
+def _async_stubs(args, gauge):
+    async def search(query, **kwargs):
+        await asyncio.sleep(args.search_latency)
+        return _search_results(query)
+
+    async def create(**kwargs):
+        gauge.enter()
+        try:
+            await asyncio.sleep(args.llm_latency)
+            return _completion()
+        finally:
+            gauge.exit()
+
+    tavily = SimpleNamespace(search=search)
+    hf = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    return tavily, hf
+
+# The pre-async /predict route, kept here only as the baseline for comparison
+def _sync_app():
+    app = FastAPI()
+
+    @app.post("/predict")
+    def predict(req: PredictRequest):
+        cached = storage.check_cache(req.text)
+        if cached:
+            return {**cached, "id": "CACHED", "source": "database"}
+        result = llm_judge.judge_news(req.text)
+        if result.get("inference_failed"):
+            return {"id": None, **result}
+        record_id = str(uuid.uuid4())[:8]
+        storage.append_record({"id": record_id, "text": req.text, **result}, req.user_id)
+        return {"id": record_id, **result}
+
+    return app
+
+async def _fire(app, n):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=None) as client:
+        start = time.perf_counter()
+        responses = await asyncio.gather(*[
+            client.post("/predict", json={"text": f"load test claim {uuid.uuid4()}", "user_id": 1})
+            for _ in range(n)
+        ])
+        elapsed = time.perf_counter() - start
+    assert all(r.status_code == 200 for r in responses)
+    # Verdicts the pipeline gave up on (rate limited, circuit open, upstream errors)
+    failed = sum(1 for r in responses if r.json().get("inference_failed"))
+    return elapsed, failed
+
+def run(args):
+    storage.init_engine(os.path.join(tempfile.mkdtemp(), "load.db"))
+    results = {}
+
+    gauge = Gauge()
+    tavily, hf = _blocking_stubs(args, gauge)
+    with patch.object(llm_judge, "_get_tavily_client", lambda: tavily), patch.object(llm_judge, "_get_hf_client", lambda: hf):
+        results["sync"] = (*asyncio.run(_fire(_sync_app(), args.requests)), gauge.peak)
+
+    gauge = Gauge()
+    tavily, hf = _async_stubs(args, gauge)
+    with patch.object(llm_judge, "_get_async_tavily_client", lambda: tavily), patch.object(llm_judge, "_get_async_hf_client", lambda: hf):
+        results["async"] = (*asyncio.run(_fire(async_app, args.requests)), gauge.peak)
+
+    storage.shutdown_engine()
+    per_request = args.search_latency + args.llm_latency
+    print(f"{args.requests} concurrent requests, {per_request:.2f}s simulated upstream time each")
+    print(f"{'mode':<8}{'wall (s)':>10}{'req/s':>10}{'failed':>8}{'peak in-flight LLM calls':>27}")
+    for mode, (elapsed, failed, peak) in results.items():
+        print(f"{mode:<8}{elapsed:>10.2f}{args.requests / elapsed:>10.1f}{failed:>8}{peak:>27}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--search-latency", type=float, default=0.2)
+    parser.add_argument("--llm-latency", type=float, default=1.0)
+    run(parser.parse_args())
+
+if __name__ == "__main__":
+    main()
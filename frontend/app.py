@@ -1,3 +1,5 @@
+import json
+import time
 import requests
 import pandas as pd
 import streamlit as st
@@ -13,23 +15,60 @@ st.set_page_config(
 
 # Configuration & Session State
 API_URL = "http://localhost:8000" 
+# Seconds the dashboard data (stats + recent history) is reused before it is revalidated with the backend
+DASHBOARD_TTL = 30
 
 if 'logged_in' not in st.session_state:
     st.session_state['logged_in'] = False
     st.session_state['user_id'] = None
     st.session_state['user_email'] = None
+    st.session_state['token'] = None
     st.session_state['page'] = 'login'
 
+# One keep-alive connection pool shared by every rerun of this script and every browser session
+@st.cache_resource
+def http_session():
+    return requests.Session()
+
+# Session token header for the routes scoped to the logged-in user (/dashboard, /clear_history)
+def auth_headers():
+    return {"Authorization": f"Bearer {st.session_state['token']}"}
+
+# Stats and recent history of the logged-in user from /dashboard, or None if the backend refused.
+# Reused from st.session_state for DASHBOARD_TTL seconds, then revalidated with If-None-Match,
+# so an unchanged dashboard costs the backend an empty 304.
+def load_dashboard():
+    cached = st.session_state.get('dashboard')
+    if cached and time.monotonic() - cached['fetched_at'] < DASHBOARD_TTL:
+        return cached['data']
+    headers = auth_headers() | ({"If-None-Match": cached['etag']} if cached and cached['etag'] else {})
+    r = http_session().get(f"{API_URL}/dashboard", params={"user_id": st.session_state['user_id'], "limit": 50},
+                           headers=headers, timeout=5)
+    if r.status_code == 304:
+        data = cached['data']
+    elif r.status_code == 200:
+        data = r.json()
+    else:
+        return None
+    st.session_state['dashboard'] = {"data": data, "etag": r.headers.get("ETag"), "fetched_at": time.monotonic()}
+    return data
+
+# Forgets the cached dashboard after anything that changes the user's stats or history
+def invalidate_dashboard():
+    st.session_state.pop('dashboard', None)
+
 # Sends login credentials to the FastAPI backend and manages the user session on success
 def login_user(email, password):
     try:
-        response = requests.post(f"{API_URL}/login", json={"email": email, "password": password})
+        response = http_session().post(f"{API_URL}/login", json={"email": email, "password": password}, timeout=10)
         
         if response.status_code == 200:
             data = response.json()
             st.session_state['logged_in'] = True
             st.session_state['user_id'] = data['user_id']
+            st.session_state['token'] = data.get('token')
             st.session_state['user_email'] = email
+            invalidate_dashboard()
             return True, "Success"
         
         elif response.status_code == 404:
@@ -47,11 +86,46 @@ def login_user(email, password):
 # Registers a new user by sending their credentials to the backend signup endpoint
 def signup_user(email, password):
     try:
-        response = requests.post(f"{API_URL}/signup", json={"email": email, "password": password})
+        response = http_session().post(f"{API_URL}/signup", json={"email": email, "password": password}, timeout=10)
         return response.status_code == 200
     except:
         return False
 
+# Reads Server-Sent Events from a streaming analysis endpoint and renders each stage inside the status box.
+# Returns the final verdict dict, or None if the backend reported an error.
+def stream_analysis(path, payload, status):
+    tokens_box = st.empty()
+    tokens = ""
+    event = None
+    with http_session().post(f"{API_URL}{path}", json=payload, stream=True, timeout=(5, 120)) as r:
+        if r.status_code != 200:
+            return None
+        for line in r.iter_lines(decode_unicode=True):
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+                continue
+            if not line.startswith("data:"):
+                continue
+            data = json.loads(line[len("data:"):])
+            if event == "scraped":
+                st.write(f"📰 Scraped **{data['title']}** ({data['chars']} characters)")
+                status.update(label="Checking cache and searching the web...")
+            elif event == "cache_hit":
+                st.write("⚡ Found a previous verdict in the cache")
+            elif event == "search":
+                titles = [s["title"] for s in data["sources"] if s.get("title")]
+                st.write("🔎 Sources: " + (", ".join(titles) if titles else "no web results, relying on the model"))
+                status.update(label="Model is reasoning...")
+            elif event == "token":
+                tokens += data["text"]
+                tokens_box.code(tokens, language="json")
+            elif event == "verdict":
+                return data
+            elif event == "error":
+                st.error(data.get("detail", "Unknown error"))
+                return None
+    return None
+
 # Display login or signup forms based on the current session page state
 if not st.session_state['logged_in']:
     if st.session_state['page'] == 'login':
@@ -97,14 +171,18 @@ else:
     st.sidebar.write(f"Logged in: {st.session_state['user_email']}")
     if st.sidebar.button("Logout", key="logout_sidebar_btn"):
         st.session_state['logged_in'] = False
+        st.session_state['token'] = None
+        invalidate_dashboard()
         st.rerun()
 
     st.title("🛡️ Misinformation Analysis Dashboard")
 
+    # Stats and the History tab share one cached /dashboard response
+    dashboard = None
     try: 
-        stats_r = requests.get(f"{API_URL}/stats?user_id={st.session_state['user_id']}", timeout=5) 
-        if stats_r.status_code == 200: 
-             stats = stats_r.json() 
+        dashboard = load_dashboard() 
+        if dashboard is not None: 
+             stats = dashboard["stats"] 
              total = stats.get("total", 0) 
              fake_p = stats.get("fake_percent", 0) 
              real_p = stats.get("real_percent", 0) 
@@ -175,9 +253,10 @@ else:
             with st.chat_message("user"): st.write(url) 
             with st.chat_message("assistant"): 
                 with st.status("Processing URL...", expanded=True) as status: 
-                    r = requests.post(f"{API_URL}/analyze_url", json={"url": url, "user_id": st.session_state['user_id']}) 
-                    if r.status_code == 200: 
-                        st.session_state['res1'] = r.json() 
+                    verdict = stream_analysis("/analyze_url_stream", {"url": url, "user_id": st.session_state['user_id']}, status)
+                    if verdict: 
+                        st.session_state['res1'] = verdict 
+                        invalidate_dashboard() 
                         status.update(label="Analysis Complete!", state="complete", expanded=False) 
                     else: 
                         status.update(label="Error fetching URL", state="error") 
@@ -191,7 +270,8 @@ else:
             with st.expander("📝 Add Feedback", expanded=True): 
                 fb1 = st.text_area("Comment:", key="f1", placeholder="Type your feedback...") 
                 if st.button("Save Feedback", key="s1"): 
-                    requests.post(f"{API_URL}/update_feedback", json={"id": res['id'], "feedback": fb1}) 
+                    http_session().post(f"{API_URL}/update_feedback", json={"id": res['id'], "feedback": fb1}, timeout=10) 
+                    invalidate_dashboard() 
                     st.success("Feedback updated!") 
                     del st.session_state['res1'] 
                     st.rerun() 
@@ -203,9 +283,10 @@ else:
             with st.chat_message("user"): st.write(text[:200] + "...") 
             with st.chat_message("assistant"): 
                 with st.status("Analyzing text...", expanded=True) as status: 
-                    r = requests.post(f"{API_URL}/predict", json={"text": text, "user_id": st.session_state['user_id']}) 
-                    if r.status_code == 200: 
-                        st.session_state['res2'] = r.json() 
+                    verdict = stream_analysis("/predict_stream", {"text": text, "user_id": st.session_state['user_id']}, status)
+                    if verdict: 
+                        st.session_state['res2'] = verdict 
+                        invalidate_dashboard() 
                         status.update(label="Analysis Complete!", state="complete", expanded=False) 
                     else: status.update(label="Model Error", state="error") 
 
@@ -217,7 +298,8 @@ else:
             with st.expander("📝 Add Feedback", expanded=True): 
                 fb2 = st.text_area("Comment:", key="f2", placeholder="Type your feedback...") 
                 if st.button("Save Feedback", key="s2"): 
-                    requests.post(f"{API_URL}/update_feedback", json={"id": res['id'], "feedback": fb2}) 
+                    http_session().post(f"{API_URL}/update_feedback", json={"id": res['id'], "feedback": fb2}, timeout=10) 
+                    invalidate_dashboard() 
                     st.success("Feedback updated!") 
                     del st.session_state['res2'] 
                     st.rerun()
@@ -225,9 +307,8 @@ else:
     with tab3:
         st.subheader("Analysis History")
         try:
-            r = requests.get(f"{API_URL}/history?user_id={st.session_state['user_id']}&limit=50")
-            if r.status_code == 200:
-                data = r.json()
+            if dashboard is not None:
+                data = dashboard["history"]
                 if data:
                     st.dataframe(pd.DataFrame(data), use_container_width=True, height=400)
                     st.divider()
@@ -235,9 +316,11 @@ else:
                         confirm = st.checkbox("Confirm deletion")
                         if st.button("🚨 Clear My Records", type="primary", disabled=not confirm, key="clear_hist_btn"):
                             user_id_val = int(st.session_state['user_id'])
-                            del_r = requests.post(f"{API_URL}/clear_history?user_id={user_id_val}")
+                            del_r = http_session().post(f"{API_URL}/clear_history", params={"user_id": user_id_val},
+                                                        headers=auth_headers(), timeout=10)
                             
                             if del_r.status_code == 200:
+                                invalidate_dashboard()
                                 st.success("History Cleared!")
                                 st.rerun()
                             else:
@@ -4,6 +4,21 @@ from backend.main import app
 from unittest.mock import patch
 from httpx import AsyncClient, ASGITransport
 
+# Count prompt tokens with the character estimate instead of downloading the model's tokenizer
+os.environ.setdefault("PROMPT_TOKENIZER", "estimate")
+
+# Every test runs against a throwaway SQLite file, so the suite never reads, migrates or writes the
+# tracked data/news_database.db. A deployment's DATABASE_URL is dropped too: the storage layer prefers
+# it over DB_PATH, so it would otherwise point the tests at the real server database.
+@pytest.fixture(autouse=True)
+def _isolated_storage(tmp_path, monkeypatch):
+    from backend import storage
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    monkeypatch.setattr(storage, "DB_PATH", str(tmp_path / "test.db"))
+    storage.shutdown_engine()
+    yield storage
+    storage.shutdown_engine()
+
 # Verifies that the API root endpoint is reachable and returns a 200 status code
 @pytest.mark.asyncio
 async def test_health_check():
@@ -20,8 +35,11 @@ async def test_model_prediction():
     """
     Test the core misinformation detection logic without writing to the physical database.
     """
-    # prevent test data from being stored
-    with patch("backend.main.append_record") as mocked_storage:
+    # prevent test data from being stored; the judge is stubbed because failed inferences are never stored
+    async def judge(text, is_url=False):
+        return {"label": "uncertain", "confidence": 40, "explanation": "No sources found."}
+
+    with patch("backend.main.append_record") as mocked_storage, patch("backend.main.judge_news_async", judge):
         transport = ASGITransport(app=app)
         
         # Define the payload (test data) to be sent to the prediction endpoint
@@ -48,4 +66,968 @@ async def test_model_prediction():
 # Ensures that essential environment variables, like the model ID, are properly configured        
 def test_env_vars():
     "Verify that essential environment variables are available"
-    assert os.getenv("HF_MODEL") is not None
\ No newline at end of file
+    assert os.getenv("HF_MODEL") is not None
+
+# The storage module, already pointed at the test's throwaway database by _isolated_storage
+@pytest.fixture
+def temp_db(_isolated_storage):
+    return _isolated_storage
+
+# Verifies that the verdict cache matches normalized text and honors the configured TTL
+def test_verdict_cache_lookup(temp_db, monkeypatch):
+    "Cache hits ignore whitespace/case differences and expire after VERDICT_CACHE_TTL"
+    record = {"id": "abc12345", "timestamp": "2026-02-03 10:00:00", "input_type": "text", "url": "",
+              "title": "N/A", "text": "The Moon  is made of cheese", "label": "fake", "confidence": 95,
+              "explanation": "No.", "reviewer_feedback": "The user did not post a feedback."}
+    temp_db.append_record(record, 1)
+
+    cached = temp_db.check_cache("  the moon is made\nof CHEESE ")
+    assert cached["id"] == "abc12345" and cached["label"] == "fake"
+    assert temp_db.check_cache("The Sun is made of cheese") is None
+
+    monkeypatch.setenv("VERDICT_CACHE_TTL", "1")
+    monkeypatch.setattr(temp_db.time, "time", lambda: 10**12)
+    assert temp_db.check_cache("The Moon is made of cheese") is None
+
+# Verifies that the migration backfills digests for rows written by the old schema
+def test_verdict_cache_backfill(temp_db):
+    "Legacy news_history rows become cache hits after the first schema setup"
+    import sqlite3
+    conn = sqlite3.connect(temp_db.DB_PATH)
+    conn.execute("CREATE TABLE news_history (id TEXT PRIMARY KEY, user_id INTEGER, timestamp TEXT, input_type TEXT, "
+                 "url TEXT, title TEXT, text TEXT, label TEXT, confidence REAL, explanation TEXT, reviewer_feedback TEXT)")
+    conn.execute("INSERT INTO news_history (id, user_id, timestamp, text, label, confidence, explanation) "
+                 "VALUES ('old1', 1, '2026-01-01 00:00:00', 'Legacy claim', 'real', 80, 'ok')")
+    conn.commit()
+    conn.close()
+
+    before = temp_db.get_cache_stats()["backfilled"]
+    assert temp_db.check_cache("legacy claim")["id"] == "old1"
+    assert temp_db.get_cache_stats()["backfilled"] == before + 1
+
+# Verifies that concurrent writers share the pooled WAL-mode connections without lock errors
+def test_storage_engine_pool(temp_db):
+    "Threads borrow pooled connections and all of their writes land"
+    from concurrent.futures import ThreadPoolExecutor
+    engine = temp_db.init_engine(temp_db.DB_PATH, pool_size=4)
+    with engine.connection() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    def write(i):
+        temp_db.append_record({"id": f"r{i}", "timestamp": "2026-02-03 10:00:00", "text": f"claim {i}",
+                               "label": "real", "confidence": 50, "explanation": "x"}, 7)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(write, range(40)))
+
+    assert temp_db.get_stats_data(7)["total"] == 40
+    assert engine._pool.qsize() <= 4
+
+# Ensures the API process no longer needs pandas for storage and that history rows are plain dicts
+def test_storage_without_pandas(temp_db):
+    "backend.main imports without pandas; read_history returns JSON-ready dicts"
+    import sys
+    import subprocess
+    code = "import sys, backend.main; sys.exit('pandas' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", code]).returncode == 0
+
+    temp_db.append_record({"id": "h1", "timestamp": "2026-02-03 10:00:00", "text": "claim", "label": "real"}, 3)
+    rows = temp_db.read_history(3, 10)
+    assert rows == [{**rows[0], "id": "h1", "user_id": 3, "label": "real", "url": None}]
+
+# Verifies that /stats counters follow appends and clears and fall back to a SQL aggregate
+def test_stats_counters(temp_db):
+    "Materialized per-user counters match the history and expose raw counts"
+    for i, label in enumerate(["fake", "FAKE", "real", "uncertain"]):
+        temp_db.append_record({"id": f"s{i}", "text": f"claim {i}", "label": label}, 5)
+    stats = temp_db.get_stats_data(5)
+    assert stats["total"] == 4 and stats["fake_count"] == 2 and stats["fake_percent"] == 50.0
+    assert stats["real_count"] == 1 and stats["uncertain_percent"] == 25.0
+
+    # Rows inserted behind the counters' back are picked up by the aggregate fallback
+    with temp_db.get_engine().connection() as conn:
+        conn.execute("INSERT INTO news_history (id, user_id, label) VALUES ('raw', 6, 'real')")
+    assert temp_db.get_stats_data(6)["real_count"] == 1
+
+    temp_db.clear_all_history(5)
+    assert temp_db.get_stats_data(5)["total"] == 0
+
+# Verifies that concurrent /predict calls overlap their upstream waits instead of queueing on threads
+@pytest.mark.asyncio
+async def test_predict_async_concurrency(temp_db):
+    "50 requests with a 0.2s mocked model call finish in roughly one call's time"
+    import time
+    import asyncio
+
+    async def slow_judge(text, is_url=False):
+        await asyncio.sleep(0.2)
+        return {"label": "real", "confidence": 90, "explanation": "stub"}
+
+    with patch("backend.main.judge_news_async", slow_judge):
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as ac:
+            start = time.perf_counter()
+            responses = await asyncio.gather(*[ac.post("/predict", json={"text": f"claim {i}", "user_id": 9}) for i in range(50)])
+            elapsed = time.perf_counter() - start
+
+    assert all(r.status_code == 200 and r.json()["label"] == "real" for r in responses)
+    assert elapsed < 2
+    assert temp_db.get_stats_data(9)["total"] == 50
+
+# Verifies that upstream clients are process-wide singletons that are rebuilt after shutdown
+@pytest.mark.asyncio
+async def test_shared_upstream_clients(monkeypatch):
+    "Repeated lookups reuse one pooled client until close_clients() runs"
+    from backend import llm_judge
+    monkeypatch.setenv("TAVILY_API_KEY", "test-key")
+    monkeypatch.setenv("UPSTREAM_POOL_SIZE", "3")
+    await llm_judge.close_clients()
+
+    first = llm_judge._get_async_tavily_client()
+    assert llm_judge._get_async_tavily_client() is first
+    assert llm_judge._get_hf_client() is llm_judge._get_hf_client()
+    assert llm_judge._get_tavily_client().session.get_adapter("https://api.tavily.com")._pool_maxsize == 3
+
+    await llm_judge.close_clients()
+    assert llm_judge._get_async_tavily_client() is not first
+    await llm_judge.close_clients()
+
+# Verifies that /predict_batch dedupes, serves cache hits, isolates failures and preserves input order
+@pytest.mark.asyncio
+async def test_predict_batch(temp_db):
+    "Each unique uncached text is judged once; per-item errors do not fail the batch"
+    temp_db.append_record({"id": "known1", "text": "Known claim", "label": "fake", "confidence": 90, "explanation": "old"}, 4)
+    calls = []
+
+    async def fake_judge(text, is_url=False):
+        calls.append(text)
+        if text == "boom":
+            raise RuntimeError("upstream down")
+        return {"label": "real", "confidence": 70, "explanation": text}
+
+    with patch("backend.main.judge_news_async", fake_judge):
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as ac:
+            response = await ac.post("/predict_batch", json={"texts": ["new claim", "known claim", "boom", "New  claim"], "user_id": 4})
+
+    results = response.json()["results"]
+    assert [r["index"] for r in results] == [0, 1, 2, 3]
+    assert sorted(calls) == ["boom", "new claim"]
+    assert results[1]["source"] == "database" and results[1]["id"] == "known1"
+    assert results[2]["error"] == "upstream down"
+    assert results[0]["explanation"] == results[3]["explanation"] == "new claim"
+    assert temp_db.get_stats_data(4)["total"] == 2
+
+# Verifies that /analyze_url_batch reports malformed and unreachable URLs per item
+@pytest.mark.asyncio
+async def test_analyze_url_batch_item_errors(temp_db):
+    "A bad URL gets its own error entry while the rest of the batch is scraped and judged"
+    scraped, judged = [], []
+
+    async def scrape(url):
+        scraped.append(url)
+        if "down" in url:
+            raise ValueError("Failed to fetch the article")
+        if "empty" in url:
+            # What scrape_article_async returns for an unreachable page
+            return {"url": url, "title": "N/A", "text": ""}
+        return {"url": url, "title": "Story", "text": f"Article text from {url}"}
+
+    async def judge(text, is_url=False):
+        judged.append(text)
+        return {"label": "real", "confidence": 75, "explanation": "consistent"}
+
+    urls = ["https://example.com/a?utm_source=x", "http://bad:port/x", "https://down.example.com/b", "https://example.com/a",
+            "https://empty.example.com/c"]
+    with patch("backend.main.scrape_article_async", scrape), patch("backend.main.judge_news_async", judge):
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as ac:
+            response = await ac.post("/analyze_url_batch", json={"urls": urls, "user_id": 6})
+    # The real scraper on a closed port: a 400, not a verdict on the empty string
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        unreachable = await ac.post("/analyze_url", json={"url": "http://127.0.0.1:1/story", "user_id": 6})
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["index"] for r in results] == [0, 1, 2, 3, 4] and [r["url"] for r in results] == urls
+    assert results[0]["label"] == results[3]["label"] == "real" and results[0]["id"] == results[3]["id"]
+    assert "port" in results[1]["error"].lower() and results[2]["error"] == "Failed to fetch the article"
+    assert "No article text" in results[4]["error"] and "label" not in results[4]
+    assert sorted(scraped) == ["https://down.example.com/b", "https://empty.example.com/c", "https://example.com/a"]
+    assert unreachable.status_code == 400 and "No article text" in unreachable.json()["detail"]
+    assert "" not in judged and temp_db.check_cache("") is None
+    assert temp_db.get_stats_data(6)["total"] == 1
+
+# Verifies the SSE stream: search event, LLM tokens as they arrive, then the persisted verdict
+@pytest.mark.asyncio
+async def test_predict_stream(temp_db):
+    "Tokens stream through and the final verdict is parsed and stored"
+    import json
+    from types import SimpleNamespace
+
+    async def search(**kwargs):
+        return {"results": [{"title": "Wire", "url": "https://example.com", "content": "Context"}]}
+
+    async def create(**kwargs):
+        assert kwargs["stream"] is True
+        async def chunks():
+            for piece in ['{"label": "fake", ', '"confidence": 88, ', '"explanation": "contradicted"}']:
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))])
+        return chunks()
+
+    tavily = SimpleNamespace(search=search)
+    hf = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    with patch("backend.llm_judge._get_async_tavily_client", lambda: tavily), \
+         patch("backend.llm_judge._get_async_hf_client", lambda: hf):
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as ac:
+            response = await ac.post("/predict_stream", json={"text": "streamed claim", "user_id": 2})
+
+    frames = [frame.split("\n") for frame in response.text.strip().split("\n\n")]
+    events = [(lines[0][len("event: "):], json.loads(lines[1][len("data: "):])) for lines in frames]
+    assert [name for name, _ in events] == ["search", "token", "token", "token", "verdict"]
+    assert events[0][1]["sources"][0]["title"] == "Wire"
+    assert events[-1][1]["label"] == "fake" and events[-1][1]["confidence"] == 88
+    assert temp_db.check_cache("streamed claim")["id"] == events[-1][1]["id"]
+
+# Verifies that identical concurrent analyses share one upstream call but each user gets a record
+@pytest.mark.asyncio
+async def test_predict_single_flight(temp_db):
+    "10 simultaneous identical /predict calls run judge_news_async once"
+    import asyncio
+    from backend import main
+    calls = []
+
+    async def slow_judge(text, is_url=False):
+        calls.append(text)
+        await asyncio.sleep(0.1)
+        return {"label": "fake", "confidence": 60, "explanation": "viral"}
+
+    before = main.judge_flight.snapshot()["coalesced"]
+    with patch("backend.main.judge_news_async", slow_judge):
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as ac:
+            responses = await asyncio.gather(*[
+                ac.post("/predict", json={"text": "Breaking: viral story", "user_id": 20 + i}) for i in range(10)
+            ])
+
+    assert len(calls) == 1
+    assert main.judge_flight.snapshot()["coalesced"] - before == 9
+    assert len({r.json()["id"] for r in responses}) == 10
+    assert all(temp_db.get_stats_data(20 + i)["fake_count"] == 1 for i in range(10))
+
+# Verifies that identical concurrent streams join one flight: the leader streams the search and token
+# events, the other streams and a plain /predict get the shared verdict, and every user gets a record
+@pytest.mark.asyncio
+async def test_predict_stream_single_flight(temp_db):
+    "4 simultaneous identical /predict_stream calls and one /predict run judge_news_stream once"
+    import json
+    import asyncio
+    from backend import main
+    calls = []
+
+    async def slow_stream(text, is_url=False):
+        calls.append(text)
+        yield "search", {"ok": True, "sources": []}
+        await asyncio.sleep(0.1)
+        yield "token", {"text": "{}"}
+        yield "verdict", {"label": "fake", "confidence": 60, "explanation": "viral"}
+
+    async def judge(text, is_url=False):
+        raise AssertionError("a plain request must join the streamed flight")
+
+    before = main.judge_flight.snapshot()["coalesced"]
+    with patch("backend.main.judge_news_stream", slow_stream), patch("backend.main.judge_news_async", judge):
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as ac:
+            streams = [asyncio.ensure_future(ac.post("/predict_stream", json={"text": "Breaking: viral stream", "user_id": 40 + i}))
+                       for i in range(4)]
+            await asyncio.sleep(0.05)
+            plain = await ac.post("/predict", json={"text": "Breaking: viral stream", "user_id": 44})
+            responses = await asyncio.gather(*streams)
+
+    events = [[(lines[0][len("event: "):], json.loads(lines[1][len("data: "):]))
+               for lines in (frame.split("\n") for frame in r.text.strip().split("\n\n"))] for r in responses]
+    assert len(calls) == 1
+    assert main.judge_flight.snapshot()["coalesced"] - before == 4
+    assert sorted([name for name, _ in stream] for stream in events) == [["search", "token", "verdict"]] + [["verdict"]] * 3
+    assert all(stream[-1][1]["label"] == "fake" for stream in events) and plain.json()["label"] == "fake"
+    assert len({stream[-1][1]["id"] for stream in events} | {plain.json()["id"]}) == 5
+    assert all(temp_db.get_stats_data(40 + i)["fake_count"] == 1 for i in range(5))
+
+# Verifies the URL scrape cache: canonical keys, fresh hits without I/O, and 304 revalidation
+@pytest.mark.asyncio
+async def test_scrape_cache_revalidation(temp_db, monkeypatch):
+    "Tracking parameters share a cache key; stale entries are revalidated with the stored ETag"
+    import httpx
+    from backend import scraping
+    seen = []
+
+    def handler(request):
+        seen.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304)
+        html = "<html><title>Story</title><body><p>First paragraph.</p></body></html>"
+        return httpx.Response(200, text=html, headers={"ETag": '"v1"'})
+
+    real_client = httpx.AsyncClient
+    monkeypatch.setattr(httpx, "AsyncClient", lambda **kw: real_client(transport=httpx.MockTransport(handler), **kw))
+
+    assert scraping.canonicalize_url("HTTPS://News.example.com:443/a?utm_source=x&b=2&a=1#top") == "https://news.example.com/a?a=1&b=2"
+    first = await scraping.scrape_article_async("https://news.example.com/a?utm_source=x")
+    second = await scraping.scrape_article_async("https://news.example.com/a?fbclid=y")
+    assert first["text"] == second["text"] == "First paragraph." and seen == [None]
+
+    monkeypatch.setenv("SCRAPE_CACHE_TTL", "0")
+    third = await scraping.scrape_article_async("https://news.example.com/a")
+    assert third["title"] == "Story" and seen == [None, '"v1"']
+
+# Verifies the bounded extractor keeps only main-container text and stops at the character budget
+@pytest.mark.parametrize("parser", ["html.parser", "lxml"])
+def test_bounded_extraction(parser):
+    "Navigation, scripts and comments are ignored; extraction stops once max_chars is reached"
+    from backend import extraction
+    if parser == "lxml" and extraction.etree is None:
+        pytest.skip("lxml not installed")
+    body = "".join(f"<p>Article paragraph {i} &amp; more.</p>" for i in range(200))
+    html = (f"<html><head><title> Big  Story </title><script>var p = '<p>no</p>';</script></head><body>"
+            f"<nav><p>Menu</p></nav><div role='main'><article>{body}</article></div>"
+            f"<section><p>Reader comment</p></section></body></html>")
+
+    article = extraction.extract_bounded(html, max_chars=200, parser=parser)
+    lines = article["text"].split("\n")
+    assert article["title"] == "Big Story"
+    assert lines[0] == "Article paragraph 0 & more."
+    assert 200 <= len(article["text"]) < 260 and "Menu" not in article["text"]
+
+# Verifies that reworded queries reuse cached Tavily results and that saved latency is tracked
+@pytest.mark.asyncio
+async def test_search_cache(temp_db):
+    "Punctuation, case and stopword differences share one Tavily call"
+    from types import SimpleNamespace
+    from backend import llm_judge
+    searches = []
+
+    async def search(query, **kwargs):
+        searches.append(query)
+        return {"results": [{"title": "Agency", "content": "The bridge was not closed."}]}
+
+    before = dict(llm_judge.SEARCH_STATS)
+    with patch("backend.llm_judge._get_async_tavily_client", lambda: SimpleNamespace(search=search)):
+        first = await llm_judge._search_async("The bridge is CLOSED!")
+        second = await llm_judge._search_async("bridge closed")
+
+    assert len(searches) == 1
+    assert first[1] == second[1] and "Agency" in second[1]
+    assert llm_judge.SEARCH_STATS["hits"] - before["hits"] == 1
+    assert llm_judge.SEARCH_STATS["saved_ms"] >= before["saved_ms"]
+
+# Verifies that a lightly edited republication is served from the near-duplicate index
+@pytest.mark.asyncio
+async def test_near_duplicate_cache(temp_db):
+    "A re-published wire story reuses the earlier verdict, tagged with its record id and similarity"
+    story = ("The central bank raised interest rates by half a point on Tuesday, citing persistent inflation "
+             "in services and housing, officials said in a statement released after the two day meeting ended.")
+    calls = []
+
+    async def judge(text, is_url=False):
+        calls.append(text)
+        return {"label": "real", "confidence": 90, "explanation": "matches agency reports"}
+
+    with patch("backend.main.judge_news_async", judge):
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as ac:
+            first = (await ac.post("/predict", json={"text": story, "user_id": 7})).json()
+            copy = (await ac.post("/predict", json={"text": "UPDATE: " + story + " More to follow.", "user_id": 8})).json()
+            other = (await ac.post("/predict", json={"text": "A local football club " + story[60:][::-1], "user_id": 8})).json()
+            batch = (await ac.post("/predict_batch", json={"texts": ["BREAKING: " + story, story], "user_id": 9})).json()
+
+    assert copy["source"] == "similarity" and copy["similar_to"] == first["id"]
+    assert copy["similarity"] >= 0.8 and copy["label"] == "real"
+    assert "similar_to" not in other
+    assert batch["results"][0]["source"] == "similarity" and batch["results"][0]["similar_to"] == first["id"]
+    assert batch["results"][1]["source"] == "database"
+    assert len(calls) == 2
+
+# Verifies background jobs: immediate job id, retry after a failed attempt, polling and the callback
+@pytest.mark.asyncio
+async def test_background_job_retry(temp_db, monkeypatch):
+    "A job whose first attempt fails is retried, finishes, and its document is POSTed to the callback"
+    import json
+    import asyncio
+    import httpx
+    from backend import main, jobs
+    from backend.llm_judge import inference_failure
+    monkeypatch.setenv("JOB_RETRY_BASE", "0")
+    monkeypatch.setenv("JOB_POLL_INTERVAL", "0.05")
+    attempts, callbacks = [], []
+
+    # The judge reports an upstream timeout as a flagged verdict, which must not complete the job
+    async def flaky_judge(text, is_url=False):
+        attempts.append(text)
+        if len(attempts) == 1:
+            return inference_failure("inference timeout")
+        return {"label": "fake", "confidence": 70, "explanation": "no sources"}
+
+    real_client = httpx.AsyncClient
+    transport_cb = httpx.MockTransport(lambda request: callbacks.append(json.loads(request.content)) or httpx.Response(204))
+    monkeypatch.setattr(httpx, "AsyncClient", lambda **kw: real_client(transport=transport_cb, **kw))
+
+    with patch("backend.main.judge_news_async", flaky_judge):
+        await main.job_workers.start()
+        try:
+            transport = ASGITransport(app=app)
+            async with AsyncClient(transport=transport, base_url="http://test") as ac:
+                submitted = await ac.post("/jobs/predict", json={"text": "Moon made of cheese", "user_id": 3,
+                                                                 "callback_url": "http://client/hook"})
+                assert submitted.status_code == 202
+                for _ in range(100):
+                    job = (await ac.get(submitted.json()["status_url"])).json()
+                    if job["status"] == "done" and callbacks:
+                        break
+                    await asyncio.sleep(0.05)
+        finally:
+            await main.job_workers.stop()
+
+    assert job["status"] == "done" and job["attempts"] == 2
+    assert job["result"]["label"] == "fake" and job["error"] is None
+    assert job["queue_ms"] is not None and job["run_ms"] >= 0
+    assert callbacks[0]["id"] == job["id"] and callbacks[0]["status"] == "done"
+    assert temp_db.get_stats_data(3)["fake_count"] == 1
+
+# Verifies that a job leased by a worker that died is claimed again once its lease expires
+def test_job_survives_restart(temp_db):
+    temp_db.enqueue_job("job-1", "text", {"text": "x", "user_id": 1})
+    assert temp_db.claim_job(lease_seconds=-1)["attempts"] == 1
+    # Simulated crash: the job stays "running" with a lapsed lease
+    reclaimed = temp_db.claim_job(lease_seconds=60)
+    assert reclaimed["id"] == "job-1" and reclaimed["attempts"] == 2
+    assert temp_db.claim_job(lease_seconds=60) is None
+
+# Verifies that an attempt running past its lease is abandoned and retried instead of running on
+@pytest.mark.asyncio
+async def test_job_attempt_bounded_by_lease(temp_db, monkeypatch):
+    "A hung handler is cut off at the lease, so no other worker can claim the job while it still runs"
+    import asyncio
+    from backend.jobs import JobWorkerPool, _job_settings
+    monkeypatch.setenv("JOB_LEASE_SECONDS", "0.2")
+
+    async def hung(job):
+        await asyncio.sleep(30)
+
+    pool = JobWorkerPool(hung)
+    pool._settings = _job_settings()
+    temp_db.enqueue_job("hung-1", "text", {"text": "x", "user_id": 1}, max_attempts=1)
+    await asyncio.wait_for(pool._run(temp_db.claim_job(0.2)), 5)
+    job = temp_db.get_job("hung-1")
+    assert job["status"] == "failed" and "lease" in job["error"]
+
+# Verifies that neither a storage error nor an unusable callback URL takes a job worker down, and that
+# the API rejects such callback URLs up front
+@pytest.mark.asyncio
+async def test_job_worker_survives_errors(temp_db, monkeypatch):
+    "The single worker keeps draining the queue after a failed claim and a callback httpx cannot send"
+    import asyncio
+    from backend import jobs
+    monkeypatch.setenv("JOB_WORKERS", "1")
+    monkeypatch.setenv("JOB_POLL_INTERVAL", "0.05")
+    claims = []
+
+    def flaky_claim(lease_seconds):
+        claims.append(lease_seconds)
+        if len(claims) == 1:
+            raise RuntimeError("database is locked")
+        return temp_db.claim_job(lease_seconds)
+
+    async def handler(job):
+        return {"label": "real"}
+
+    monkeypatch.setattr(jobs, "claim_job", flaky_claim)
+    temp_db.enqueue_job("bad-hook", "text", {"text": "x", "user_id": 1}, "http://x.com:abc/hook")
+    temp_db.enqueue_job("next", "text", {"text": "y", "user_id": 1})
+    pool = jobs.JobWorkerPool(handler)
+    await pool.start()
+    try:
+        for _ in range(100):
+            if temp_db.get_job("next")["status"] == "done":
+                break
+            await asyncio.sleep(0.05)
+    finally:
+        await pool.stop()
+    assert temp_db.get_job("bad-hook")["status"] == "done" and temp_db.get_job("next")["status"] == "done"
+    assert pool.stats["callbacks_failed"] == 1 and len(claims) > 2
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        for url in ("http://x.com:abc/hook", "ftp://client/hook", "not a url"):
+            response = await ac.post("/jobs/predict", json={"text": "x", "user_id": 1, "callback_url": url})
+            assert response.status_code == 422
+
+# Verifies the Server-Timing breakdown and the /metrics exposition for a full /predict pipeline
+@pytest.mark.asyncio
+async def test_metrics_and_stage_timing(temp_db, monkeypatch):
+    "Each stage is timed; search failures and non-JSON model output are counted"
+    from types import SimpleNamespace
+    from backend import metrics
+
+    async def failing_search(query, **kwargs):
+        raise RuntimeError("tavily down")
+
+    async def create(**kwargs):
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="I cannot tell."))])
+
+    hf = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    failures, fallbacks = metrics.UPSTREAM_FAILURES.value("tavily"), metrics.PARSE_FALLBACKS.value()
+    monkeypatch.setenv("HF_MODEL", "test-model")
+    with patch("backend.llm_judge._get_async_tavily_client", lambda: SimpleNamespace(search=failing_search)), \
+         patch("backend.llm_judge._get_async_hf_client", lambda: hf):
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as ac:
+            response = await ac.post("/predict", json={"text": "Metrics story", "user_id": 5},
+                                     headers={"X-Stage-Timing": "1"})
+            exposition = (await ac.get("/metrics")).text
+
+    assert response.json()["label"] == "uncertain"
+    timing = response.headers["server-timing"]
+    assert all(f"{name};dur=" in timing for name in ("cache", "search", "llm", "parse", "db_write", "total"))
+    assert metrics.UPSTREAM_FAILURES.value("tavily") == failures + 1
+    assert metrics.PARSE_FALLBACKS.value() == fallbacks + 1
+    assert 'misinfo_stage_duration_seconds_bucket{stage="llm",le="+Inf"}' in exposition
+    assert 'misinfo_requests_total{route="/predict",status="200"}' in exposition
+    assert 'misinfo_cache_events_total{cache="verdict",event="miss"}' in exposition
+
+# Verifies sign-up/login through the bcrypt process pool and the signed session token
+@pytest.mark.asyncio
+async def test_login_session_token(temp_db, monkeypatch):
+    "Login returns a token that /session validates without a database lookup; tampering is rejected"
+    from backend import auth
+    monkeypatch.setenv("SESSION_SECRET", "test-secret")
+    credentials = {"email": "Reader@Example.com ", "password": "hunter22"}
+    try:
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as ac:
+            assert (await ac.post("/signup", json=credentials)).status_code == 200
+            wrong = await ac.post("/login", json={**credentials, "password": "nope"})
+            login = (await ac.post("/login", json=credentials)).json()
+            token = login["token"]
+            with patch("backend.storage.get_engine", side_effect=AssertionError("no DB access")):
+                session = await ac.get("/session", headers={"Authorization": f"Bearer {token}"})
+            forged = await ac.get("/session", headers={"Authorization": f"Bearer 999{token}"})
+            non_ascii = await ac.get("/session", headers={"Authorization": "Bearer 1.9999999999.\u00e9".encode("utf-8")})
+            own = await ac.get("/history", params={"user_id": login["user_id"]}, headers={"Authorization": f"Bearer {token}"})
+            other = await ac.get("/history", params={"user_id": login["user_id"] + 1}, headers={"Authorization": f"Bearer {token}"})
+            anonymous = [await ac.get(path, params={"user_id": login["user_id"]}) for path in ("/history", "/dashboard", "/export", "/stats")]
+            anonymous.append(await ac.post("/clear_history", params={"user_id": login["user_id"]}))
+    finally:
+        auth.shutdown_hasher()
+
+    assert wrong.status_code == 401
+    assert session.json() == {"user_id": login["user_id"]}
+    assert forged.status_code == 401 and non_ascii.status_code == 401
+    assert own.status_code == 200 and other.status_code == 401
+    assert [response.status_code for response in anonymous] == [401] * 5
+
+# Authorization header carrying a session token for user_id, for the user-scoped routes
+def _session_headers(user_id: int) -> dict:
+    from backend.auth import issue_session_token
+    return {"Authorization": f"Bearer {issue_session_token(user_id)}"}
+
+# Verifies keyset pagination over /history: stable pages, projection, validation and index use
+@pytest.mark.asyncio
+async def test_history_keyset_pagination(temp_db):
+    "Pages follow X-Next-Cursor without gaps or repeats and the query walks the (user_id, timestamp) index"
+    records = [{"id": f"r{i:02d}", "timestamp": f"2024-01-01 00:00:{i // 2:02d}", "text": "x" * 1000, "label": "real"}
+               for i in range(25)]
+    temp_db.append_records(records, 9)
+
+    pages, cursor = [], None
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        while True:
+            params = {"user_id": 9, "limit": 10, "fields": "label"} | ({"cursor": cursor} if cursor else {})
+            response = await ac.get("/history", params=params, headers=_session_headers(9))
+            pages.append(response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        too_big = await ac.get("/history", params={"user_id": 9, "limit": 5000}, headers=_session_headers(9))
+        bad_field = await ac.get("/history", params={"user_id": 9, "fields": "password"}, headers=_session_headers(9))
+
+    ids = [row["id"] for page in pages for row in page]
+    assert [len(page) for page in pages] == [10, 10, 5]
+    assert ids == sorted((r["id"] for r in records), reverse=True)
+    assert set(pages[0][0]) == {"id", "timestamp", "label"}
+    assert too_big.status_code == 422 and bad_field.status_code == 400
+
+    with temp_db.get_engine().connection() as conn:
+        plan = " ".join(row[-1] for row in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM news_history WHERE user_id = ? AND (timestamp, id) < (?, ?) "
+            "ORDER BY timestamp DESC, id DESC LIMIT 10", (9, "2024", "r")))
+    assert "idx_news_history_user_ts" in plan and "TEMP B-TREE" not in plan
+
+# Records saved without a timestamp still page correctly: none is stored as NULL, so no row falls
+# outside the (timestamp, id) keyset range at a page boundary
+def test_history_pages_without_timestamps(temp_db):
+    "Rows missing a timestamp are each returned exactly once across pages"
+    records = [{"id": f"t{i}", "timestamp": f"2024-01-01 00:00:0{i}", "text": "x", "label": "real"} for i in range(3)]
+    records += [{"id": "n1", "timestamp": None, "text": "x"}, {"id": "n2", "text": "x"}, {"id": "n3", "timestamp": None, "text": "x"}]
+    temp_db.append_records(records, 11)
+
+    ids, cursor = [], None
+    while True:
+        page, cursor = temp_db.read_history_page(11, limit=2, cursor=cursor)
+        ids += [row["id"] for row in page]
+        assert all(row["timestamp"] for row in page)
+        if not cursor:
+            break
+    assert ids == ["n3", "n2", "n1", "t2", "t1", "t0"]
+    with pytest.raises(ValueError):
+        temp_db.read_history_page(11, cursor=temp_db.encode_history_cursor(None, "n1"))
+
+# Verifies the streamed history export: filters, all three formats and the admin gate
+@pytest.mark.asyncio
+async def test_history_export(temp_db, monkeypatch):
+    "Rows are filtered by user, label, date range and input type and round-trip through each format"
+    import io
+    import csv
+    import json
+    monkeypatch.setenv("EXPORT_CHUNK_ROWS", "3")
+    temp_db.append_records([{"id": f"a{i}", "timestamp": f"2024-03-{i + 1:02d} 10:00:00", "input_type": "url" if i % 2 else "text",
+                             "text": f"story {i}", "label": "Fake" if i < 6 else "real", "confidence": 0.5}
+                            for i in range(10)], 4)
+    temp_db.append_records([{"id": "b0", "timestamp": "2024-03-02 10:00:00", "label": "fake"}], 5)
+    params = {"user_id": 4, "label": "fake", "since": "2024-03-02", "until": "2024-03-06", "input_type": "url"}
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        ndjson = await ac.get("/export", params={**params, "format": "ndjson"}, headers=_session_headers(4))
+        as_csv = await ac.get("/export", params={**params, "format": "csv"}, headers=_session_headers(4))
+        parquet = await ac.get("/export", params={**params, "format": "parquet"}, headers=_session_headers(4))
+        everyone = await ac.get("/export")
+        monkeypatch.setenv("EXPORT_ADMIN_TOKEN", "s3cret")
+        admin = await ac.get("/export", headers={"Authorization": "Bearer s3cret"})
+
+    expected = ["a1", "a3"]
+    assert [json.loads(line)["id"] for line in ndjson.text.splitlines()] == expected
+    assert [row["id"] for row in csv.DictReader(io.StringIO(as_csv.text))] == expected
+    assert everyone.status_code == 403 and len(admin.text.splitlines()) == 11
+    import pyarrow.parquet as pq
+    assert parquet.status_code == 200 and pq.read_table(io.BytesIO(parquet.content)).column("id").to_pylist() == expected
+
+# Verifies the offline corpus scorer: cache reuse, in-corpus dedup, streaming output and resume
+@pytest.mark.asyncio
+async def test_score_corpus_resume(temp_db, tmp_path):
+    "An interrupted run resumes from the output file without re-judging finished items"
+    import json
+    from backend import score_corpus as cli
+    temp_db.append_record({"id": "known", "text": "Already judged claim", "label": "real", "confidence": 90,
+                           "explanation": "seen before"}, 1)
+    corpus = tmp_path / "claims.jsonl"
+    corpus.write_text("\n".join(json.dumps({"id": f"c{i}", "text": text}) for i, text in
+                                enumerate(["Already judged claim", "New claim", "New claim", "Other claim"])))
+    output = tmp_path / "scored.jsonl"
+    # Simulated crash: c1 finished, then a half-written line
+    output.write_text(json.dumps({"item_id": "c1", "label": "fake"}) + '\n{"item_id": "c2", "lab')
+    judged = []
+
+    async def judge(text, is_url=False):
+        judged.append(text)
+        return {"label": "fake", "confidence": 55, "explanation": "unsupported"}
+
+    with patch.object(cli, "judge_news_async", judge):
+        stats = await cli.score_corpus(str(corpus), str(output), concurrency=2, rate=0, user_id=2)
+
+    rows = [json.loads(line) for line in output.read_text().splitlines()]
+    assert sorted(row["item_id"] for row in rows) == ["c0", "c1", "c2", "c3"]
+    assert stats == {"resumed": 1, "cached": 1, "judged": 2, "failed": 0}
+    assert sorted(judged) == ["New claim", "Other claim"]
+    assert next(row for row in rows if row["item_id"] == "c0")["source"] == "database"
+    assert temp_db.check_cache("Other claim")["label"] == "fake"
+    assert temp_db.get_stats_data(2)["total"] == 2
+
+# Verifies the HF circuit breaker: retries, opening after repeated failures, degraded near-match verdicts and fast-fail
+@pytest.mark.asyncio
+async def test_circuit_breaker_degraded_mode(temp_db, monkeypatch):
+    "A failing model opens the circuit; near matches are served as degraded and not stored"
+    import httpx
+    from types import SimpleNamespace
+    from backend import resilience
+    for name, value in {"HF_RETRIES": "1", "HF_RETRY_BASE": "0", "HF_BREAKER_FAILURES": "2", "HF_BREAKER_RESET": "60",
+                        "HF_MODEL": "test-model", "NEAR_DUP_THRESHOLD": "0.8"}.items():
+        monkeypatch.setenv(name, value)
+    resilience.reset_upstreams()
+    known = ("Officials confirmed on Monday that the northern railway bridge will close for six months of structural "
+             "repairs starting in early spring, according to the regional transport authority statement.")
+    variant = known.replace("according to the regional transport authority statement.",
+                            "the regional transport authority said in a statement.")
+    temp_db.append_record({"id": "bridge", "text": known, "label": "real", "confidence": 85, "explanation": "confirmed"}, 1)
+    calls = []
+
+    async def create(**kwargs):
+        calls.append(kwargs)
+        raise httpx.ConnectTimeout("model endpoint timed out")
+
+    async def search(query, **kwargs):
+        return {"results": []}
+
+    hf = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    try:
+        with patch("backend.llm_judge._get_async_hf_client", lambda: hf), \
+             patch("backend.llm_judge._get_async_tavily_client", lambda: SimpleNamespace(search=search)):
+            transport = ASGITransport(app=app)
+            async with AsyncClient(transport=transport, base_url="http://test") as ac:
+                degraded = (await ac.post("/predict", json={"text": variant, "user_id": 2})).json()
+                health = (await ac.get("/health")).json()
+                unrelated = (await ac.post("/predict", json={"text": "Unrelated claim", "user_id": 2})).json()
+                exposition = (await ac.get("/metrics")).text
+    finally:
+        resilience.reset_upstreams()
+
+    assert len(calls) == 2  # first attempt + one retry, then the open circuit fails fast
+    assert degraded["source"] == "degraded" and degraded["similar_to"] == "bridge" and degraded["label"] == "real"
+    assert health["status"] == "degraded" and health["upstreams"]["hf"]["state"] == "open"
+    assert unrelated["label"] == "uncertain" and "circuit is open" in unrelated["explanation"]
+    assert unrelated["inference_failed"] is True and unrelated["id"] is None
+    assert temp_db.get_stats_data(2)["total"] == 0  # neither the degraded nor the failure verdict was stored
+    assert temp_db.check_cache("Unrelated claim") is None
+    assert 'misinfo_circuit_state{upstream="hf"} 2' in exposition
+
+# Verifies that a half-open probe cancelled mid-call (e.g. an SSE client disconnecting) frees the probe slot
+@pytest.mark.asyncio
+async def test_cancelled_probe_releases_breaker(monkeypatch):
+    "After the cancelled probe, the next call probes the upstream again and closes the circuit"
+    import asyncio
+    from backend.resilience import Upstream
+    for name, value in {"PROBE_RETRIES": "0", "PROBE_BREAKER_FAILURES": "1", "PROBE_BREAKER_RESET": "0"}.items():
+        monkeypatch.setenv(name, value)
+    upstream = Upstream("probe")
+
+    async def fail():
+        raise TimeoutError("upstream down")
+
+    async def ok():
+        return "ok"
+
+    with pytest.raises(TimeoutError):
+        await upstream.call(fail)
+    probe = asyncio.create_task(upstream.call(lambda: asyncio.sleep(30)))
+    await asyncio.sleep(0.01)
+    assert upstream.breaker.state == "half_open"
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+    assert await upstream.call(ok) == "ok" and upstream.breaker.state == "closed"
+
+# Importing backend.main stays within a time budget and leaves the upstream client libraries for the
+# background warmup. fastapi/pydantic are imported first, so the budget covers this project's own modules.
+def test_import_time_budget():
+    import sys
+    import subprocess
+    budget_ms = float(os.getenv("IMPORT_BUDGET_MS", "400"))
+    heavy = ("tavily", "huggingface_hub", "requests", "httpx", "bs4", "pyarrow", "pandas", "numpy", "tokenizers")
+    code = ("import sys, fastapi, fastapi.responses, pydantic, dotenv; import backend.main; "
+            f"print(' '.join(name for name in {heavy!r} if name in sys.modules))")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True,
+                            check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    cumulative_us = next(int(line.split("|")[1]) for line in result.stderr.splitlines()
+                         if line.split("|")[-1].strip() == "backend.main")
+    assert result.stdout.strip() == ""
+    assert cumulative_us / 1000 < budget_ms
+
+# /dashboard returns stats and recent history together and answers a matching If-None-Match with 304
+@pytest.mark.asyncio
+async def test_dashboard_etag(temp_db):
+    temp_db.append_records([{"id": f"d{i}", "timestamp": f"2024-01-01 00:00:0{i}", "text": f"claim {i}",
+                             "label": "fake" if i % 2 else "real"} for i in range(4)], 11)
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        first = await ac.get("/dashboard", params={"user_id": 11, "limit": 3}, headers=_session_headers(11))
+        etag = first.headers["ETag"]
+        unchanged = await ac.get("/dashboard", params={"user_id": 11, "limit": 3}, headers={"If-None-Match": f'W/{etag}', **_session_headers(11)})
+        await ac.post("/update_feedback", json={"id": "d3", "feedback": "Checked"})
+        changed = await ac.get("/dashboard", params={"user_id": 11, "limit": 3}, headers={"If-None-Match": etag, **_session_headers(11)})
+
+    body = first.json()
+    assert body["stats"]["total"] == 4 and body["stats"]["fake_count"] == 2
+    assert [row["id"] for row in body["history"]] == ["d3", "d2", "d1"]
+    assert unchanged.status_code == 304 and unchanged.content == b"" and unchanged.headers["ETag"] == etag
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+    assert changed.json()["history"][0]["reviewer_feedback"] == "Checked"
+
+# A PostgreSQL server for the client/server storage driver: TEST_DATABASE_URL (e.g. a local docker
+# container) or a throwaway pgserver instance. Each test gets its own schema; skipped without either.
+@pytest.fixture
+def server_db(tmp_path, monkeypatch):
+    pytest.importorskip("psycopg_pool")
+    import uuid
+    import psycopg
+    from backend import storage
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    url, server = os.getenv("TEST_DATABASE_URL"), None
+    if not url:
+        server = pytest.importorskip("pgserver").get_server(str(tmp_path / "pg"), cleanup_mode="stop")
+        url = server.get_uri()
+    schema = f"test_{uuid.uuid4().hex[:12]}"
+    with psycopg.connect(url, autocommit=True) as conn:
+        conn.execute(f"CREATE SCHEMA {schema}")
+    storage.shutdown_engine()
+    yield storage, f"{url}{'&' if '?' in url else '?'}options=-c%20search_path%3D{schema}"
+    storage.shutdown_engine()
+    with psycopg.connect(url, autocommit=True) as conn:
+        conn.execute(f"DROP SCHEMA {schema} CASCADE")
+    if server is not None:
+        server.cleanup()
+
+# The storage functions behave the same on the server driver, and separate engines (standing in for
+# replicas) share history, caches and users and never lease the same job twice
+def test_server_storage_driver(server_db):
+    from concurrent.futures import ThreadPoolExecutor
+    storage, url = server_db
+    # Replicas starting at once: the advisory lock lets exactly one create the schema
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        for engine in list(pool.map(lambda _: storage._create_engine(url, 2), range(3))):
+            engine.close()
+
+    text = ("Officials confirmed on Monday that the northern railway bridge will close for six months of structural "
+            "repairs starting in early spring, according to the regional transport authority statement.")
+    storage.init_engine(url, pool_size=4)
+    storage.append_records([{"id": f"p{i}", "timestamp": f"2024-01-01 00:00:0{i}", "text": f"{text} Update {i}.",
+                             "label": "Fake" if i % 2 else "real", "confidence": 70.5, "explanation": "x"}
+                            for i in range(5)], 3)
+    assert storage.insert_user("Reader@Example.com", b"$2b$12$hash") is True
+    assert storage.insert_user("reader@example.com ", b"$2b$12$other") is False
+    for i in range(20):
+        storage.enqueue_job(f"job{i}", "predict", {"i": i})
+
+    # A fresh engine sees everything the first one wrote
+    storage.init_engine(url, pool_size=4)
+    assert storage.check_cache(f"{text} update 3.")["id"] == "p3"
+    assert storage.find_near_duplicate(f"{text} Update 9.")["similarity"] >= 0.8
+    page, cursor = storage.read_history_page(3, limit=3)
+    rest, _ = storage.read_history_page(3, limit=3, cursor=cursor)
+    assert [row["id"] for row in page + rest] == ["p4", "p3", "p2", "p1", "p0"]
+    assert storage.get_stats_data(3)["fake_count"] == 2 and storage.get_stats_data(3)["total"] == 5
+    assert [len(rows) for rows in storage.iter_history(user_id=3, label="FAKE", chunk_size=1)] == [1, 1]
+    assert storage.get_user_credentials(" READER@example.com")[1] == b"$2b$12$hash"
+    found = storage.search_evidence(["railway", "repairs"], 3600)
+    assert len(found) == 5 and {doc["label"] for doc in found} == {"Fake", "real"}
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        def drain(_):
+            claimed = []
+            while (job := storage.claim_job(60)) is not None:
+                claimed.append(job["id"])
+            return claimed
+        claimed = [job_id for batch in pool.map(drain, range(8)) for job_id in batch]
+    assert sorted(claimed) == sorted(f"job{i}" for i in range(20))
+
+    storage.clear_all_history(3)
+    assert storage.check_cache(f"{text} update 3.") is None and storage.get_stats_data(3)["total"] == 0
+
+# Verifies evidence packing: BM25 keeps the on-topic sentences, drops repeats and stays within the token budgets
+@pytest.mark.asyncio
+async def test_evidence_packing(temp_db, monkeypatch):
+    "Off-topic and duplicated search sentences stay out of the prompt, and its token count is reported"
+    from types import SimpleNamespace
+    from backend import llm_judge
+    from backend.evidence import estimate_tokens
+    monkeypatch.setenv("PROMPT_TOKENIZER", "estimate")
+    monkeypatch.setenv("CLAIM_TOKEN_BUDGET", "30")
+    monkeypatch.setenv("EVIDENCE_TOKEN_BUDGET", "60")
+    claim = "The city council voted to ban electric scooters downtown. " + "Residents reacted online. " * 40
+    results = [
+        {"title": "Gazette", "content": "Weather was mild on Monday. The council voted 7-2 to ban electric scooters "
+                                        "from downtown streets. Parking fees rise in May."},
+        {"title": "Wire", "content": "The city council voted to ban electric scooters downtown, officials said. "
+                                     "Sports results follow."},
+        {"title": "Blog", "content": "Electric scooters downtown were banned after the council vote on Tuesday."},
+    ]
+    searches, prompts = [], []
+
+    async def search(**kwargs):
+        searches.append(kwargs)
+        return {"results": results}
+
+    async def create(**kwargs):
+        prompts.append(kwargs["messages"][0]["content"])
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(
+            content='{"label": "real", "confidence": 80, "explanation": "reported"}'))])
+
+    hf = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    with patch("backend.llm_judge._get_async_tavily_client", lambda: SimpleNamespace(search=search)), \
+         patch("backend.llm_judge._get_async_hf_client", lambda: hf):
+        verdict = await llm_judge.judge_news_async(claim)
+
+    assert searches[0]["max_results"] == 8
+    context = llm_judge._format_search_context(claim, {"results": results})
+    assert "Wire" in context and "Blog" in context
+    assert "council voted 7-2" not in context
+    assert not any(noise in context for noise in ("Weather", "Parking", "Sports"))
+    assert estimate_tokens(context) <= 60
+    assert context in prompts[0]
+    assert prompts[0].count("Residents reacted online.") == 1
+    assert verdict["label"] == "real" and verdict["prompt_tokens"] == estimate_tokens(prompts[0])
+
+# Verifies the local evidence index: past analyses and search snippets are found first, past analyses stay
+# out of the web evidence and never count toward skipping the search, the web search is skipped in
+# "prefer" mode, a failed search is covered, and cleared history leaves the index
+@pytest.mark.asyncio
+async def test_local_evidence_index(temp_db, monkeypatch):
+    "Stored verdicts and cached snippets serve as evidence without another web search"
+    from types import SimpleNamespace
+    from backend import llm_judge
+    claim = "The northern railway bridge will close for six months of structural repairs."
+    temp_db.append_record({"id": "r1", "timestamp": "2024-01-01 00:00:00", "title": "N/A", "text": claim,
+                           "label": "real", "confidence": 90, "explanation": "The transport authority confirmed the bridge repairs."}, 5)
+    temp_db.append_record({"id": "r2", "timestamp": "2024-01-01 00:00:01", "text": "Unrelated football news.",
+                           "label": "uncertain", "confidence": 0, "explanation": "Model inference failed: timeout"}, 5)
+    temp_db.save_search_entry("railway bridge", {"results": [
+        {"title": "Gazette", "url": "https://example.com/a", "content": "Repairs will close the northern railway bridge for six months."},
+        {"title": "Wire", "url": "https://example.com/b", "content": "The northern railway bridge closure for six months of structural repairs starts in spring."},
+    ]}, 120.0, 100)
+    searches = []
+
+    async def search(**kwargs):
+        searches.append(kwargs["query"])
+        raise TimeoutError("search API down")
+
+    monkeypatch.setenv("LOCAL_EVIDENCE_MIN_MATCHES", "2")
+    before = dict(llm_judge.LOCAL_EVIDENCE_STATS)
+    with patch("backend.llm_judge._get_async_tavily_client", lambda: SimpleNamespace(search=search)):
+        _, covered, earlier = await llm_judge._search_async(claim)
+        attempts = len(searches)
+        monkeypatch.setenv("LOCAL_EVIDENCE_MODE", "prefer")
+        monkeypatch.setenv("LOCAL_EVIDENCE_MIN_MATCHES", "3")
+        await llm_judge._search_async(claim)
+        searched = len(searches)
+        monkeypatch.setenv("LOCAL_EVIDENCE_MIN_MATCHES", "2")
+        results, context, _ = await llm_judge._search_async(claim)
+
+    assert attempts and searched > attempts and len(searches) == searched
+    assert "Gazette" in covered and "bridge repairs" not in covered
+    assert "real" in earlier and "bridge repairs" in earlier and "Gazette" not in earlier
+    assert "inference failed" not in covered + earlier
+    assert context == covered and all(res["local"] for res in results["results"])
+    prompt = llm_judge._build_prompt(claim, covered, False, earlier)
+    assert prompt.index("SEARCH CONTEXT") < prompt.index("bridge repairs") and "NOT independent evidence" in prompt
+    assert "EARLIER ANALYSES" not in llm_judge._build_prompt(claim, covered, False)
+    stats = llm_judge.LOCAL_EVIDENCE_STATS
+    assert stats["searches_skipped"] - before["searches_skipped"] == 1
+    assert stats["search_failures_covered"] - before["search_failures_covered"] == 2
+
+    temp_db.clear_all_history(5)
+    assert [doc["kind"] for doc in temp_db.search_evidence(["railway", "bridge"], 3600)] == ["search", "search"]
+
+# Verifies that counting prompt tokens never waits for the tokenizer download
+def test_token_counter_never_blocks(monkeypatch):
+    "The estimate serves while the tokenizer loads in the background, then the real counter takes over"
+    import threading
+    from backend import evidence
+    release = threading.Event()
+    loaded = lambda text: 1
+    monkeypatch.setattr(evidence, "_load_counter", lambda name: release.wait(5) and loaded)
+    name = "slow/tokenizer"
+    assert evidence.token_counter(name) is evidence.estimate_tokens
+    release.set()
+    assert evidence._loading[name].wait(5)
+    assert evidence.token_counter(name) is loaded